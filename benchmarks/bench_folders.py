@@ -0,0 +1,52 @@
+"""
+Benchmark the conversion of KML files with many folders of the same name,
+which stresses the disambiguation of layer names and file names.
+
+Run from the project root via ``python -m benchmarks.bench_folders [num_folders ...]``.
+"""
+
+import sys
+import time
+import io
+
+import kml2geojson as k2g
+
+
+def make_kml(num_folders: int) -> str:
+    """
+    Return a KML string with the given number of folders all named 'Untitled',
+    each containing one point.
+    """
+    folders = "".join(
+        f"<Folder><name>Untitled</name><Placemark><Point>"
+        f"<coordinates>{i % 360 - 180},0</coordinates>"
+        f"</Point></Placemark></Folder>"
+        for i in range(num_folders)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">'
+        f"<Document>{folders}</Document></kml>"
+    )
+
+
+def main(sizes):
+    print(
+        f"{'folders':>8} {'strategy':>8} {'disambiguate (s)':>17} {'convert (s)':>12}"
+    )
+    for n in sizes:
+        kml = make_kml(n)
+        names = ["Untitled"] * n
+        for strategy in k2g.NAMING_STRATEGIES:
+            t0 = time.perf_counter()
+            k2g.disambiguate(names, strategy=strategy)
+            t1 = time.perf_counter()
+            k2g.convert(
+                io.StringIO(kml), separate_folders=True, naming_strategy=strategy
+            )
+            t2 = time.perf_counter()
+            print(f"{n:>8} {strategy:>8} {t1 - t0:>17.4f} {t2 - t1:>12.4f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 50_000])
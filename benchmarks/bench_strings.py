@@ -0,0 +1,117 @@
+"""
+Benchmark the memory taken by the Features of a KML file with repetitive
+ExtendedData, with and without string interning and shared properties.
+
+Run from the project root via ``python -m benchmarks.bench_strings [num_placemarks]``.
+"""
+
+import mmap
+import sys
+import tempfile
+import time
+
+import kml2geojson as k2g
+
+CATEGORIES = [f"CAT-{i:03d}" for i in range(50)]
+STATUSES = ["active", "inactive", "pending", "retired"]
+
+
+def write_kml(path, num_placemarks: int) -> None:
+    """
+    Write to the given path a KML file with the given number of points,
+    each with a unique id and with a style URL and ExtendedData drawn from small sets of values.
+    """
+    with open(path, "w") as tgt:
+        tgt.write(
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+        )
+        for i in range(num_placemarks):
+            tgt.write(
+                f'<Placemark id="asset-{i}">'
+                f"<styleUrl>#style-{i % 8}</styleUrl><ExtendedData>"
+                f'<Data name="category"><value>{CATEGORIES[i % 50]}</value></Data>'
+                f'<Data name="status"><value>{STATUSES[i % 4]}</value></Data>'
+                f'<Data name="owner"><value>Utility Co</value></Data>'
+                f"</ExtendedData><Point><coordinates>{i % 360 - 180},{i % 180 - 90}"
+                f"</coordinates></Point></Placemark>"
+            )
+        tgt.write("</Document></kml>")
+
+
+def build_features(path, **kwargs) -> list:
+    """
+    Build the Features of the KML file at the given path one Placemark at a time,
+    as the streaming path of k2g does, so that only the Features stay in memory.
+    """
+    features = []
+    with open(path, "rb") as src:
+        kml_bytes = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix, suffix = k2g.main._scan_root(kml_bytes)
+        for p in k2g.scan_placemarks(kml_bytes):
+            start = p["offset"]
+            chunk = kml_bytes[start : start + p["length"]]
+            root = k2g.parse_string(prefix + chunk + suffix, "etree")
+            features.append(k2g.build_feature(root[0], **kwargs))
+        kml_bytes.close()
+    return features
+
+
+def deep_size(obj) -> int:
+    """
+    Return the memory in bytes held by the given object and the objects it contains,
+    counting objects reachable in several ways once.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        x = stack.pop()
+        if id(x) in seen:
+            continue
+        seen.add(id(x))
+        size += sys.getsizeof(x)
+        if isinstance(x, dict):
+            stack.extend(x.keys())
+            stack.extend(x.values())
+        elif isinstance(x, (list, tuple)):
+            stack.extend(x)
+    return size
+
+
+def measure(path, **kwargs) -> tuple[int, float]:
+    """
+    Return the memory in bytes held by the Features of the KML file at the given path, built with the given keyword arguments,
+    plus that held by the string table, if any, and the time in seconds taken to build them.
+    """
+    t0 = time.perf_counter()
+    features = build_features(path, **kwargs)
+    t1 = time.perf_counter()
+    tables = [vars(table) for table in kwargs.values()]
+    return deep_size([features, tables]), t1 - t0
+
+
+def main(num_placemarks: int):
+    with tempfile.NamedTemporaryFile(suffix=".kml") as f:
+        write_kml(f.name, num_placemarks)
+        print(f"{num_placemarks} placemarks")
+        print(f"{'mode':>18} {'memory (MB)':>12} {'saved':>6} {'time (s)':>9}")
+        base = None
+        for mode, kwargs in [
+            ("plain", {}),
+            ("interned", {"strings": k2g.StringTable()}),
+            (
+                "interned + shared",
+                {"strings": k2g.StringTable(share_properties=True)},
+            ),
+        ]:
+            size, seconds = measure(f.name, **kwargs)
+            base = base or size
+            print(
+                f"{mode:>18} {size / 2**20:>12.1f} {1 - size / base:>6.0%}"
+                f" {seconds:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
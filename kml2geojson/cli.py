@@ -1,9 +1,654 @@
+from __future__ import annotations
 import pathlib as pl
 import json
+import concurrent.futures as cf
+import threading
+import ctypes
+import ctypes.util
+import mmap
+import os
+import select
+import sys
+import time
+import zipfile
 
 import click
 
 import kml2geojson.main as m
+import kml2geojson.tiles as t
+import kml2geojson.geopackage as g
+import kml2geojson.compress as c
+import kml2geojson.links as li
+import kml2geojson.server as s
+
+#: Output formats of k2g
+OUTPUT_FORMATS = m.OUTPUT_FORMATS + [
+    "gpkg",
+    "mbtiles",
+    "mvt",
+]
+
+
+def iter_shards(
+    groups: dict[str, list[dict]],
+    *,
+    max_features: int | None = None,
+    max_bytes: int | None = None,
+):
+    """
+    Given partitioned Features as output by :func:`kml2geojson.main.partition_features`, serialize each Feature once, and split every partition into shards of at most ``max_features`` Features and at most ``max_bytes`` bytes of serialized Features, if given.
+    A Feature larger than ``max_bytes`` gets a shard of its own.
+
+    Yield tuples (partition key, shard index within the partition, list of serialized Features, bounding box of the shard).
+    """
+    for key, group in groups.items():
+        i = 0
+        texts, size, bboxes = [], 0, []
+        for f in group:
+            # JSON is ASCII by default, so the length of the text is its size in bytes
+            text = json.dumps(f)
+            if texts and (
+                (max_features is not None and len(texts) >= max_features)
+                or (max_bytes is not None and size + len(text) > max_bytes)
+            ):
+                yield key, i, texts, m.merge_bboxes(bboxes)
+                i += 1
+                texts, size, bboxes = [], 0, []
+            texts.append(text)
+            size += len(text) + 2  # Plus separator
+            bboxes.append(f.get("bbox") or m.get_bbox(f["geometry"]))
+        if texts:
+            yield key, i, texts, m.merge_bboxes(bboxes)
+
+
+def write_shard(
+    path: pl.Path, name: str, texts: list[str], bbox, compress: str | None = None
+) -> int:
+    """
+    Write a GeoJSON FeatureCollection with the given name, bounding box (if not ``None``), and serialized Features to the given path,
+    compressed with the given compression from :const:`kml2geojson.compress.COMPRESSIONS`, if any.
+    Return the number of uncompressed bytes written.
+    """
+    header = {"type": "FeatureCollection", "name": name}
+    if bbox is not None:
+        header["bbox"] = bbox
+    text = json.dumps(header)[:-1] + ', "features": [' + ", ".join(texts) + "]}"
+    if compress is not None:
+        # Shards are already written concurrently
+        with m.atomic_open(path, "wb") as raw, c.open_compressed(
+            raw, compress, workers=1
+        ) as tgt:
+            tgt.write(text.encode("utf-8"))
+    else:
+        with m.atomic_open(path) as tgt:
+            tgt.write(text)
+    return len(text)
+
+
+def write_sharded_layers(
+    layers: list[dict],
+    output_dir: pl.Path,
+    *,
+    max_features: int | None = None,
+    max_bytes: int | None = None,
+    by_property: str | None = None,
+    grid_size: float | None = None,
+    time_bucket: str | None = None,
+    writers: int = 4,
+    naming_strategy: str = "append",
+    compress: str | None = None,
+) -> list[dict]:
+    """
+    Write the given layers to the given directory as shards produced by :func:`iter_shards`, on a pool of ``writers`` threads, and write a manifest of the shards to 'manifest.json'.
+
+    Name the files '<layer name>_<partition key>.geojson' or, if ``max_features`` or ``max_bytes`` is given, '<layer name>_<partition key>_<shard index>.geojson', omitting empty partition keys and disambiguating the names before the shard index according to the given naming strategy.
+    If a compression is given, then compress the files with it via :func:`write_shard` and add the corresponding file name suffix.
+
+    Return the list of manifest entries, one dictionary per shard.
+    """
+    # Name every partition up front, so shards can be written as soon as they fill up
+    partitions = [
+        m.partition_features(
+            layer["features"],
+            by_property=by_property,
+            grid_size=grid_size,
+            time_bucket=time_bucket,
+        )
+        for layer in layers
+    ]
+    bases = m.disambiguate(
+        [
+            "_".join(filter(None, [m.to_filename(layer["name"]), key]))
+            for layer, groups in zip(layers, partitions)
+            for key in groups
+        ],
+        strategy=naming_strategy,
+    )
+    bases = iter(bases)
+    numbered = max_features is not None or max_bytes is not None
+
+    # Bound the number of shards held in memory while waiting to be written
+    slots = threading.BoundedSemaphore(2 * writers)
+    futures = []
+    manifest = []
+
+    def write(path, name, texts, bbox):
+        try:
+            return write_shard(path, name, texts, bbox, compress)
+        finally:
+            slots.release()
+
+    with cf.ThreadPoolExecutor(max_workers=writers) as executor:
+        for layer, groups in zip(layers, partitions):
+            base_names = {}
+            for key, i, texts, bbox in iter_shards(
+                groups, max_features=max_features, max_bytes=max_bytes
+            ):
+                if key not in base_names:
+                    base_names[key] = next(bases)
+                stem = f"{base_names[key]}_{i}" if numbered else base_names[key]
+                path = output_dir / f"{stem}.geojson"
+                if compress is not None:
+                    path = path.with_name(path.name + c.SUFFIXES[compress])
+                slots.acquire()
+                futures.append(executor.submit(write, path, layer["name"], texts, bbox))
+                manifest.append(
+                    {
+                        "path": path.name,
+                        "layer": layer["name"],
+                        "partition": key or None,
+                        "feature_count": len(texts),
+                        "bbox": bbox,
+                    }
+                )
+        for entry, future in zip(manifest, futures):
+            entry["bytes"] = future.result()
+
+    with m.atomic_open(output_dir / "manifest.json") as tgt:
+        json.dump({"shards": manifest}, tgt)
+
+    return manifest
+
+
+def convert_to_dir(
+    kml_path_or_buffer,
+    output_dir: str | pl.Path,
+    *,
+    feature_collection_name: str = "main",
+    style_type: str | None = None,
+    style_filename: str = "style.json",
+    naming_strategy: str = "append",
+    output_format: str = "geojson",
+    min_zoom: int = 0,
+    max_zoom: int = 14,
+    workers: int | None = None,
+    max_features: int | None = None,
+    max_bytes: int | None = None,
+    partition_property: str | None = None,
+    partition_grid: float | None = None,
+    partition_time: str | None = None,
+    writers: int = 4,
+    compress: str | None = None,
+    memory_limit: int | None = None,
+    **kwargs,
+) -> None:
+    """
+    Convert the given KML or KMZ file via :func:`kml2geojson.main.convert` with the given keyword arguments
+    and write the results to the given output directory, creating it if necessary, as described in :func:`k2g`.
+    Write every file atomically, so that readers of the output directory never see partially written files.
+    Under a memory limit, spill layers to temporary files in the output directory and move them into place.
+    """
+    sharded = any(
+        x is not None
+        for x in [
+            max_features,
+            max_bytes,
+            partition_property,
+            partition_grid,
+            partition_time,
+        ]
+    )
+
+    # Create output directory if it doesn't exist
+    output_dir = pl.Path(output_dir)
+    if not output_dir.exists():
+        output_dir.mkdir(parents=True)
+    output_dir = output_dir.resolve()
+
+    result = m.convert(
+        kml_path_or_buffer,
+        style_type=style_type,
+        naming_strategy=naming_strategy,
+        feature_collection_name=feature_collection_name,
+        output_format="topojson" if output_format == "topojson" else "geojson",
+        memory_limit=memory_limit,
+        spill_dir=output_dir if memory_limit is not None else None,
+        # Time partitions need the TimeStamps of Features
+        time_stamps=partition_time is not None,
+        **kwargs,
+    )
+    if style_type is not None:
+        style, *layers = result
+    else:
+        style, layers = None, result
+
+    # Write style file
+    if style is not None:
+        path = output_dir / style_filename
+        with m.atomic_open(path) as tgt:
+            json.dump(style, tgt)
+
+    # Write GeoPackage
+    if output_format == "gpkg":
+        path = output_dir / f"{m.to_filename(feature_collection_name)}.gpkg"
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            g.write_geopackage(layers, tmp, naming_strategy=naming_strategy)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return
+
+    # Write vector tiles
+    if output_format == "mbtiles":
+        tiles = t.build_tiles(
+            layers, min_zoom, max_zoom, workers=workers, compress=True
+        )
+        metadata = t.build_metadata(layers, feature_collection_name, min_zoom, max_zoom)
+        path = output_dir / f"{m.to_filename(feature_collection_name)}.mbtiles"
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            t.write_mbtiles(tiles, tmp, metadata)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return
+    elif output_format == "mvt":
+        tiles = t.build_tiles(layers, min_zoom, max_zoom, workers=workers)
+        t.write_tile_directory(tiles, output_dir)
+        return
+
+    # Write sharded layer files
+    if sharded:
+        write_sharded_layers(
+            layers,
+            output_dir,
+            max_features=max_features,
+            max_bytes=max_bytes,
+            by_property=partition_property,
+            grid_size=partition_grid,
+            time_bucket=partition_time,
+            writers=writers,
+            naming_strategy=naming_strategy,
+            compress=compress,
+        )
+        return
+
+    # Create filenames for layers
+    if output_format == "topojson":
+        names = [next(iter(layer["objects"])) for layer in layers]
+    else:
+        names = [layer["name"] for layer in layers]
+    stems = m.disambiguate(
+        [m.to_filename(name) for name in names], strategy=naming_strategy
+    )
+    filenames = [f"{stem}.{output_format}" for stem in stems]
+
+    # Write layer files
+    for i in range(len(layers)):
+        path = output_dir / filenames[i]
+        features = layers[i].get("features")
+        if isinstance(features, m.SpilledFeatures):
+            # Concatenate or move the spilled texts rather than serialize again
+            name, b = layers[i].get("name"), layers[i].get("bbox")
+            if compress is not None:
+                path = path.with_name(path.name + c.SUFFIXES[compress])
+                with m.atomic_open(path, "wb") as raw, c.open_compressed(
+                    raw, compress, workers=workers
+                ) as tgt:
+                    features.write_to(tgt, name, b)
+            else:
+                features.move_to(path, name, b)
+        elif compress is not None:
+            path = path.with_name(path.name + c.SUFFIXES[compress])
+            with m.atomic_open(path, "wb") as raw, c.open_compressed(
+                raw, compress, "w", workers=workers
+            ) as tgt:
+                json.dump(layers[i], tgt)
+        else:
+            with m.atomic_open(path) as tgt:
+                json.dump(layers[i], tgt)
+
+
+def convert_streaming(
+    kml_path: str | pl.Path,
+    output_dir: str | pl.Path,
+    *,
+    feature_collection_name: str = "main",
+    bbox: bool = False,
+    dimensions: int | None = None,
+    altitude: str = "keep",
+    time_range: tuple | None = None,
+    rfc7946: bool = False,
+    hilbert_sort: bool = False,
+    sort_memory: int = 2**28,
+    compress: str | None = None,
+    workers: int | None = None,
+    checkpoint_every: int = 10_000,
+    resume: bool = False,
+) -> pl.Path:
+    """
+    Convert the KML or KMZ file at the given path to a single GeoJSON FeatureCollection,
+    writing it Feature by Feature to the file '<name>.geojson' in the given output directory,
+    without building the DOM of the whole file, and return the path of the output file.
+    The output is identical to that of :func:`convert_to_dir` with the same options and the default parser.
+
+    Find the Placemarks via :func:`kml2geojson.main.scan_placemarks`, parse them one at a time with the 'etree' parser,
+    within the root element and namespace declarations found by :func:`kml2geojson.main._scan_root`,
+    and build their Features via :func:`kml2geojson.main.build_feature`, normalized as RFC 7946 requires if ``rfc7946``,
+    skipping the Placemarks outside of the given time range, as in :func:`kml2geojson.main.build_feature_collection`.
+    The output grows in a hidden partial file, which is moved onto the output path when complete.
+
+    If ``hilbert_sort``, then sort the Features as in :func:`kml2geojson.main.sort_features`
+    via :func:`kml2geojson.main.external_sort`, holding at most about ``sort_memory`` bytes of them in memory
+    and spilling sorted runs to temporary files in the output directory.
+    Sorting writes no output before the whole input is scanned and so records no checkpoints.
+
+    If a compression from :const:`kml2geojson.compress.COMPRESSIONS` is given, then compress the output
+    on ``workers`` threads via :class:`kml2geojson.compress.BlockCompressor` and add the corresponding file name suffix.
+
+    Every ``checkpoint_every`` Placemarks, flush the output to disk and then atomically record in a hidden checkpoint file
+    the input byte offset of the next Placemark, the current folder stack, the output position, the Feature count, and the running bounding box.
+    If ``resume`` and a checkpoint exists, then truncate the partial output to the recorded position and continue from the recorded offset,
+    so that the output is identical to that of an uninterrupted run;
+    otherwise, or if the partial output is missing or shorter than recorded, start from the beginning.
+    Raise a ``ValueError`` if the input file or the options changed since the checkpoint.
+    """
+    kml_path = pl.Path(kml_path)
+    output_dir = pl.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"{m.to_filename(feature_collection_name)}.geojson"
+    if compress is not None:
+        path = path.with_name(path.name + c.SUFFIXES[compress])
+    partial_path = path.with_name(f".{path.name}.partial")
+    checkpoint_path = path.with_name(f".{path.name}.checkpoint")
+
+    stat = kml_path.stat()
+    source = {
+        "path": str(kml_path.resolve()),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+    options = {
+        "feature_collection_name": feature_collection_name,
+        "bbox": bbox,
+        "dimensions": dimensions,
+        "altitude": altitude,
+        "time_range": list(time_range) if time_range is not None else None,
+        "rfc7946": rfc7946,
+        "hilbert_sort": hilbert_sort,
+        "compress": compress,
+    }
+    state = {
+        "offset": 0,
+        "folders": [],
+        "position": 0,
+        "count": 0,
+        "bbox": None,
+        "compressor": None,
+    }
+    if resume and checkpoint_path.exists():
+        with checkpoint_path.open() as src:
+            checkpoint = json.load(src)
+        if checkpoint["source"] != source:
+            raise ValueError(f"{kml_path} changed since the last checkpoint")
+        if checkpoint["options"] != options:
+            raise ValueError("options differ from those of the last checkpoint")
+        # A checkpoint left behind by a crash while committing the output is stale
+        if (
+            partial_path.exists()
+            and partial_path.stat().st_size >= checkpoint["state"]["position"]
+        ):
+            state = checkpoint["state"]
+
+    if time_range is not None:
+        begin, end = m.time_bounds(time_range)
+
+    with kml_path.open("rb") as src:
+        if zipfile.is_zipfile(src):
+            kml_bytes = m.read_kmz(src)
+        elif stat.st_size:
+            kml_bytes = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            kml_bytes = b""
+        prefix, suffix = m._scan_root(kml_bytes)
+
+        if state["position"]:
+            tgt = partial_path.open("r+b")
+            tgt.truncate(state["position"])
+            tgt.seek(state["position"])
+        else:
+            tgt = partial_path.open("wb")
+
+        with tgt:
+            if compress is not None:
+                out = c.BlockCompressor(
+                    tgt, compress, workers=workers, state=state["compressor"]
+                )
+            else:
+                out = tgt
+            if not state["position"]:
+                out.write(b'{"type": "FeatureCollection", "features": [')
+            count = state["count"]
+            b = state["bbox"]
+
+            def save_checkpoint(offset, folders):
+                compressor = out.checkpoint() if compress is not None else None
+                tgt.flush()
+                os.fsync(tgt.fileno())
+                state = {
+                    "offset": offset,
+                    "folders": list(folders),
+                    "position": tgt.tell(),
+                    "count": count,
+                    "bbox": b,
+                    "compressor": compressor,
+                }
+                with m.atomic_open(checkpoint_path) as f:
+                    json.dump({"source": source, "options": options, "state": state}, f)
+
+            def iter_features():
+                nonlocal b
+                pending = 0
+                for p in m.scan_placemarks(
+                    kml_bytes, state["offset"], tuple(state["folders"])
+                ):
+                    start = p["offset"]
+                    root = m.parse_string(
+                        prefix + bytes(kml_bytes[start : start + p["length"]]) + suffix,
+                        "etree",
+                    )
+                    placemark = root[0]
+                    feature = None
+                    interval = None
+                    if time_range is not None:
+                        interval = m.get_time_interval(placemark)
+                    if interval is None or (
+                        interval[1] >= begin and interval[0] <= end
+                    ):
+                        feature = m.build_feature(
+                            placemark,
+                            bbox=bbox,
+                            dimensions=dimensions,
+                            altitude=altitude,
+                            rfc7946=rfc7946,
+                        )
+                    if feature is not None:
+                        if bbox:
+                            b = m.merge_bboxes([b, feature.get("bbox")])
+                        yield feature
+
+                    # The Features so far have been written, unless sorting
+                    pending += 1
+                    if pending == checkpoint_every and not hilbert_sort:
+                        save_checkpoint(start + p["length"], p["folders"])
+                        pending = 0
+
+            if hilbert_sort:
+                texts = m.external_sort(
+                    ((m.get_hilbert_key(f), json.dumps(f)) for f in iter_features()),
+                    sort_memory,
+                    output_dir,
+                )
+            else:
+                texts = (json.dumps(f) for f in iter_features())
+            for text in texts:
+                if count:
+                    out.write(b", ")
+                out.write(text.encode("utf-8"))
+                count += 1
+
+            # Same keys in the same order as the FeatureCollections of the DOM path
+            footer = {"name": feature_collection_name}
+            if b is not None:
+                footer["bbox"] = b
+            out.write(b"], " + json.dumps(footer)[1:].encode("utf-8"))
+            if compress is not None:
+                out.close()
+            tgt.flush()
+            os.fsync(tgt.fileno())
+
+        if isinstance(kml_bytes, mmap.mmap):
+            kml_bytes.close()
+
+    # Drop the checkpoint first, so that it never points into a committed output
+    if checkpoint_path.exists():
+        checkpoint_path.unlink()
+    os.replace(partial_path, path)
+    return path
+
+
+def make_waiter(directory: str | pl.Path):
+    """
+    Return a pair of functions (wait, close), where ``wait(timeout)`` blocks until a file in the given directory changes or until ``timeout`` seconds pass,
+    and ``close()`` releases resources.
+    Use inotify on Linux and sleep elsewhere.
+    """
+    libc_name = ctypes.util.find_library("c")
+    libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+    if libc is None or not hasattr(libc, "inotify_init1"):
+        return time.sleep, lambda: None
+
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    mask = 0x002 | 0x008 | 0x080 | 0x100
+    if fd < 0 or libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+        if fd >= 0:
+            os.close(fd)
+        return time.sleep, lambda: None
+
+    def wait(timeout):
+        ready, __, __ = select.select([fd], [], [], timeout)
+        if ready:
+            # Drain the events; the caller rescans the directory anyway
+            try:
+                while os.read(fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    return wait, lambda: os.close(fd)
+
+
+def watch_dir_name(path: pl.Path) -> str:
+    """
+    Return the name of the output subdirectory of the given watched KML or KMZ file,
+    made of its stem and lowercase suffix, so that, e.g., 'a.kml' and 'a.kmz' get the distinct subdirectories 'a_kml' and 'a_kmz'.
+    """
+    return f"{path.stem}_{path.suffix[1:].lower()}"
+
+
+def watch(
+    input_dir: str | pl.Path,
+    output_dir: str | pl.Path,
+    *,
+    poll_interval: float = 1,
+    debounce: float = 2,
+    workers: int | None = None,
+    max_polls: int | None = None,
+    **kwargs,
+) -> None:
+    """
+    Watch the given input directory for new or modified KML and KMZ files, detected by modification time and size,
+    and convert each one via :func:`convert_to_dir` with the given keyword arguments into the subdirectory of the output directory named by :func:`watch_dir_name`.
+    Convert a file only once its modification time and size have been stable for ``debounce`` seconds,
+    so that bursts of writes trigger one conversion,
+    and retry a file whose conversion failed on the following checks, again after ``debounce`` seconds,
+    and convert files on a pool of ``workers`` processes, which defaults to the number of CPUs.
+    Check the directory every ``poll_interval`` seconds and, where inotify is available, as soon as something in it changes.
+    Stop after ``max_polls`` checks, if given, and otherwise run until interrupted.
+    """
+    input_dir = pl.Path(input_dir)
+    output_dir = pl.Path(output_dir)
+    # Tile workers can't be nested inside conversion workers
+    kwargs["workers"] = 1
+
+    converted = {}  # path -> (mtime, size) at conversion
+    failed = {}  # path -> number of consecutive failed conversions
+    pending = {}  # path -> ((mtime, size), time first seen)
+    running = {}  # path -> future
+    wait, close = make_waiter(input_dir)
+    polls = 0
+    try:
+        with cf.ProcessPoolExecutor(max_workers=workers) as executor:
+            while max_polls is None or polls < max_polls:
+                if polls:
+                    wait(poll_interval)
+                polls += 1
+                now = time.monotonic()
+
+                # Report finished conversions
+                for path, future in list(running.items()):
+                    if future.done():
+                        del running[path]
+                        if future.exception() is None:
+                            failed.pop(path, None)
+                        else:
+                            # Forget the conversion so that it's retried
+                            converted.pop(path, None)
+                            failed[path] = failed.get(path, 0) + 1
+                            click.echo(
+                                f"Failed to convert {path} "
+                                f"(attempt {failed[path]}): {future.exception()}",
+                                err=True,
+                            )
+
+                # Submit stable files
+                for path in sorted(input_dir.iterdir()):
+                    if path.suffix.lower() not in [".kml", ".kmz"]:
+                        continue
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                    if converted.get(path) == signature or path in running:
+                        continue
+                    if path not in pending or pending[path][0] != signature:
+                        pending[path] = (signature, now)
+                    if now - pending[path][1] >= debounce:
+                        del pending[path]
+                        converted[path] = signature
+                        running[path] = executor.submit(
+                            convert_to_dir,
+                            path,
+                            output_dir / watch_dir_name(path),
+                            **kwargs,
+                        )
+    finally:
+        close()
 
 
 @click.command(short_help="Convert KML to GeoJSON")
@@ -13,6 +658,47 @@ import kml2geojson.main as m
 @click.option("-st", "--style-type", type=click.Choice(m.STYLE_TYPES), default=None)
 @click.option("-sf", "--style-filename", default="style.json")
 @click.option("-f", "--separate-folders", is_flag=True, default=False)
+@click.option(
+    "-ns",
+    "--naming-strategy",
+    type=click.Choice(m.NAMING_STRATEGIES),
+    default="append",
+)
+@click.option("-b", "--bbox", is_flag=True, default=False)
+@click.option("-p", "--parser", type=click.Choice(["auto"] + m.PARSERS), default="auto")
+@click.option("-r", "--recover", is_flag=True, default=False)
+@click.option("--huge-tree", is_flag=True, default=False)
+@click.option("-tr", "--time-range", nargs=2, default=None)
+@click.option("-d", "--dimensions", type=click.IntRange(2), default=None)
+@click.option("-a", "--altitude", type=click.Choice(m.ALTITUDE_MODES), default="keep")
+@click.option("--rfc7946", is_flag=True, default=False)
+@click.option(
+    "-of", "--output-format", type=click.Choice(OUTPUT_FORMATS), default="geojson"
+)
+@click.option("-q", "--quantization", type=click.IntRange(2), default=10**5)
+@click.option("--min-zoom", type=click.IntRange(0, 24), default=0)
+@click.option("--max-zoom", type=click.IntRange(0, 24), default=14)
+@click.option("-w", "--workers", type=click.IntRange(1), default=None)
+@click.option("-mf", "--max-features", type=click.IntRange(1), default=None)
+@click.option("-mb", "--max-bytes", type=click.IntRange(1), default=None)
+@click.option("-pp", "--partition-property", default=None)
+@click.option("-pg", "--partition-grid", type=click.FloatRange(0, min_open=True))
+@click.option("-pt", "--partition-time", type=click.Choice(m.TIME_BUCKETS))
+@click.option("--writers", type=click.IntRange(1), default=4)
+@click.option("-is", "--intern-strings", is_flag=True, default=False)
+@click.option("--share-properties", is_flag=True, default=False)
+@click.option("-l", "--follow-links", is_flag=True, default=False)
+@click.option("--link-cache", type=click.Path(file_okay=False), default=None)
+@click.option("-z", "--compress", type=click.Choice(c.COMPRESSIONS), default=None)
+@click.option("-hs", "--hilbert-sort", is_flag=True, default=False)
+@click.option("--sort-memory", type=click.IntRange(1), default=None)
+@click.option("-ml", "--memory-limit", type=click.IntRange(1), default=None)
+@click.option("--stream", is_flag=True, default=False)
+@click.option("-ce", "--checkpoint-every", type=click.IntRange(1), default=10_000)
+@click.option("--resume", is_flag=True, default=False)
+@click.option("--watch", "watch_", is_flag=True, default=False)
+@click.option("--poll-interval", type=click.FloatRange(0, min_open=True), default=1)
+@click.option("--debounce", type=click.FloatRange(0), default=2)
 def k2g(
     kml_path_or_buffer,
     output_dir,
@@ -20,9 +706,43 @@ def k2g(
     style_type,
     style_filename,
     separate_folders,
+    naming_strategy,
+    bbox,
+    parser,
+    recover,
+    huge_tree,
+    time_range,
+    dimensions,
+    altitude,
+    rfc7946,
+    output_format,
+    quantization,
+    min_zoom,
+    max_zoom,
+    workers,
+    max_features,
+    max_bytes,
+    partition_property,
+    partition_grid,
+    partition_time,
+    writers,
+    intern_strings,
+    share_properties,
+    follow_links,
+    link_cache,
+    compress,
+    hilbert_sort,
+    sort_memory,
+    memory_limit,
+    stream,
+    checkpoint_every,
+    resume,
+    watch_,
+    poll_interval,
+    debounce,
 ):
     """
-    Given a path to a KML file or given a KML file, convert it to a a GeoJSON
+    Given a path to a KML or KMZ file or given a KML file, convert it to a a GeoJSON
     FeatureCollection with name = ``--feature_collection_name``
     (which defaults to 'main') and save the GeoJSON to the file '<name>.geojson'
     in the given output directory.
@@ -32,35 +752,321 @@ def k2g(
     node that contains geodata.
     Warning: this can produce GeoJSON files with the same geodata in case the KML file
     has nested folders with geodata.
+    Repeated folder names and file names are disambiguated according to
+    ``--naming_strategy``: 'append' appends 1s, as in 'Untitled11', and 'counter'
+    appends occurrence numbers, as in 'Untitled_3'.
 
     If ``--style_type`` is specified, then also build a JSON style file of the given
     style type and save it to the output directory under the file name given by
     ``--style_filename`` which defaults to "style.json".
+
+    If ``--bbox``, then give every FeatureCollection and Feature a bounding box.
+
+    Parse the KML file with ``--parser``, which defaults to 'auto', meaning minidom
+    for small files and lxml, if installed, or else ElementTree for large files.
+
+    If ``--recover`` and the KML file does not parse, for example because of bytes
+    invalid in its declared encoding, then retry after dropping undecodable bytes.
+    The lxml parser never expands entities or accesses the network and limits the
+    nesting depth and text size of the KML file, unless ``--huge_tree``, which lifts
+    these limits for trusted files with very long coordinate lists.
+
+    If ``--time_range BEGIN END`` is given, as KML times such as '2013-08' or
+    '2013-08-08T15:20:40Z', with an empty string for an open end, then skip the
+    Placemarks whose TimeSpans, TimeStamps, or track times lie outside of it.
+
+    Keep at most ``--dimensions`` values per coordinate tuple, so that
+    ``--dimensions 2`` drops altitudes while parsing.
+    If ``--altitude`` is 'auto' instead of the default 'keep', then drop the altitudes
+    of every geometry whose altitudes are all zero.
+
+    If ``--rfc7946``, then normalize the geometries as RFC 7946 requires while
+    parsing their coordinates: wind exterior Polygon rings counterclockwise and
+    interior rings clockwise, and split LineStrings and Polygons that cross the
+    antimeridian into MultiLineStrings and MultiPolygons.
+
+    If ``--output_format`` is 'topojson', then write TopoJSON Topologies instead,
+    one per GeoJSON file above, to files '<name>.topojson', storing each boundary
+    shared by adjacent Polygons or LineStrings once and snapping coordinates to a
+    grid of ``--quantization`` by ``--quantization`` positions.
+
+    If ``--output_format`` is 'gpkg', then write all the FeatureCollections to the
+    GeoPackage file '<name>.gpkg', one table per FeatureCollection, with one column
+    per property, such as an ExtendedData field, and an RTree spatial index.
+
+    If ``--output_format`` is 'mbtiles', then instead of GeoJSON files write a
+    pyramid of Mapbox Vector Tiles for the zoom levels ``--min_zoom`` through
+    ``--max_zoom`` to the MBTiles file '<name>.mbtiles', with one tile layer per
+    FeatureCollection.
+    If it is 'mvt', then write the tiles to files 'z/x/y.pbf' in the output directory.
+    Tiles are encoded in parallel by ``--workers`` processes, which defaults to the
+    number of CPUs.
+
+    To split large GeoJSON layers into several files, use any of
+    ``--max_features`` and ``--max_bytes``, which cap the number of Features and
+    bytes of GeoJSON text of Features in each file,
+    ``--partition_property``, which groups Features by the value of the given
+    property, such as an ExtendedData field, ``--partition_grid``, which groups
+    Features by the cell of a grid of the given cell width in degrees, and
+    ``--partition_time``, which groups Features by the years, months, or days that
+    their times overlap, putting Features without time into the group 'untimed'.
+    The files are then written by ``--writers`` threads and listed along with their
+    bounding boxes and Feature counts in the file 'manifest.json'.
+
+    To save memory on large files with repetitive properties, ``--intern_strings``
+    deduplicates repeated property keys and short property values, and
+    ``--share_properties`` lets Features with identical properties share them.
+
+    If ``--follow_links``, then also convert the KML and KMZ files that the
+    NetworkLinks of the KML file refer to by local path, file URL, or HTTP URL,
+    fetching them concurrently, putting their Placemarks into the FeatureCollection
+    or, with ``--separate_folders``, one FeatureCollection per linked file.
+    If ``--link_cache`` is given, then keep the fetched files in that directory and
+    refetch them only when they change.
+
+    If ``--compress`` is 'gzip' or 'zstd', then compress the GeoJSON and TopoJSON
+    files while writing them and add the suffix '.gz' or '.zst' to their names.
+    Large files are compressed in blocks on ``--workers`` threads, and the blocks
+    form a single gzip member or a sequence of Zstandard frames.
+    Zstandard requires the package zstandard.
+
+    If ``--hilbert_sort``, then write the Features of each layer sorted along a
+    Hilbert curve by the centroids of their bounding boxes instead of in document
+    order, so that Features close in space are close in the files.
+
+    If ``--memory_limit`` is given with ``--separate_folders``, then hold at most
+    about that many bytes of GeoJSON text of Features in memory, spilling the largest
+    layers to temporary files in the output directory once it is exceeded and moving
+    them into place at the end, which rules out ``--hilbert_sort``, output formats other than
+    'geojson', and sharding.
+
+    All files are written atomically.
+
+    If ``--stream``, then write the GeoJSON file Feature by Feature while scanning
+    the KML file, without holding the whole file in memory, which rules out
+    ``--separate_folders``, ``--style_type``, ``--parser``, ``--recover``,
+    ``--huge_tree``, ``--intern_strings``, ``--share_properties``, output formats
+    other than 'geojson', and sharding.
+    Every ``--checkpoint_every`` Placemarks, which defaults to 10000, flush the
+    output and record a checkpoint, so that after a crash, rerunning the same command
+    with ``--resume`` continues from the last checkpoint and produces the same file
+    as an uninterrupted run.
+    With ``--hilbert_sort``, hold at most about ``--sort_memory`` bytes of Features
+    in memory, which defaults to 256 MiB, spilling sorted runs to temporary files,
+    and record no checkpoints.
+    Without ``--stream``, all the Features are in memory anyway and are sorted there,
+    so ``--sort_memory`` is rejected.
+
+    If ``--watch``, then the input path must be a directory, which is watched until
+    interrupted for new or modified KML and KMZ files.
+    Each such file is converted as above into the subdirectory of the output
+    directory named after the file's stem and suffix, e.g. 'a_kml' for 'a.kml', so
+    that 'a.kml' and 'a.kmz' don't overwrite each other, once its modification time
+    and size have been stable for ``--debounce`` seconds.
+    The directory is checked every ``--poll_interval`` seconds and, on Linux, also as
+    soon as it changes, and files are converted on a pool of ``--workers`` processes.
     """
-    style, *layers = m.convert(
-        kml_path_or_buffer,
+    if min_zoom > max_zoom:
+        raise click.BadParameter("must be at least --min-zoom", param_hint="--max-zoom")
+    if time_range is not None:
+        time_range = tuple(t or None for t in time_range)
+        try:
+            m.time_bounds(time_range)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--time-range")
+    if output_format != "geojson" and any(
+        x is not None
+        for x in [
+            max_features,
+            max_bytes,
+            partition_property,
+            partition_grid,
+            partition_time,
+        ]
+    ):
+        raise click.BadParameter(
+            "must be 'geojson' to shard layers", param_hint="--output-format"
+        )
+
+    if compress is not None:
+        if output_format not in ["geojson", "topojson"]:
+            raise click.BadParameter(
+                "must be 'geojson' or 'topojson' to compress",
+                param_hint="--output-format",
+            )
+        if compress == "zstd" and c.zstandard is None:
+            raise click.BadParameter(
+                "'zstd' requires the package zstandard", param_hint="--compress"
+            )
+    if memory_limit is not None:
+        if not separate_folders or hilbert_sort:
+            raise click.BadParameter(
+                "requires --separate-folders and can't be combined with "
+                "--hilbert-sort",
+                param_hint="--memory-limit",
+            )
+        if output_format != "geojson" or any(
+            x is not None
+            for x in [
+                max_features,
+                max_bytes,
+                partition_property,
+                partition_grid,
+                partition_time,
+            ]
+        ):
+            raise click.BadParameter(
+                "must be 'geojson' without sharding under a memory limit",
+                param_hint="--output-format",
+            )
+    if sort_memory is not None and not (stream and hilbert_sort):
+        raise click.BadParameter(
+            "requires --stream and --hilbert-sort", param_hint="--sort-memory"
+        )
+    if resume and not stream:
+        raise click.BadParameter("requires --stream", param_hint="--resume")
+    if resume and hilbert_sort:
+        raise click.BadParameter(
+            "can't be combined with --hilbert-sort", param_hint="--resume"
+        )
+    if stream:
+        if separate_folders or style_type is not None or watch_ or follow_links:
+            raise click.BadParameter(
+                "can't be combined with --separate-folders, --style-type, --watch, "
+                "or --follow-links",
+                param_hint="--stream",
+            )
+        if (
+            parser != "auto"
+            or recover
+            or huge_tree
+            or intern_strings
+            or share_properties
+        ):
+            raise click.BadParameter(
+                "can't be combined with --parser, --recover, --huge-tree, "
+                "--intern-strings, or --share-properties",
+                param_hint="--stream",
+            )
+        if output_format != "geojson" or any(
+            x is not None
+            for x in [
+                max_features,
+                max_bytes,
+                partition_property,
+                partition_grid,
+                partition_time,
+            ]
+        ):
+            raise click.BadParameter(
+                "must be 'geojson' without sharding to stream",
+                param_hint="--output-format",
+            )
+        try:
+            convert_streaming(
+                kml_path_or_buffer,
+                output_dir,
+                feature_collection_name=feature_collection_name,
+                bbox=bbox,
+                dimensions=dimensions,
+                altitude=altitude,
+                time_range=time_range,
+                rfc7946=rfc7946,
+                hilbert_sort=hilbert_sort,
+                sort_memory=2**28 if sort_memory is None else sort_memory,
+                compress=compress,
+                workers=workers,
+                checkpoint_every=checkpoint_every,
+                resume=resume,
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        return
+
+    options = dict(
+        feature_collection_name=feature_collection_name,
         style_type=style_type,
+        style_filename=style_filename,
         separate_folders=separate_folders,
-        feature_collection_name=feature_collection_name,
+        naming_strategy=naming_strategy,
+        bbox=bbox,
+        parser=parser,
+        recover=recover,
+        huge_tree=huge_tree,
+        time_range=time_range,
+        dimensions=dimensions,
+        altitude=altitude,
+        rfc7946=rfc7946,
+        hilbert_sort=hilbert_sort,
+        intern_strings=intern_strings,
+        share_properties=share_properties,
+        follow_links=follow_links,
+        fetch_http=li.fetch_http if follow_links else None,
+        link_cache=li.LinkCache(link_cache) if link_cache is not None else None,
+        output_format=output_format,
+        quantization=quantization,
+        min_zoom=min_zoom,
+        max_zoom=max_zoom,
+        workers=workers,
+        max_features=max_features,
+        max_bytes=max_bytes,
+        partition_property=partition_property,
+        partition_grid=partition_grid,
+        partition_time=partition_time,
+        writers=writers,
+        compress=compress,
+        memory_limit=memory_limit,
     )
+    if watch_:
+        if not pl.Path(kml_path_or_buffer).is_dir():
+            raise click.BadParameter(
+                "must be a directory in watch mode", param_hint="KML_PATH_OR_BUFFER"
+            )
+        pl.Path(output_dir).mkdir(parents=True, exist_ok=True)
+        try:
+            watch(
+                kml_path_or_buffer,
+                output_dir,
+                poll_interval=poll_interval,
+                debounce=debounce,
+                **options,
+            )
+        except KeyboardInterrupt:
+            sys.exit(0)
+    else:
+        convert_to_dir(kml_path_or_buffer, output_dir, **options)
 
-    # Create output directory if it doesn't exist
-    output_dir = pl.Path(output_dir)
-    if not output_dir.exists():
-        output_dir.mkdir(parents=True)
-    output_dir = output_dir.resolve()
 
-    # Write style file
-    path = output_dir / style_filename
-    with path.open("w") as tgt:
-        json.dump(style, tgt)
+@click.command(short_help="Serve KML to GeoJSON conversions over HTTP")
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", type=click.IntRange(0, 65535), default=8000)
+@click.option("-s", "--socket", "socket_path", default=None)
+@click.option("-w", "--workers", type=click.IntRange(1), default=None)
+@click.option("-c", "--max-concurrency", type=click.IntRange(1), default=None)
+@click.option("-t", "--timeout", type=click.FloatRange(0, min_open=True), default=60)
+def k2g_serve(host, port, socket_path, workers, max_concurrency, timeout):
+    """
+    Serve KML and KMZ to GeoJSON conversions over HTTP on the given host and port
+    or, if ``--socket`` is given, on a Unix socket at that path.
 
-    # Create filenames for layers
-    stems = m.disambiguate(m.to_filename(layer["name"]) for layer in layers)
-    filenames = [f"{stem}.geojson" for stem in stems]
+    Conversions run on a pool of ``--workers`` processes, which defaults to the
+    number of CPUs and is warmed up at startup.
+    POST a KML or KMZ file to ``/convert`` to get back the GeoJSON that the
+    ``convert`` function produces, using query parameters such as
+    ``?style_type=leaflet&separate_folders=true`` to set its options, and
+    ``format=geojsonseq`` to stream the Features as GeoJSON text sequences.
+    GET ``/metrics`` for request counts, throughput, and latency percentiles.
 
-    # Write layer files
-    for i in range(len(layers)):
-        path = output_dir / filenames[i]
-        with path.open("w") as tgt:
-            json.dump(layers[i], tgt)
+    Requests beyond ``--max-concurrency`` concurrent ones, which defaults to twice
+    the number of workers, are rejected with status 503, and conversions taking
+    longer than ``--timeout`` seconds get status 504.
+    """
+    click.echo(f"Serving on {socket_path or f'http://{host}:{port}'}", err=True)
+    s.serve(
+        host,
+        port,
+        socket_path=socket_path,
+        workers=workers,
+        max_concurrency=max_concurrency,
+        timeout=timeout,
+    )
@@ -0,0 +1,216 @@
+"""
+A file writer that compresses its output with gzip or Zstandard in blocks on a pool
+of threads, in the manner of pigz, while still producing a single valid stream.
+Zstandard requires the optional dependency zstandard, installable via the extra
+'zstd'.
+"""
+
+from __future__ import annotations
+import collections
+import concurrent.futures as cf
+import io
+import os
+import struct
+import zlib
+from typing import BinaryIO, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#: Compression formats of :class:`BlockCompressor`
+COMPRESSIONS = [
+    "gzip",
+    "zstd",
+]
+
+#: File name suffixes of the compression formats
+SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+#: Default compression levels of the compression formats
+DEFAULT_LEVELS = {
+    "gzip": 6,
+    "zstd": 3,
+}
+
+#: Number of uncompressed bytes per block
+BLOCK_SIZE = 2**20
+
+#: Number of trailing bytes of a block that prime the compression of the next block
+DICTIONARY_SIZE = 2**15
+
+# Header of a gzip member without file name or modification time
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def deflate_block(data: bytes, dictionary: bytes, level: int, last: bool) -> bytes:
+    """
+    Compress the given data to raw deflate blocks, priming the compressor with the given dictionary, if any,
+    which should be the data preceding the given data in the stream.
+    If not ``last``, then end with a sync flush, so that the next block can be appended;
+    otherwise end the deflate stream.
+    """
+    if dictionary:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def zstd_block(data: bytes, level: int) -> bytes:
+    """
+    Compress the given data to a Zstandard frame.
+    """
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class BlockCompressor(io.BufferedIOBase):
+    """
+    Binary file object that compresses the bytes written to it and writes them to the given binary file object.
+
+    Cut the data into blocks of ``block_size`` bytes and compress the blocks concurrently on a pool of ``workers`` threads,
+    which defaults to the number of CPUs, writing them out in order with at most two blocks per worker pending.
+    For gzip, write one gzip member whose deflate stream is the concatenation of the blocks,
+    each compressed with the end of the previous block as dictionary, as pigz does.
+    For Zstandard, write one frame per block; a Zstandard stream is a sequence of frames.
+
+    Closing this object ends the stream but leaves the target file open.
+    To continue a gzip stream, pass the state returned by :meth:`checkpoint` as ``state``;
+    the header is then not written again.
+    """
+
+    executor = None
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        compression: str = "gzip",
+        *,
+        level: Optional[int] = None,
+        workers: Optional[int] = None,
+        block_size: int = BLOCK_SIZE,
+        state: Optional[dict] = None,
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError(
+                "zstd compression requires zstandard; "
+                "install it via the extra 'kml2geojson[zstd]'"
+            )
+        self.fileobj = fileobj
+        self.compression = compression
+        self.level = DEFAULT_LEVELS[compression] if level is None else level
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = cf.ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.dictionary = b""
+        if state is None:
+            self.crc = 0
+            self.size = 0
+            if compression == "gzip":
+                fileobj.write(GZIP_HEADER)
+        else:
+            self.crc = state["crc"]
+            self.size = state["size"]
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[: self.block_size])
+            del self.buffer[: self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block: bytes, last: bool = False) -> None:
+        if self.compression == "gzip":
+            self.crc = zlib.crc32(block, self.crc)
+            self.size += len(block)
+            future = self.executor.submit(
+                deflate_block, block, self.dictionary, self.level, last
+            )
+            self.dictionary = block[-DICTIONARY_SIZE:]
+        else:
+            future = self.executor.submit(zstd_block, block, self.level)
+        self.pending.append(future)
+        while len(self.pending) > 2 * self.workers:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def _drain(self) -> None:
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def flush(self) -> None:
+        """
+        Write out the compressed blocks pending so far, keeping the bytes of the unfinished block buffered.
+        """
+        if self.closed:
+            return
+        self._drain()
+        self.fileobj.flush()
+
+    def checkpoint(self) -> dict:
+        """
+        Compress the buffered bytes as a block, if any, write out all the pending blocks,
+        and start the next block without dictionary.
+        Return the state needed to continue the stream from the current end of the target file.
+        """
+        if self.buffer:
+            block = bytes(self.buffer)
+            self.buffer.clear()
+            self._submit(block)
+        self.flush()
+        self.dictionary = b""
+        return {"crc": self.crc, "size": self.size}
+
+    def close(self) -> None:
+        """
+        Compress the remaining bytes, end the stream, and shut down the thread pool.
+        """
+        if self.closed:
+            return
+        try:
+            if self.compression == "gzip":
+                block = bytes(self.buffer)
+                self.buffer.clear()
+                self._submit(block, last=True)
+                self._drain()
+                self.fileobj.write(struct.pack("<II", self.crc, self.size & 0xFFFFFFFF))
+            else:
+                if self.buffer:
+                    self._submit(bytes(self.buffer))
+                    self.buffer.clear()
+                self._drain()
+            self.fileobj.flush()
+        finally:
+            self.executor.shutdown()
+            super().close()
+
+    def __del__(self):
+        # Abandon rather than end a stream that was not closed, such as after an error
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+def open_compressed(
+    fileobj: BinaryIO, compression: str, mode: str = "wb", **kwargs
+) -> BinaryIO | io.TextIOWrapper:
+    """
+    Return a :class:`BlockCompressor` with the given keyword arguments that writes to the given binary file object,
+    wrapped in a UTF-8 text file object if the mode is 'w' instead of 'wb'.
+    """
+    f = BlockCompressor(fileobj, compression, **kwargs)
+    if mode == "w":
+        return io.TextIOWrapper(f, encoding="utf-8")
+    return f
@@ -0,0 +1,267 @@
+"""
+Functions to convert KML files directly to GeoPandas GeoDataFrames, writing the
+properties of the Placemarks straight into columns and building the geometry array in
+bulk instead of going through GeoJSON Features.
+Requires the optional dependencies GeoPandas and Shapely 2, installable via the extra
+'geopandas'.
+"""
+
+from __future__ import annotations
+import pathlib as pl
+from typing import Optional, TextIO, BinaryIO
+
+try:
+    import geopandas as gpd
+    import numpy as np
+    import shapely
+except ImportError:
+    gpd = None
+
+import kml2geojson.main as m
+
+#: Geometry types whose coordinates are buffered by :func:`build_columns`
+BUFFER_TYPES = [
+    "Point",
+    "LineString",
+    "Polygon",
+]
+
+
+def add_geometry(buffers: dict, geometry: dict, row: int, part: int = 0) -> int:
+    """
+    Append the coordinates of the given (decoded) GeoJSON geometry, which belongs to the given row,
+    to the given buffers in the ragged array layout of Shapely, splitting GeometryCollections into their parts.
+    Return the number of parts added.
+
+    The buffers form a dictionary of the form (geometry type, number of dimensions) -> buffer,
+    where each buffer is a dictionary of flat coordinates, ring and polygon offsets,
+    and the row and the position within the row of each geometry.
+    """
+    t = geometry["type"]
+    if t == "GeometryCollection":
+        n = 0
+        for g in geometry["geometries"]:
+            n += add_geometry(buffers, g, row, part + n)
+        return n
+    if t not in BUFFER_TYPES:
+        raise ValueError(f"geometry type must be one of {BUFFER_TYPES}")
+
+    coordinates = geometry["coordinates"]
+    if t == "Point":
+        first = coordinates
+    elif t == "LineString":
+        first = coordinates[0] if coordinates else []
+    else:
+        first = coordinates[0][0] if coordinates and coordinates[0] else []
+    key = (t, max(len(first), 2))
+    buffer = buffers.get(key)
+    if buffer is None:
+        buffer = buffers[key] = {
+            "coords": [],
+            "rings": [0],
+            "polygons": [0],
+            "rows": [],
+            "parts": [],
+        }
+
+    coords = buffer["coords"]
+    if t == "Point":
+        coords.append(coordinates)
+    elif t == "LineString":
+        coords.extend(coordinates)
+        buffer["rings"].append(len(coords))
+    else:
+        for ring in coordinates:
+            coords.extend(ring)
+            buffer["rings"].append(len(coords))
+        buffer["polygons"].append(len(buffer["rings"]) - 1)
+    buffer["rows"].append(row)
+    buffer["parts"].append(part)
+    return 1
+
+
+class _Row:
+    """
+    Write-only view of one row of the given columns, which holds the properties of a Placemark
+    for :func:`kml2geojson.main.build_properties` without building a dictionary per Placemark.
+    """
+
+    def __init__(self, columns: dict[str, list]):
+        self.columns = columns
+        self.n = 0
+
+    def __contains__(self, key: str) -> bool:
+        column = self.columns.get(key)
+        return column is not None and len(column) > self.n
+
+    def __setitem__(self, key: str, value) -> None:
+        if key == "timeSpan":
+            self["timeSpan_begin"] = value["begin"] or None
+            self["timeSpan_end"] = value["end"] or None
+            return
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = [None] * self.n
+        elif len(column) > self.n:
+            # Later properties override earlier ones of the same name
+            column[self.n] = value
+            return
+        elif len(column) < self.n:
+            column.extend([None] * (self.n - len(column)))
+        column.append(value)
+
+
+def build_columns(
+    node: m.Node,
+    *,
+    separate_folders: bool = False,
+    naming_strategy: str = "append",
+    **kwargs,
+) -> tuple[dict[str, list], dict, int]:
+    """
+    Build the geometries of the Placemarks of the given KML DOM node via :func:`kml2geojson.main.build_geometry`
+    with the given keyword arguments, skipping Placemarks without any, as :func:`kml2geojson.main.build_feature` does,
+    and write their properties via :func:`kml2geojson.main.build_properties` straight into columns.
+    Return a triple (columns, geometry buffers, number of rows), where the columns
+    dictionary maps each property name, such as 'name', 'description', 'styleUrl', or an ExtendedData name, to a list of values,
+    with ``None`` for Features lacking the property, and the geometry buffers are as in :func:`add_geometry`.
+    TimeSpans go into the columns 'timeSpan_begin' and 'timeSpan_end', and Placemark IDs into the column 'id'.
+
+    If ``separate_folders``, then take the Placemarks folder by folder, as in :func:`kml2geojson.main.build_layers`,
+    and add the column 'layer' of folder names, disambiguated with the given naming strategy.
+    """
+    if separate_folders:
+        groups = [(m.val(m.get1(f, "name")), f) for f in m.get(node, "Folder")]
+    else:
+        groups = []
+    if not groups:
+        groups = [(m.val(m.get1(node, "name")), node)]
+
+    columns = {}
+    buffers = {}
+    n = 0
+    layer_names = []
+    layer_sizes = []
+    row = _Row(columns)
+
+    for name, group in groups:
+        start = n
+        for placemark in m.get(group, "Placemark"):
+            geoms_and_times = m.build_geometry(placemark, **kwargs)
+            if not geoms_and_times["geoms"]:
+                continue
+            row.n = n
+            m.build_properties(placemark, geoms_and_times["times"], row)
+            if m.attr(placemark, "id"):
+                row["id"] = m.attr(placemark, "id")
+            part = 0
+            for geometry in geoms_and_times["geoms"]:
+                part += add_geometry(buffers, geometry, n, part)
+            n += 1
+        if n > start:
+            layer_names.append(name)
+            layer_sizes.append(n - start)
+
+    for column in columns.values():
+        column.extend([None] * (n - len(column)))
+
+    if separate_folders:
+        names = m.disambiguate(layer_names, strategy=naming_strategy)
+        columns["layer"] = [
+            name for name, size in zip(names, layer_sizes) for _ in range(size)
+        ]
+
+    return columns, buffers, n
+
+
+def build_geometry_array(buffers: dict, n: int):
+    """
+    Convert the given geometry buffers of ``n`` rows into a NumPy array of ``n`` Shapely geometries,
+    building each kind of geometry in bulk from its ragged array and combining the parts of multipart rows into GeometryCollections.
+    """
+    geometries = np.empty(n, dtype=object)
+    multi = np.zeros(n, dtype=bool)
+    arrays, rows, parts = [], [], []
+    for (t, ndim), buffer in buffers.items():
+        coords = np.asarray(buffer["coords"], dtype=float).reshape(-1, ndim)
+        rings = np.asarray(buffer["rings"], dtype=np.int64)
+        if not len(coords):
+            # Shapely fails on ragged arrays of only empty geometries
+            geometry_type = getattr(shapely.GeometryType, t.upper())
+            array = shapely.empty(len(buffer["rows"]), geom_type=geometry_type)
+        elif t == "Point":
+            array = shapely.from_ragged_array(shapely.GeometryType.POINT, coords)
+        elif t == "LineString":
+            array = shapely.from_ragged_array(
+                shapely.GeometryType.LINESTRING, coords, (rings,)
+            )
+        else:
+            polygons = np.asarray(buffer["polygons"], dtype=np.int64)
+            array = shapely.from_ragged_array(
+                shapely.GeometryType.POLYGON, coords, (rings, polygons)
+            )
+        arrays.append(array)
+        rows.append(np.asarray(buffer["rows"], dtype=np.int64))
+        parts.append(np.asarray(buffer["parts"], dtype=np.int64))
+
+    if not arrays:
+        return geometries
+
+    array = np.concatenate(arrays)
+    rows = np.concatenate(rows)
+    parts = np.concatenate(parts)
+    multi[rows[parts > 0]] = True
+
+    # Rows with one geometry take it as is
+    single = ~multi[rows]
+    geometries[rows[single]] = array[single]
+
+    # Rows with several geometries get a GeometryCollection of them in order
+    if multi.any():
+        order = np.lexsort((parts, rows))
+        order = order[multi[rows[order]]]
+        shapely.geometrycollections(array[order], indices=rows[order], out=geometries)
+
+    return geometries
+
+
+def to_geodataframe(
+    kml_path_or_buffer: str | pl.Path | TextIO | BinaryIO,
+    *,
+    separate_folders: bool = False,
+    naming_strategy: str = "append",
+    parser: str = "auto",
+    recover: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+):
+    """
+    Given a path to a KML or KMZ file or given a KML or KMZ file object,
+    parse it via :func:`kml2geojson.main.parse_kml` with the given ``parser`` and ``recover`` options,
+    and return a GeoPandas GeoDataFrame in WGS84 with one row per Placemark that has geodata.
+
+    The columns are built via :func:`build_columns`, so that with ``separate_folders``
+    all the folders go into one GeoDataFrame with a 'layer' column,
+    and the geometries are built in bulk via :func:`build_geometry_array`.
+    Handle altitudes according to ``dimensions`` and ``altitude``; see :func:`kml2geojson.main.build_geometry`.
+
+    Raise an ImportError if GeoPandas or Shapely 2 is not installed.
+    """
+    if gpd is None:
+        raise ImportError(
+            "to_geodataframe() requires GeoPandas and Shapely 2; "
+            "install them via the extra 'kml2geojson[geopandas]'"
+        )
+    if altitude not in m.ALTITUDE_MODES:
+        raise ValueError(f"altitude mode must be one of {m.ALTITUDE_MODES}")
+
+    root = m.parse_kml(kml_path_or_buffer, parser=parser, recover=recover)
+    columns, buffers, n = build_columns(
+        root,
+        separate_folders=separate_folders,
+        naming_strategy=naming_strategy,
+        dimensions=dimensions,
+        altitude=altitude,
+    )
+    geometries = build_geometry_array(buffers, n)
+    return gpd.GeoDataFrame(columns, geometry=geometries, crs="EPSG:4326")
@@ -0,0 +1,420 @@
+"""
+Functions to write GeoJSON FeatureCollections to GeoPackage files using only the
+standard library module ``sqlite3``.
+"""
+
+from __future__ import annotations
+import json
+import math
+import pathlib as pl
+import sqlite3
+import struct
+from typing import Iterable
+
+import kml2geojson.main as m
+
+#: GeoPackage 'GPKG' application ID and version 1.3.0
+APPLICATION_ID = 0x47504B47
+USER_VERSION = 10300
+
+#: WKB geometry type codes
+WKB_TYPES = {
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+    "GeometryCollection": 7,
+}
+
+#: Table name prefixes reserved by GeoPackage and SQLite, which layer names may not start with
+RESERVED_PREFIXES = ("gpkg_", "rtree_", "sqlite_")
+
+SCHEMA = """
+    CREATE TABLE gpkg_spatial_ref_sys (
+        srs_name TEXT NOT NULL,
+        srs_id INTEGER PRIMARY KEY,
+        organization TEXT NOT NULL,
+        organization_coordsys_id INTEGER NOT NULL,
+        definition TEXT NOT NULL,
+        description TEXT
+    );
+    CREATE TABLE gpkg_contents (
+        table_name TEXT NOT NULL PRIMARY KEY,
+        data_type TEXT NOT NULL,
+        identifier TEXT UNIQUE,
+        description TEXT DEFAULT '',
+        last_change DATETIME NOT NULL
+            DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+        min_x DOUBLE,
+        min_y DOUBLE,
+        max_x DOUBLE,
+        max_y DOUBLE,
+        srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id)
+    );
+    CREATE TABLE gpkg_geometry_columns (
+        table_name TEXT NOT NULL REFERENCES gpkg_contents(table_name),
+        column_name TEXT NOT NULL,
+        geometry_type_name TEXT NOT NULL,
+        srs_id INTEGER NOT NULL REFERENCES gpkg_spatial_ref_sys(srs_id),
+        z TINYINT NOT NULL,
+        m TINYINT NOT NULL,
+        CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name)
+    );
+    CREATE TABLE gpkg_extensions (
+        table_name TEXT,
+        column_name TEXT,
+        extension_name TEXT NOT NULL,
+        definition TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name)
+    );
+"""
+
+SPATIAL_REF_SYS = [
+    (
+        "WGS 84 geodetic",
+        4326,
+        "EPSG",
+        4326,
+        'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,'
+        'AUTHORITY["EPSG","7030"]],AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,'
+        'AUTHORITY["EPSG","8901"]],UNIT["degree",0.0174532925199433,'
+        'AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]',
+        "longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid",
+    ),
+    ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+    ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None),
+]
+
+# Triggers of the RTree spatial index extension, keeping the index up to date when
+# other software edits the table; they call functions that such software provides
+RTREE_TRIGGERS = """
+    CREATE TRIGGER "{rtree}_insert" AFTER INSERT ON {t}
+    WHEN (new.geom NOT NULL AND NOT ST_IsEmpty(NEW.geom))
+    BEGIN
+        INSERT OR REPLACE INTO "{rtree}" VALUES (NEW.fid,
+            ST_MinX(NEW.geom), ST_MaxX(NEW.geom),
+            ST_MinY(NEW.geom), ST_MaxY(NEW.geom));
+    END;
+    CREATE TRIGGER "{rtree}_update1" AFTER UPDATE OF geom ON {t}
+    WHEN OLD.fid = NEW.fid AND (NEW.geom NOTNULL AND NOT ST_IsEmpty(NEW.geom))
+    BEGIN
+        INSERT OR REPLACE INTO "{rtree}" VALUES (NEW.fid,
+            ST_MinX(NEW.geom), ST_MaxX(NEW.geom),
+            ST_MinY(NEW.geom), ST_MaxY(NEW.geom));
+    END;
+    CREATE TRIGGER "{rtree}_update2" AFTER UPDATE OF geom ON {t}
+    WHEN OLD.fid = NEW.fid AND (NEW.geom ISNULL OR ST_IsEmpty(NEW.geom))
+    BEGIN
+        DELETE FROM "{rtree}" WHERE id = OLD.fid;
+    END;
+    CREATE TRIGGER "{rtree}_update3" AFTER UPDATE ON {t}
+    WHEN OLD.fid != NEW.fid AND (NEW.geom NOTNULL AND NOT ST_IsEmpty(NEW.geom))
+    BEGIN
+        DELETE FROM "{rtree}" WHERE id = OLD.fid;
+        INSERT OR REPLACE INTO "{rtree}" VALUES (NEW.fid,
+            ST_MinX(NEW.geom), ST_MaxX(NEW.geom),
+            ST_MinY(NEW.geom), ST_MaxY(NEW.geom));
+    END;
+    CREATE TRIGGER "{rtree}_update4" AFTER UPDATE ON {t}
+    WHEN OLD.fid != NEW.fid AND (NEW.geom ISNULL OR ST_IsEmpty(NEW.geom))
+    BEGIN
+        DELETE FROM "{rtree}" WHERE id IN (OLD.fid, NEW.fid);
+    END;
+    CREATE TRIGGER "{rtree}_delete" AFTER DELETE ON {t}
+    WHEN old.geom NOT NULL
+    BEGIN
+        DELETE FROM "{rtree}" WHERE id = OLD.fid;
+    END;
+"""
+
+
+def quote(name: str) -> str:
+    """
+    Quote the given name as an SQL identifier.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def unique_names(names: list[str], reserved: Iterable[str] = ()) -> list[str]:
+    """
+    Disambiguate the given names case-insensitively, as SQLite compares identifiers,
+    and away from the given reserved names, by appending underscores and counters.
+
+    EXAMPLE::
+
+        >>> unique_names(['Name', 'name', 'fid'], reserved=['fid', 'geom'])
+        ['Name', 'name_2', 'fid_2']
+
+    """
+    seen = {r.lower() for r in reserved}
+    result = []
+    for name in names:
+        new_name, k = name, 1
+        while new_name.lower() in seen:
+            k += 1
+            new_name = f"{name}_{k}"
+        seen.add(new_name.lower())
+        result.append(new_name)
+    return result
+
+
+def _points(geometry: dict) -> Iterable[list[float]]:
+    t = geometry["type"]
+    if t == "Point":
+        yield geometry["coordinates"]
+    elif t == "LineString":
+        yield from geometry["coordinates"]
+    elif t in ["Polygon", "MultiPoint", "MultiLineString"]:
+        for part in geometry["coordinates"]:
+            yield from part if t != "MultiPoint" else [part]
+    elif t == "MultiPolygon":
+        for polygon in geometry["coordinates"]:
+            for ring in polygon:
+                yield from ring
+    elif t == "GeometryCollection":
+        for g in geometry["geometries"]:
+            yield from _points(g)
+
+
+def _wkb(geometry: dict, z: bool, out: list[bytes]) -> None:
+    t = geometry["type"]
+    fmt = "<ddd" if z else "<dd"
+
+    def point(p):
+        if z:
+            return struct.pack(fmt, p[0], p[1], p[2] if len(p) > 2 else 0.0)
+        return struct.pack(fmt, p[0], p[1])
+
+    out.append(struct.pack("<BI", 1, WKB_TYPES[t] + (1000 if z else 0)))
+    if t == "Point":
+        coords = geometry["coordinates"]
+        if coords:
+            out.append(point(coords))
+        else:
+            out.append(struct.pack(fmt, *[math.nan] * (3 if z else 2)))
+    elif t == "LineString":
+        out.append(struct.pack("<I", len(geometry["coordinates"])))
+        out.extend(point(p) for p in geometry["coordinates"])
+    elif t == "Polygon":
+        out.append(struct.pack("<I", len(geometry["coordinates"])))
+        for ring in geometry["coordinates"]:
+            out.append(struct.pack("<I", len(ring)))
+            out.extend(point(p) for p in ring)
+    elif t.startswith("Multi"):
+        # Each part is a complete WKB geometry of the single type
+        out.append(struct.pack("<I", len(geometry["coordinates"])))
+        for part in geometry["coordinates"]:
+            _wkb({"type": t[5:], "coordinates": part}, z, out)
+    else:
+        out.append(struct.pack("<I", len(geometry["geometries"])))
+        for g in geometry["geometries"]:
+            _wkb(g, z, out)
+
+
+def encode_geometry(
+    geometry: dict | None, srs_id: int = 4326
+) -> tuple[bytes | None, tuple[float, float, float, float] | None, bool]:
+    """
+    Encode the given (decoded) GeoJSON geometry as a GeoPackage geometry blob,
+    that is, a GeoPackage header with the envelope of the geometry followed by the geometry in little-endian ISO WKB,
+    which has Z values if and only if any coordinate tuple has an altitude.
+    Return a triple (blob, envelope (min_x, max_x, min_y, max_y) or ``None`` if the geometry is empty, whether the geometry has Z values).
+    Return ``(None, None, False)`` if the geometry is ``None``.
+    """
+    if geometry is None:
+        return None, None, False
+
+    min_x = min_y = math.inf
+    max_x = max_y = -math.inf
+    z = False
+    for p in _points(geometry):
+        x, y = p[0], p[1]
+        if x < min_x:
+            min_x = x
+        if x > max_x:
+            max_x = x
+        if y < min_y:
+            min_y = y
+        if y > max_y:
+            max_y = y
+        if len(p) > 2:
+            z = True
+
+    if min_x <= max_x:
+        envelope = (min_x, max_x, min_y, max_y)
+        # Flags: little endian, envelope [min_x, max_x, min_y, max_y]
+        out = [struct.pack("<2sBBi4d", b"GP", 0, 0b011, srs_id, *envelope)]
+    else:
+        envelope = None
+        # Flags: little endian, empty geometry, no envelope
+        out = [struct.pack("<2sBBi", b"GP", 0, 0b10001, srs_id)]
+    _wkb(geometry, z, out)
+    return b"".join(out), envelope, z
+
+
+def column_type(values: Iterable) -> str:
+    """
+    Return the SQLite column type that fits all the given property values that are not ``None``:
+    'INTEGER', 'REAL', or else 'TEXT'.
+    """
+    result = None
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool) or not isinstance(v, (int, float)):
+            return "TEXT"
+        if isinstance(v, float):
+            result = "REAL"
+        elif result is None:
+            result = "INTEGER"
+    return result or "TEXT"
+
+
+def write_geopackage(
+    layers: list[dict],
+    path: str | pl.Path,
+    *,
+    naming_strategy: str = "append",
+    batch_size: int = 10_000,
+) -> int:
+    """
+    Write the given GeoJSON FeatureCollections, such as those produced by :func:`kml2geojson.main.build_layers`,
+    to a GeoPackage file at the given path, overwriting any existing file, and return the number of Features written.
+
+    Create one feature table per FeatureCollection, named after it,
+    with the geometry column 'geom' in WGS84 and one column per property name, such as an ExtendedData name,
+    typed via :func:`column_type`, with lists and dictionaries encoded as JSON text,
+    and, if any Feature has an id, the text column 'id', renamed via :func:`unique_names` if a property already has that name.
+    Disambiguate table names first with the given naming strategy from
+    :const:`kml2geojson.main.NAMING_STRATEGIES` and then case-insensitively via :func:`unique_names`,
+    after prefixing names that start with one of :const:`RESERVED_PREFIXES`, such as 'gpkg_contents', with 'layer_'.
+
+    Insert the Features via ``executemany`` in batches of ``batch_size`` within one transaction per table,
+    with journaling and syncing turned off, since the file is only usable once complete,
+    and build the RTree spatial index of each table once at the end.
+    """
+    path = pl.Path(path)
+    if path.exists():
+        path.unlink()
+
+    names = [layer.get("name") or "main" for layer in layers]
+    names = [
+        f"layer_{name}" if name.lower().startswith(RESERVED_PREFIXES) else name
+        for name in m.disambiguate(names, strategy=naming_strategy)
+    ]
+    names = unique_names(names)
+    count = 0
+    con = sqlite3.connect(str(path))
+    try:
+        con.executescript(f"""
+            PRAGMA application_id = {APPLICATION_ID};
+            PRAGMA user_version = {USER_VERSION};
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            {SCHEMA}
+            """)
+        with con:
+            con.executemany(
+                "INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)",
+                SPATIAL_REF_SYS,
+            )
+
+        for name, layer in zip(names, layers):
+            count += _write_layer(con, name, layer["features"], batch_size)
+    finally:
+        con.close()
+    return count
+
+
+def _write_layer(
+    con: sqlite3.Connection, name: str, features: list[dict], batch_size: int
+) -> int:
+    # Collect columns in order of first appearance
+    keys = {}
+    for f in features:
+        for k in f["properties"]:
+            keys.setdefault(k, None)
+    keys = list(keys)
+    types = [column_type(f["properties"].get(k) for f in features) for k in keys]
+    # The Features' ids, i.e. the Placemark ids, go last, yielding to properties
+    has_id = any("id" in f for f in features)
+    columns = unique_names(keys + ["id"] * has_id, reserved=["fid", "geom"])
+    types += ["TEXT"] * has_id
+
+    t = quote(name)
+    column_defs = "".join(f", {quote(c)} {ty}" for c, ty in zip(columns, types))
+    con.execute(
+        f"CREATE TABLE {t} (fid INTEGER PRIMARY KEY AUTOINCREMENT, "
+        f"geom GEOMETRY{column_defs})"
+    )
+    insert = f"INSERT INTO {t} VALUES (?, ?{', ?' * len(columns)})"
+
+    def value(v):
+        if isinstance(v, (list, dict)):
+            return json.dumps(v)
+        return v
+
+    geometry_types = set()
+    has_z = False
+    rtree = []
+    bbox = list(m.EMPTY_BBOX)
+    batch = []
+    with con:
+        for fid, f in enumerate(features, 1):
+            blob, envelope, z = encode_geometry(f.get("geometry"))
+            if envelope is not None:
+                rtree.append((fid, *envelope))
+                m.update_bbox(bbox, (envelope[0], envelope[2]))
+                m.update_bbox(bbox, (envelope[1], envelope[3]))
+            if blob is not None:
+                geometry_types.add(f["geometry"]["type"])
+            has_z = has_z or z
+            props = f["properties"]
+            row = [fid, blob, *(value(props.get(k)) for k in keys)]
+            if has_id:
+                row.append(f.get("id"))
+            batch.append(row)
+            if len(batch) >= batch_size:
+                con.executemany(insert, batch)
+                batch = []
+        if batch:
+            con.executemany(insert, batch)
+
+        if len(geometry_types) == 1:
+            geometry_type = geometry_types.pop().upper()
+        else:
+            geometry_type = "GEOMETRY"
+        extent = bbox if bbox[0] <= bbox[2] else [None] * 4
+        con.execute(
+            "INSERT INTO gpkg_contents (table_name, data_type, identifier, "
+            "min_x, min_y, max_x, max_y, srs_id) "
+            "VALUES (?, 'features', ?, ?, ?, ?, ?, 4326)",
+            (name, name, *extent),
+        )
+        con.execute(
+            "INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, 4326, ?, 0)",
+            (name, geometry_type, int(has_z)),
+        )
+
+    # Build the spatial index once all the rows are in
+    rtree_name = f"rtree_{name}_geom".replace('"', '""')
+    with con:
+        con.execute(
+            f'CREATE VIRTUAL TABLE "{rtree_name}" '
+            "USING rtree(id, minx, maxx, miny, maxy)"
+        )
+        for i in range(0, len(rtree), batch_size):
+            con.executemany(
+                f'INSERT INTO "{rtree_name}" VALUES (?, ?, ?, ?, ?)',
+                rtree[i : i + batch_size],
+            )
+        con.execute(
+            "INSERT INTO gpkg_extensions VALUES (?, 'geom', 'gpkg_rtree_index', "
+            "'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')",
+            (name,),
+        )
+        con.executescript(RTREE_TRIGGERS.format(rtree=rtree_name, t=t))
+    return len(features)
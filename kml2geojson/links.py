@@ -0,0 +1,209 @@
+"""
+Functions to fetch the documents that KML NetworkLinks refer to, concurrently and
+through a cache that revalidates documents by URL.
+
+A fetcher is a function ``fetch(url, validators) -> (content, validators)`` that takes
+a URL and the validators of the cached copy of its document, if any, and returns the
+document's bytes, or ``None`` if the cached copy is still valid, along with the current
+validators, such as the modification time and size of a file or the ETag and
+Last-Modified headers of an HTTP response.
+"""
+
+from __future__ import annotations
+import concurrent.futures as cf
+import hashlib
+import json
+import os
+import pathlib as pl
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Callable, Optional
+
+#: Default number of documents fetched concurrently
+LINK_WORKERS = 8
+
+
+def to_url(href: str, base_url: Optional[str] = None) -> str:
+    """
+    Resolve the given NetworkLink href against the given base URL, if any, and return the result as a URL,
+    turning bare file paths into file URLs.
+    """
+    if base_url is not None:
+        return urllib.parse.urljoin(base_url, href)
+    if urllib.parse.urlsplit(href).scheme in ["file", "http", "https"]:
+        return href
+    return pl.Path(href).resolve().as_uri()
+
+
+def url_to_path(url: str) -> pl.Path:
+    """
+    Return the local path of the given file URL.
+    """
+    return pl.Path(urllib.request.url2pathname(urllib.parse.urlsplit(url).path))
+
+
+def fetch_file(url: str, validators: dict) -> tuple[bytes | None, dict]:
+    """
+    Fetcher for file URLs, whose validators are the modification time and size of the file.
+    """
+    path = url_to_path(url)
+    stat = path.stat()
+    current = {"mtime": stat.st_mtime, "size": stat.st_size}
+    if validators == current:
+        return None, current
+    return path.read_bytes(), current
+
+
+def fetch_http(
+    url: str, validators: dict, timeout: float = 30
+) -> tuple[bytes | None, dict]:
+    """
+    Fetcher for HTTP and HTTPS URLs via :mod:`urllib`, whose validators are the ETag and Last-Modified response headers,
+    sent back as conditional request headers.
+    """
+    request = urllib.request.Request(url)
+    if validators.get("etag"):
+        request.add_header("If-None-Match", validators["etag"])
+    if validators.get("last_modified"):
+        request.add_header("If-Modified-Since", validators["last_modified"])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content = response.read()
+            headers = response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, validators
+        raise
+    current = {}
+    if headers.get("ETag"):
+        current["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        current["last_modified"] = headers["Last-Modified"]
+    return content, current
+
+
+class LinkCache:
+    """
+    Thread-safe cache of fetched documents and their validators by URL, held in memory
+    and, if a directory is given, also stored there, so that it persists across runs.
+    """
+
+    def __init__(self, directory: str | pl.Path | None = None):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.directory = None
+        if directory is not None:
+            self.directory = pl.Path(directory)
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __getstate__(self):
+        # Pickle only the directory, for use in worker processes
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def _paths(self, url: str) -> tuple[pl.Path, pl.Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / key, self.directory / f"{key}.json"
+
+    def get(self, url: str) -> tuple[bytes, dict] | None:
+        """
+        Return the pair (content, validators) cached for the given URL, or ``None`` if there is none.
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry is not None or self.directory is None:
+            return entry
+        content_path, meta_path = self._paths(url)
+        try:
+            with meta_path.open() as src:
+                meta = json.load(src)
+            content = content_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta["url"] != url or meta["size"] != len(content):
+            return None
+        entry = content, meta["validators"]
+        with self.lock:
+            self.entries[url] = entry
+        return entry
+
+    def put(self, url: str, content: bytes, validators: dict) -> None:
+        """
+        Cache the given content and validators for the given URL.
+        """
+        with self.lock:
+            self.entries[url] = content, validators
+        if self.directory is None:
+            return
+        content_path, meta_path = self._paths(url)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        for path, data in [
+            (content_path, content),
+            (
+                meta_path,
+                json.dumps(
+                    {"url": url, "size": len(content), "validators": validators}
+                ).encode("utf-8"),
+            ),
+        ]:
+            tmp = path.with_name(path.name + suffix)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+
+def fetch(
+    url: str,
+    *,
+    fetch_http: Optional[Callable] = None,
+    cache: Optional[LinkCache] = None,
+) -> bytes:
+    """
+    Return the document at the given URL, fetched via :func:`fetch_file` for file URLs
+    and via the given fetcher, if any, for HTTP and HTTPS URLs,
+    and revalidated against and stored in the given cache, if any.
+    Raise a ``ValueError`` for other URLs and for HTTP URLs without fetcher.
+    """
+    scheme = urllib.parse.urlsplit(url).scheme
+    if scheme == "file":
+        fetcher = fetch_file
+    elif scheme in ["http", "https"] and fetch_http is not None:
+        fetcher = fetch_http
+    else:
+        raise ValueError(f"no fetcher for {url}")
+
+    cached = cache.get(url) if cache is not None else None
+    content, validators = fetcher(url, cached[1] if cached is not None else {})
+    if content is None:
+        return cached[0]
+    if cache is not None:
+        cache.put(url, content, validators)
+    return content
+
+
+def fetch_all(
+    urls: list[str],
+    *,
+    fetch_http: Optional[Callable] = None,
+    cache: Optional[LinkCache] = None,
+    workers: int = LINK_WORKERS,
+) -> dict[str, bytes | Exception]:
+    """
+    Fetch the documents at the given URLs via :func:`fetch` on a pool of ``workers`` threads,
+    each URL once, and return a dictionary mapping each URL to its document or, if fetching it failed, to the exception raised.
+    """
+    results = {}
+    with cf.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            url: executor.submit(fetch, url, fetch_http=fetch_http, cache=cache)
+            for url in dict.fromkeys(urls)
+        }
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                results[url] = e
+    return results
@@ -1,9 +1,45 @@
 from __future__ import annotations
 import xml.dom.minidom as md
-import xml.dom.minicompat as mc
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
 import re
+import math
+import bisect
+import heapq
+import json
+import tempfile
+import functools
+import mmap
+import os
+import io
+import weakref
+from array import array
+import zipfile
+import contextlib
+import threading
+import struct
 import pathlib as pl
-from typing import Optional, TextIO, BinaryIO
+import warnings
+from xml.sax.saxutils import unescape
+from typing import Callable, MutableMapping, Optional, TextIO, BinaryIO, Union, Iterator
+
+try:
+    import lxml.etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+from .topology import build_topology
+from . import links
+
+#: A parsed KML node: a minidom node or an ElementTree element,
+#: which also stands for an lxml element
+Node = Union[md.Node, ET.Element]
+
+#: Number of bits per axis of the Hilbert curve that orders Features spatially
+HILBERT_ORDER = 16
+
+#: Maximum number of sorted runs merged at once by :func:`external_sort`
+MAX_MERGE_RUNS = 64
 
 #: Atomic KML geometry types supported.
 #: MultiGeometry is handled separately.
@@ -23,46 +59,174 @@ STYLE_TYPES = [
 
 SPACE = re.compile(r"\s+")
 
+#: Strategies for disambiguating names; see :func:`disambiguate`
+NAMING_STRATEGIES = [
+    "append",
+    "counter",
+]
+
+#: Output formats of :func:`convert`
+OUTPUT_FORMATS = [
+    "geojson",
+    "topojson",
+]
+
+#: Altitude modes; see :func:`build_geometry`
+ALTITUDE_MODES = [
+    "keep",
+    "auto",
+]
+
+#: XML parsers supported; see :func:`parse_kml`
+PARSERS = [
+    "minidom",
+    "etree",
+    "lxml",
+]
+
+#: Input size in bytes above which the 'auto' parser switches from
+#: minidom to lxml or, if lxml is not installed, to ElementTree
+AUTO_PARSER_THRESHOLD = 2**20
+
+#: Namespace of the Google extensions to KML, whose tags have the prefix 'gx:'
+GX_NAMESPACE = "http://www.google.com/kml/ext/2.2"
+
+#: Tags that :func:`scan_placemarks` looks for in raw KML bytes,
+#: along with the starts of comments and CDATA sections, which it skips
+SCAN_TAG = re.compile(
+    rb"<(?:(!--|!\[CDATA\[)|"
+    rb"(/?)(?:[A-Za-z_][\w.-]*:)?(Folder|Placemark|name|coordinates|coord)\b([^>]*)>)"
+)
+
+#: Ends of the comments and CDATA sections skipped by :func:`scan_placemarks`
+SCAN_SKIP_END = {b"!--": b"-->", b"![CDATA[": b"]]>"}
+
+#: Namespace declarations that :func:`_scan_root` looks for in raw KML bytes
+XMLNS_DECLARATION = re.compile(
+    rb"""\sxmlns(?::([A-Za-z_][\w.-]*))?\s*=\s*(["'])(.*?)\2"""
+)
+
+#: Default maximum number of entries of a :class:`StringTable`
+STRING_TABLE_SIZE = 2**16
+
+#: Default maximum length of the strings interned by a :class:`StringTable`
+STRING_TABLE_MAX_LENGTH = 64
+
+#: Default maximum number of properties dictionaries shared by a :class:`StringTable`
+SHARED_PROPERTIES_SIZE = 2**12
+
+#: Suffix of placemark index files; see :func:`build_placemark_index`
+INDEX_SUFFIX = ".k2gi"
+
+#: Bounding box containing nothing; the starting point for
+#: :func:`update_bbox` and :func:`merge_bboxes`
+EMPTY_BBOX = (math.inf, math.inf, -math.inf, -math.inf)
+
+#: KML time values: XML Schema dateTime, date, gYearMonth, or gYear
+KML_TIME = re.compile(
+    r"(-?\d{4,})(?:-(\d\d)(?:-(\d\d)"
+    r"(?:T(\d\d):(\d\d)(?::(\d\d(?:\.\d*)?))?)?)?)?\s*(Z|[+-]\d\d:?\d\d)?"
+)
 
-def get(node: md.Document, name: str) -> mc.Nodelist:
+#: Time bucket sizes for :func:`partition_features`
+TIME_BUCKETS = [
+    "year",
+    "month",
+    "day",
+]
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_tag(parent_tag: str, name: str) -> str | None:
+    """
+    Return the ElementTree tag, such as ``'{http://www.opengis.net/kml/2.2}Placemark'``, of the sub-elements named by ``name`` of an element with tag ``parent_tag``,
+    where, as for minidom, names have the prefix 'gx:' for tags in the namespace :const:`GX_NAMESPACE` and no prefix for tags in the KML namespace, which is taken to be the namespace of the parent.
+    Return ``None`` if the parent is in the namespace :const:`GX_NAMESPACE` and the name has no prefix, because then the KML namespace is unknown.
+    """
+    gx_prefix = f"{{{GX_NAMESPACE}}}"
+    if name.startswith("gx:"):
+        return gx_prefix + name[3:]
+    elif parent_tag.startswith(gx_prefix):
+        return None
+    elif parent_tag.startswith("{"):
+        return parent_tag[: parent_tag.index("}") + 1] + name
+    else:
+        return name
+
+
+def iter_elements(node: Node, name: str):
+    """
+    Iterate over the descendants of the given ElementTree or lxml element that have the given tag name, as resolved by :func:`resolve_tag`.
+    """
+    target = resolve_tag(node.tag, name)
+    if target is None:
+        # Match local names, as for the <when> elements of a <gx:Track>
+        gx_prefix = f"{{{GX_NAMESPACE}}}"
+        suffix = "}" + name
+        for el in node.iter():
+            t = el.tag
+            if (t == name or t.endswith(suffix)) and not t.startswith(gx_prefix):
+                yield el
+        return
+
+    for el in node.iter(target):
+        if el is not node:
+            yield el
+
+
+def get(node: Node, name: str) -> list[Node]:
     """
     Given a KML Document Object Model (DOM) node, return a list of its sub-nodes that have the given tag name.
     """
-    return node.getElementsByTagName(name)
+    if isinstance(node, md.Node):
+        return node.getElementsByTagName(name)
+    target = resolve_tag(node.tag, name)
+    if target is None:
+        return list(iter_elements(node, name))
+    s = list(node.iter(target))
+    if s and s[0] is node:
+        del s[0]
+    return s
 
 
-def get1(node: md.Document, name: str) -> md.Element | None:
+def get1(node: Node, name: str) -> Node | None:
     """
     Return the first element of ``get(node, name)``, if it exists.
     Otherwise return ``None``.
     """
-    s = get(node, name)
-    if s:
-        return s[0]
-    else:
-        return None
+    if isinstance(node, md.Node):
+        s = get(node, name)
+        if s:
+            return s[0]
+        else:
+            return None
+    return next(iter_elements(node, name), None)
 
 
-def attr(node: md.Document, name: str) -> str:
+def attr(node: Node, name: str) -> str:
     """
     Return as a string the value of the given DOM node's attribute named by ``name``, if it exists.
     Otherwise, return an empty string.
     """
-    return node.getAttribute(name)
+    if isinstance(node, md.Node):
+        return node.getAttribute(name)
+    return node.get(name, "")
 
 
-def val(node: md.Document) -> str:
+def val(node: Node) -> str:
     """
     Normalize the given DOM node and return the value of its first child (the string content of the node) stripped of leading and trailing whitespace.
     """
     try:
-        node.normalize()
-        return node.firstChild.wholeText.strip()  # Handles CDATASection too
+        if isinstance(node, md.Node):
+            node.normalize()
+            return node.firstChild.wholeText.strip()  # Handles CDATASection too
+        return (node.text or "").strip()
     except AttributeError:
         return ""
 
 
-def valf(node: md.Document) -> float:
+def valf(node: Node) -> float:
     """
     Cast ``val(node)`` as a float.
     Return ``None`` if that does not work.
@@ -80,22 +244,50 @@ def numarray(a: list) -> list[float]:
     return [float(aa) for aa in a]
 
 
-def coords1(s: str) -> list[float]:
+def update_bbox(bbox: list[float], point: list[float]) -> None:
+    """
+    Enlarge in place the given bounding box ``[min_x, min_y, max_x, max_y]`` so that it contains the given coordinate tuple.
+    """
+    x, y = point[0], point[1]
+    if x < bbox[0]:
+        bbox[0] = x
+    if y < bbox[1]:
+        bbox[1] = y
+    if x > bbox[2]:
+        bbox[2] = x
+    if y > bbox[3]:
+        bbox[3] = y
+
+
+def coords1(
+    s: str, bbox: list[float] | None = None, dimensions: int | None = None
+) -> list[float]:
     """
     Convert the given KML string containing one coordinate tuple into a list of floats.
+    If a bounding box list is given, then enlarge it in place to contain the coordinates via :func:`update_bbox`.
+    If ``dimensions`` is given, then keep at most that many values, dropping the rest before converting them.
 
     EXAMPLE::
 
         >>> coords1(' -112.2,36.0,2357 ')
         [-112.2, 36.0, 2357.0]
+        >>> coords1(' -112.2,36.0,2357 ', dimensions=2)
+        [-112.2, 36.0]
 
     """
-    return numarray(re.sub(SPACE, "", s).split(","))
+    point = numarray(re.sub(SPACE, "", s).split(",")[:dimensions])
+    if bbox is not None:
+        update_bbox(bbox, point)
+    return point
 
 
-def coords(s: str) -> list[list[float]]:
+def coords(
+    s: str, bbox: list[float] | None = None, dimensions: int | None = None
+) -> list[list[float]]:
     """
     Convert the given KML string containing multiple coordinate tuples into a list of lists of floats.
+    If a bounding box list is given, then enlarge it in place to contain the coordinates while parsing them.
+    If ``dimensions`` is given, then keep at most that many values per tuple, dropping the rest before converting them.
 
     EXAMPLE::
 
@@ -107,12 +299,93 @@ def coords(s: str) -> list[list[float]]:
 
     """
     s = s.split()  # sub(TRIM_SPACE, '', v).split()
-    return [coords1(ss) for ss in s]
+    if bbox is None:
+        return [numarray(ss.split(",")[:dimensions]) for ss in s]
+
+    # Inline the bounding box updates to avoid a function call per vertex
+    min_x, min_y, max_x, max_y = bbox
+    result = []
+    for ss in s:
+        point = numarray(ss.split(",")[:dimensions])
+        x, y = point[0], point[1]
+        if x < min_x:
+            min_x = x
+        if y < min_y:
+            min_y = y
+        if x > max_x:
+            max_x = x
+        if y > max_y:
+            max_y = y
+        result.append(point)
+    bbox[:] = [min_x, min_y, max_x, max_y]
+    return result
+
+
+def coords_and_area(
+    s: str, bbox: list[float] | None = None, dimensions: int | None = None
+) -> tuple[list[list[float]], float, bool]:
+    """
+    Convert the given KML string containing multiple coordinate tuples as in :func:`coords`,
+    and return the triple (coordinates, twice the signed area of the ring they form, whether they cross the antimeridian),
+    all computed in the one pass that parses the coordinates.
+
+    Consecutive positions cross the antimeridian if their longitudes differ by more than 180 degrees,
+    in which case the area is computed over longitudes unwrapped across it.
+    The area, given by the shoelace formula over the ring closed back to its first position, is positive for counterclockwise rings.
 
+    EXAMPLE::
+
+        >>> coords_and_area('0,0 1,0 1,1 0,1 0,0')
+        ([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]], 2.0, False)
+        >>> coords_and_area('179,0 -179,0')[1:]
+        (0.0, True)
 
-def gx_coords1(s: str) -> list[float]:
+    """
+    result = []
+    area = 0
+    crosses = False
+    if bbox is not None:
+        min_x, min_y, max_x, max_y = bbox
+    offset = 0
+    for ss in s.split():
+        point = numarray(ss.split(",")[:dimensions])
+        x, y = point[0], point[1]
+        if bbox is not None:
+            if x < min_x:
+                min_x = x
+            if y < min_y:
+                min_y = y
+            if x > max_x:
+                max_x = x
+            if y > max_y:
+                max_y = y
+        if result:
+            dx = x + offset - ux
+            if dx > 180:
+                offset -= 360
+                crosses = True
+            elif dx < -180:
+                offset += 360
+                crosses = True
+            area += ux * y - (x + offset) * uy
+        else:
+            x0, y0 = x, y
+        ux, uy = x + offset, y
+        result.append(point)
+    if result:
+        area += ux * y0 - x0 * uy
+    if bbox is not None:
+        bbox[:] = [min_x, min_y, max_x, max_y]
+    return result, area, crosses
+
+
+def gx_coords1(
+    s: str, bbox: list[float] | None = None, dimensions: int | None = None
+) -> list[float]:
     """
     Convert the given KML string containing one gx coordinate tuple into a list of floats.
+    If a bounding box list is given, then enlarge it in place to contain the coordinates via :func:`update_bbox`.
+    If ``dimensions`` is given, then keep at most that many values, dropping the rest before converting them.
 
     EXAMPLE::
 
@@ -120,21 +393,28 @@ def gx_coords1(s: str) -> list[float]:
         [-113.0, 36.0, 0.0]
 
     """
-    return numarray(s.split(" "))
+    point = numarray(s.split(" ")[:dimensions])
+    if bbox is not None:
+        update_bbox(bbox, point)
+    return point
 
 
-def gx_coords(node: md.Document) -> dict:
+def gx_coords(
+    node: Node, bbox: list[float] | None = None, dimensions: int | None = None
+) -> dict:
     """
     Given a KML DOM node, grab its <gx:coord> and <gx:timestamp><when>subnodes, and convert them into a dictionary with the keys and values
 
     - ``'coordinates'``: list of lists of float coordinates
     - ``'times'``: list of timestamps corresponding to the coordinates
 
+    If a bounding box list is given, then enlarge it in place to contain the coordinates.
+    If ``dimensions`` is given, then keep at most that many values per coordinate tuple.
     """
     els = get(node, "gx:coord")
     coordinates = []
     times = []
-    coordinates = [gx_coords1(val(el)) for el in els]
+    coordinates = [gx_coords1(val(el), bbox, dimensions) for el in els]
     time_els = get(node, "when")
     times = [val(t) for t in time_els]
     return {
@@ -143,22 +423,180 @@ def gx_coords(node: md.Document) -> dict:
     }
 
 
-def disambiguate(names: list[str], mark: str = "1") -> list[str]:
+def _cut(p: list[float], q: list[float], x: float) -> list[float]:
+    # The position where the segment from p to q meets the meridian x
+    t = (x - p[0]) / (q[0] - p[0])
+    return [x] + [a + t * (b - a) for a, b in zip(p[1:], q[1:])]
+
+
+def split_line(coordinates: list[list[float]]) -> list[list[list[float]]]:
+    """
+    Split the given LineString coordinates where consecutive positions cross the antimeridian,
+    that is, where their longitudes differ by more than 180 degrees,
+    ending and starting the parts at longitudes 180 and -180 on the interpolated crossing,
+    and return the list of parts, as described in Section 3.1.9 of RFC 7946.
+
+    EXAMPLE::
+
+        >>> split_line([[170, 0], [-170, 10]])
+        [[[170, 0], [180, 5.0]], [[-180, 5.0], [-170, 10]]]
+
+    """
+    parts = [[coordinates[0]]] if coordinates else []
+    for p, q in zip(coordinates, coordinates[1:]):
+        dx = q[0] - p[0]
+        if abs(dx) > 180:
+            x = 180 if dx < 0 else -180
+            cut = _cut(p, [q[0] + 2 * x, *q[1:]], x)
+            if cut != p:
+                parts[-1].append(cut)
+            parts.append([[-x, *cut[1:]]])
+        if q != parts[-1][-1]:
+            parts[-1].append(q)
+    return parts
+
+
+def _clip_ring(ring: list[list[float]], x: float, below: bool) -> list[list[float]]:
+    # Clip the closed ring to the side of the meridian x via Sutherland-Hodgman
+    if len(ring) < 4:
+        return []
+    result = []
+    p = ring[-2]
+    for q in ring[:-1]:
+        p_in = p[0] <= x if below else p[0] >= x
+        q_in = q[0] <= x if below else q[0] >= x
+        if q_in != p_in:
+            result.append(_cut(p, q, x))
+        if q_in:
+            result.append(q)
+        p = q
+    return result + result[:1]
+
+
+def split_polygon(
+    rings: list[list[list[float]]],
+) -> list[list[list[list[float]]]]:
+    """
+    Split the given Polygon coordinates, whose first ring is exterior and closed, along the antimeridian,
+    and return the list of the parts' Polygon coordinates, as described in Section 3.1.9 of RFC 7946.
+
+    Unwrap the longitudes of each ring across the antimeridian, clip the rings to each 360-degree window they overlap,
+    and shift the pieces back into [-180, 180], dropping degenerate pieces.
+    A concave ring that crosses the antimeridian several times yields one piece per side joined along the antimeridian.
+    Return the rings unchanged as the only part if the exterior ring does not close once unwrapped, as around a pole.
+
+    EXAMPLE::
+
+        >>> split_polygon([[[170, 0], [-170, 0], [-170, 10], [170, 10], [170, 0]]])
+        [[[[170, 0], [180, 0.0], [180, 10.0], [170, 10], [170, 0]]], [[[-180, 0.0], [-170, 0], [-170, 10], [-180, 10.0], [-180, 0.0]]]]
+
+    """
+    unwrapped = []
+    for ring in rings:
+        if not ring:
+            continue
+        offset = 0
+        u = [ring[0]]
+        for p, q in zip(ring, ring[1:]):
+            dx = q[0] - p[0]
+            if dx > 180:
+                offset -= 360
+            elif dx < -180:
+                offset += 360
+            u.append([q[0] + offset, *q[1:]] if offset else q)
+        unwrapped.append(u)
+    outer = unwrapped[0]
+    if outer[-1][0] != outer[0][0]:
+        return [rings]
+
+    # Move the holes next to the exterior ring
+    xs = [p[0] for p in outer]
+    lo, hi = min(xs), max(xs)
+    center = (lo + hi) / 2
+    for i, ring in enumerate(unwrapped[1:], 1):
+        shift = 360 * round((center - ring[0][0]) / 360)
+        if shift:
+            unwrapped[i] = [[p[0] + shift, *p[1:]] for p in ring]
+
+    parts = []
+    for k in range(math.floor((lo + 180) / 360), math.ceil((hi - 180) / 360) + 1):
+        part = []
+        for ring in unwrapped:
+            piece = _clip_ring(ring, 360 * k - 180, below=False)
+            if len(piece) >= 4:
+                piece = _clip_ring(piece, 360 * k + 180, below=True)
+            if len(piece) < 4:
+                if not part:
+                    break
+                continue
+            if k:
+                piece = [[p[0] - 360 * k, *p[1:]] for p in piece]
+            part.append(piece)
+        if part:
+            parts.append(part)
+    return parts
+
+
+def has_altitude(tuples: list[str], sep: str = ",") -> bool:
     """
-    Given a list of strings ``names``, return a new list of names where repeated names have been disambiguated by repeatedly appending the given mark.
+    Return ``True`` if and only if any of the given coordinate tuple strings, whose values are separated by ``sep``,
+    has a non-zero third value, converting only the third values.
+
+    EXAMPLE::
+
+        >>> has_altitude('-112.0,36.1,0 -113.0,36.0,0'.split())
+        False
+        >>> has_altitude(['-113.0 36.0 12'], sep=' ')
+        True
+
+    """
+    for t in tuples:
+        values = t.split(sep, 3)
+        if len(values) > 2 and float(values[2]) != 0:
+            return True
+    return False
+
+
+def disambiguate(
+    names: list[str], mark: str = "1", *, strategy: str = "append"
+) -> list[str]:
+    """
+    Given a list of strings ``names``, return a new list of names where repeated names have been disambiguated according to the given strategy from :const:`NAMING_STRATEGIES`:
+
+    - ``'append'``: repeatedly append the given mark
+    - ``'counter'``: append an underscore and the number of the name's occurrence, which keeps names short when a name repeats many times
+
+    Both strategies remember where the previous occurrence of each name left off, so the cost per name does not grow with the number of repeats.
 
     EXAMPLE::
 
         >>> disambiguate(['sing', 'song', 'sing', 'sing'])
         ['sing', 'song', 'sing1', 'sing11']
+        >>> disambiguate(['sing', 'song', 'sing', 'sing'], strategy='counter')
+        ['sing', 'song', 'sing_2', 'sing_3']
 
     """
+    if strategy not in NAMING_STRATEGIES:
+        raise ValueError(f"naming strategy must be one of {NAMING_STRATEGIES}")
+
     names_seen = set()
+    last = {}  # name -> last candidate or counter tried for it
     new_names = []
     for name in names:
-        new_name = name
-        while new_name in names_seen:
-            new_name += mark
+        if name not in names_seen:
+            new_name = name
+        elif strategy == "append":
+            new_name = last.get(name, name)
+            while new_name in names_seen:
+                new_name += mark
+            last[name] = new_name
+        else:
+            k = last.get(name, 1)
+            new_name = name
+            while new_name in names_seen:
+                k += 1
+                new_name = f"{name}_{k}"
+            last[name] = k
         new_names.append(new_name)
         names_seen.add(new_name)
 
@@ -182,6 +620,472 @@ def to_filename(s: str) -> str:
     return s
 
 
+@contextlib.contextmanager
+def atomic_open(path: str | pl.Path, mode: str = "w"):
+    """
+    Context manager that opens a hidden temporary file next to the given path in the given writing mode
+    and, once it is closed without error, moves it onto the path in one atomic step, so that readers never see a partially written file.
+    On error, delete the temporary file.
+    """
+    path = pl.Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp.open(mode) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+
+
+def merge_bboxes(
+    bboxes: list[list[float] | None], *, antimeridian: bool = False
+) -> list[float] | None:
+    """
+    Return the smallest bounding box ``[min_x, min_y, max_x, max_y]`` containing all the given bounding boxes, ignoring ``None`` values.
+    Return ``None`` if there are no bounding boxes.
+
+    A bounding box with ``min_x > max_x`` crosses the antimeridian, as in Section 5.2 of RFC 7946.
+    If any of the given bounding boxes does or if ``antimeridian``, then return the smallest bounding box
+    whose longitudes may wrap across the antimeridian, which does so if that is narrower.
+
+    EXAMPLE::
+
+        >>> merge_bboxes([[0, 0, 1, 1], None, [-1, 0.5, 0.5, 2]])
+        [-1, 0, 1, 2]
+        >>> merge_bboxes([[170, 0, 180, 1], [-180, 0, -170, 1]], antimeridian=True)
+        [170, 0, -170, 1]
+
+    """
+    bboxes = [bb for bb in bboxes if bb is not None]
+    b = list(EMPTY_BBOX)
+    for bb in bboxes:
+        b = [min(b[0], bb[0]), min(b[1], bb[1]), max(b[2], bb[2]), max(b[3], bb[3])]
+    if not bboxes:
+        return None
+    if not antimeridian and all(bb[0] <= bb[2] for bb in bboxes):
+        return b
+
+    # Leave out the widest gap between the longitude intervals
+    spans = []
+    for bb in bboxes:
+        if bb[0] <= bb[2]:
+            spans.append((bb[0], bb[2]))
+        else:
+            spans.extend([(bb[0], 180), (-180, bb[2])])
+    spans.sort()
+    merged = [list(spans[0])]
+    for west, east in spans[1:]:
+        if west <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], east)
+        else:
+            merged.append([west, east])
+    gap, west, east = merged[0][0] + 360 - merged[-1][1], merged[0][0], merged[-1][1]
+    for a, c in zip(merged, merged[1:]):
+        if c[0] - a[1] > gap:
+            gap, west, east = c[0] - a[1], c[0], a[1]
+    return [west, b[1], east, b[3]]
+
+
+def bbox_center(bbox: list[float]) -> tuple[float, float]:
+    """
+    Return the center of the given bounding box, which may cross the antimeridian.
+
+    EXAMPLE::
+
+        >>> bbox_center([170, 0, -150, 10])
+        (-170.0, 5.0)
+
+    """
+    x = (bbox[0] + bbox[2]) / 2
+    if bbox[0] > bbox[2]:
+        x = x + 180 if x <= 0 else x - 180
+    return x, (bbox[1] + bbox[3]) / 2
+
+
+def get_bbox(geometry: dict) -> list[float] | None:
+    """
+    Return the bounding box ``[min_x, min_y, max_x, max_y]`` of the given (decoded) GeoJSON geometry, or ``None`` if it has no coordinates.
+    """
+    if geometry["type"] == "GeometryCollection":
+        return merge_bboxes(get_bbox(g) for g in geometry["geometries"])
+
+    b = list(EMPTY_BBOX)
+    stack = [geometry["coordinates"]]
+    while stack:
+        c = stack.pop()
+        if c and isinstance(c[0], (int, float)):
+            update_bbox(b, c)
+        else:
+            stack.extend(c)
+    if b[0] > b[2]:
+        return None
+    return b
+
+
+def bboxes_intersect(a: list[float], b: list[float]) -> bool:
+    """
+    Return ``True`` if and only if the given bounding boxes intersect, either of which may cross the antimeridian.
+    """
+    if a[1] > b[3] or b[1] > a[3]:
+        return False
+    if a[0] > a[2] or b[0] > b[2]:
+        # Compare the parts on either side of the antimeridian
+        a_spans = [(a[0], a[2])] if a[0] <= a[2] else [(a[0], 180), (-180, a[2])]
+        b_spans = [(b[0], b[2])] if b[0] <= b[2] else [(b[0], 180), (-180, b[2])]
+        return any(w <= f and v <= e for w, e in a_spans for v, f in b_spans)
+    return a[0] <= b[2] and b[0] <= a[2]
+
+
+def hilbert_key(x: float, y: float, order: int = HILBERT_ORDER) -> int:
+    """
+    Return the position of the given longitude and latitude along the Hilbert curve
+    that fills a ``2**order`` by ``2**order`` grid over the whole WGS84 extent,
+    so that nearby positions tend to get nearby keys.
+    """
+    n = 1 << order
+    i = min(n - 1, max(0, int((x + 180) / 360 * n)))
+    j = min(n - 1, max(0, int((y + 90) / 180 * n)))
+    d = 0
+    s = n >> 1
+    while s:
+        ri = 1 if i & s else 0
+        rj = 1 if j & s else 0
+        d += s * s * ((3 * ri) ^ rj)
+        # Rotate the quadrant
+        if not rj:
+            if ri:
+                i = n - 1 - i
+                j = n - 1 - j
+            i, j = j, i
+        s >>= 1
+    return d
+
+
+def get_hilbert_key(feature: dict, order: int = HILBERT_ORDER) -> int:
+    """
+    Return the :func:`hilbert_key` of the centroid of the bounding box of the given (decoded) GeoJSON Feature,
+    or one past the largest key if the Feature has no coordinates, so that such Features sort last.
+    """
+    b = feature.get("bbox") or (
+        get_bbox(feature["geometry"]) if feature["geometry"] else None
+    )
+    if b is None:
+        return 1 << (2 * order)
+    return hilbert_key(*bbox_center(b), order)
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    """
+    Return the number of days from 1970-01-01 to the given date of the proleptic Gregorian calendar,
+    which works for all years, unlike ``datetime``.
+
+    EXAMPLE::
+
+        >>> days_from_civil(2000, 3, 1)
+        11017
+
+    """
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days: int) -> tuple[int, int, int]:
+    """
+    Return the date (year, month, day) that is the given number of days from 1970-01-01; the inverse of :func:`days_from_civil`.
+    """
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+def parse_time(s: str) -> float | None:
+    """
+    Convert the given KML time string, as found in ``<when>``, ``<begin>``, and ``<end>`` elements, into seconds since 1970-01-01T00:00:00Z,
+    taking partial dates to mean their start and times without a time zone to be in UTC.
+    Return ``None`` if the string is empty or not a KML time.
+
+    EXAMPLE::
+
+        >>> parse_time('1970-01-02T00:00:01Z')
+        86401.0
+        >>> parse_time('1970-01-01T02:00+02:00')
+        0.0
+        >>> parse_time('1971')
+        31536000.0
+
+    """
+    match = KML_TIME.fullmatch(s.strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    t = days_from_civil(int(year), int(month or 1), int(day or 1)) * 86400.0
+    if hour is not None:
+        t += int(hour) * 3600 + int(minute) * 60 + float(second or 0)
+    if zone and zone != "Z":
+        sign = -1 if zone[0] == "-" else 1
+        t -= sign * (int(zone[1:3]) * 3600 + int(zone[-2:]) * 60)
+    return t
+
+
+def time_buckets(begin: float, end: float, bucket: str) -> list[str]:
+    """
+    Return the keys of the time buckets of the given size from :const:`TIME_BUCKETS` that the given time interval in seconds since 1970-01-01T00:00:00Z overlaps,
+    such as ``'2013'``, ``'2013-08'``, or ``'2013-08-08'``.
+
+    EXAMPLE::
+
+        >>> time_buckets(parse_time('2013-11-30'), parse_time('2014-01-01'), 'month')
+        ['2013-11', '2013-12', '2014-01']
+
+    """
+    if bucket not in TIME_BUCKETS:
+        raise ValueError(f"time bucket must be one of {TIME_BUCKETS}")
+    first = math.floor(begin / 86400)
+    last = math.floor(end / 86400)
+    if bucket == "day":
+        return [
+            "{:04d}-{:02d}-{:02d}".format(*civil_from_days(d))
+            for d in range(first, last + 1)
+        ]
+    (y0, m0, _), (y1, m1, _) = civil_from_days(first), civil_from_days(last)
+    if bucket == "year":
+        return [f"{y:04d}" for y in range(y0, y1 + 1)]
+    return [
+        f"{k // 12:04d}-{k % 12 + 1:02d}" for k in range(y0 * 12 + m0 - 1, y1 * 12 + m1)
+    ]
+
+
+def time_bounds(time_range: tuple | None) -> tuple[float, float]:
+    """
+    Convert the given time range (begin, end) of KML time strings, numbers of seconds since 1970-01-01T00:00:00Z, or ``None`` for open ends
+    into a pair of numbers of seconds, with open ends becoming infinite.
+    Raise a ``ValueError`` if a time string is invalid.
+    """
+    if time_range is None:
+        return -math.inf, math.inf
+    bounds = []
+    for t, default in zip(time_range, [-math.inf, math.inf]):
+        if isinstance(t, str):
+            parsed = parse_time(t)
+            if parsed is None:
+                raise ValueError(f"invalid KML time {t!r}")
+            t = parsed
+        bounds.append(default if t is None else t)
+    return bounds[0], bounds[1]
+
+
+class StringTable:
+    """
+    Bounded table that deduplicates the property keys and short property values of Features,
+    so that repeated strings, such as ExtendedData names, category codes, and style URLs,
+    are held in memory once instead of once per Feature.
+
+    Intern strings of at most ``max_length`` characters, and stop adding strings once the table holds ``max_size`` of them,
+    so that the table stays small even when fed unique values.
+    If ``share_properties``, then also let Features with identical properties share one properties dictionary,
+    at most ``max_properties`` distinct ones; shared dictionaries must be copied before being modified.
+
+    Safe to use from several threads, which at worst miss some deduplication.
+    """
+
+    def __init__(
+        self,
+        max_size: int = STRING_TABLE_SIZE,
+        max_length: int = STRING_TABLE_MAX_LENGTH,
+        *,
+        share_properties: bool = False,
+        max_properties: int = SHARED_PROPERTIES_SIZE,
+    ):
+        self.max_size = max_size
+        self.max_length = max_length
+        self.share_properties = share_properties
+        self.max_properties = max_properties
+        self.strings = {}
+        self.properties = {}
+
+    def intern(self, s: str) -> str:
+        """
+        Return the copy of the given string held by the table, adding the string if there is none and the table has room.
+        """
+        t = self.strings.get(s)
+        if t is not None:
+            return t
+        if len(s) <= self.max_length and len(self.strings) < self.max_size:
+            self.strings[s] = s
+        return s
+
+    def share(self, props: dict) -> dict:
+        """
+        If sharing properties, then return the properties dictionary held by the table that equals the given one,
+        adding the given one if there is none and the table has room.
+        Otherwise, or if the values are not hashable, return the given dictionary.
+        """
+        if not self.share_properties:
+            return props
+        # Types distinguish values such as 1 and 1.0, which serialize differently
+        key = tuple(x for k, v in props.items() for x in (k, type(v), v))
+        try:
+            shared = self.properties.get(key)
+        except TypeError:
+            return props
+        if shared is not None:
+            return shared
+        if len(self.properties) < self.max_properties:
+            self.properties[key] = props
+        return props
+
+
+def _discard_spill(f: BinaryIO, path: pl.Path) -> None:
+    f.close()
+    path.unlink(missing_ok=True)
+
+
+class SpilledFeatures:
+    """
+    Sequence of the Features of one layer built by :func:`build_layers` under a memory limit,
+    held in memory as GeoJSON texts until :meth:`spill` writes them, and all the Features appended afterwards,
+    to a hidden temporary file in the given directory, which defaults to the system's temporary directory.
+
+    The file holds the start of the layer's GeoJSON text, so that :meth:`move_to` can end it and move it into place
+    without serializing the Features again; the file is deleted if this object is discarded first.
+    Iterating yields the Features decoded.
+    """
+
+    HEADER = b'{"type": "FeatureCollection", "features": ['
+
+    def __init__(self, directory: Optional[str | pl.Path] = None):
+        self.directory = directory
+        self.texts = []
+        self.held = 0
+        self.count = 0
+        self.path = None
+        self.file = None
+        self.offsets = array("Q")
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def _write(self, text: str) -> None:
+        if self.offsets:
+            self.file.write(b", ")
+            self.size += 2
+        self.offsets.append(self.size)
+        data = text.encode("utf-8")
+        self.file.write(data)
+        self.size += len(data)
+
+    def append(self, text: str) -> int:
+        """
+        Append the given GeoJSON text of a Feature and return the number of bytes it adds to those held in memory,
+        which is its length, since ``json.dumps`` escapes non-ASCII characters.
+        """
+        if self.file is not None:
+            self._write(text)
+            self.count += 1
+            return 0
+        self.texts.append(text)
+        self.held += len(text)
+        self.count += 1
+        return len(text)
+
+    def spill(self) -> int:
+        """
+        Write the Features held in memory to the temporary file, creating it, and return the number of bytes freed.
+        """
+        fd, path = tempfile.mkstemp(prefix=".", suffix=".spill", dir=self.directory)
+        self.path = pl.Path(path)
+        self.file = os.fdopen(fd, "wb")
+        self._finalizer = weakref.finalize(self, _discard_spill, self.file, self.path)
+        self.file.write(self.HEADER)
+        self.size = len(self.HEADER)
+        for text in self.texts:
+            self._write(text)
+        freed = self.held
+        self.texts = []
+        self.held = 0
+        return freed
+
+    def __iter__(self) -> Iterator[dict]:
+        if self.path is None:
+            for text in self.texts:
+                yield json.loads(text)
+            return
+        if not self.file.closed:
+            self.file.flush()
+        with self.path.open("rb") as src:
+            for i, start in enumerate(self.offsets):
+                end = self.offsets[i + 1] - 2 if i + 1 < self.count else self.size
+                src.seek(start)
+                yield json.loads(src.read(end - start))
+
+    def _footer(self, name: Optional[str], bbox: Optional[list]) -> bytes:
+        tail = {}
+        if name is not None:
+            tail["name"] = name
+        if bbox is not None:
+            tail["bbox"] = bbox
+        return b"]" + (b", " + json.dumps(tail)[1:].encode() if tail else b"}")
+
+    def write_to(
+        self, tgt: BinaryIO, name: Optional[str] = None, bbox: Optional[list] = None
+    ) -> None:
+        """
+        Write to the given binary file object the GeoJSON FeatureCollection of these Features with the given name and bounding box, if any,
+        as the same bytes that ``json.dump`` writes for the layer, by copying the texts held in memory or in the temporary file.
+        """
+        if self.path is None:
+            tgt.write(self.HEADER)
+            tgt.write(", ".join(self.texts).encode("utf-8"))
+        else:
+            if not self.file.closed:
+                self.file.flush()
+            with self.path.open("rb") as src:
+                remaining = self.size
+                while remaining:
+                    data = src.read(min(remaining, 2**20))
+                    tgt.write(data)
+                    remaining -= len(data)
+        tgt.write(self._footer(name, bbox))
+
+    def move_to(
+        self,
+        path: str | pl.Path,
+        name: Optional[str] = None,
+        bbox: Optional[list] = None,
+    ) -> None:
+        """
+        Write the FeatureCollection of these Features to the given path as in :meth:`write_to`, atomically.
+        If they were spilled, then end the temporary file and move it onto the path instead of copying it,
+        which requires the path to be on the same file system as the temporary file;
+        the Features can still be iterated afterwards.
+        """
+        if self.path is None:
+            with atomic_open(path, "wb") as tgt:
+                self.write_to(tgt, name, bbox)
+            return
+        self.file.write(self._footer(name, bbox))
+        self.file.close()
+        os.replace(self.path, path)
+        self._finalizer.detach()
+        self.path = pl.Path(path)
+
+
 # ---------------
 # Main functions
 # ---------------
@@ -212,7 +1116,7 @@ def build_rgb_and_opacity(s: str) -> tuple:
     return "#" + color, opacity
 
 
-def build_svg_style(node: md.Document) -> dict:
+def build_svg_style(node: Node) -> dict:
     """
     Given a DOM node, grab its top-level Style nodes, convert every one into a SVG style dictionary, put them in a master dictionary of the form
 
@@ -265,7 +1169,7 @@ def build_svg_style(node: md.Document) -> dict:
                 props["stroke-width"] = width
         for x in get(item, "IconStyle"):
             icon = get1(x, "Icon")
-            if not icon:
+            if icon is None:
                 continue
             # Clear previous style properties
             props = {}
@@ -276,7 +1180,7 @@ def build_svg_style(node: md.Document) -> dict:
     return d
 
 
-def build_leaflet_style(node: md.Document) -> dict:
+def build_leaflet_style(node: Node) -> dict:
     """
     Given a DOM node, grab its top-level Style nodes, convert every one into a Leaflet style dictionary, put them in a master dictionary of the form
 
@@ -329,7 +1233,7 @@ def build_leaflet_style(node: md.Document) -> dict:
                 props["weight"] = width
         for x in get(item, "IconStyle"):
             icon = get1(x, "Icon")
-            if not icon:
+            if icon is None:
                 continue
             # Clear previous style properties
             props = {}
@@ -340,48 +1244,124 @@ def build_leaflet_style(node: md.Document) -> dict:
     return d
 
 
-def build_geometry(node: md.Document) -> dict:
+def build_geometry(
+    node: Node,
+    *,
+    bbox: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+    rfc7946: bool = False,
+) -> dict:
     """
-    Return a (decoded) GeoJSON geometry dictionary corresponding to the given KML node.
+    Return a dictionary with the keys and values
+
+    - ``'geoms'``: list of (decoded) GeoJSON geometry dictionaries corresponding to the given KML node
+    - ``'times'``: list of lists of timestamps of the node's tracks, if any
+    - ``'bbox'``: if ``bbox``, the bounding box ``[min_x, min_y, max_x, max_y]`` of the geometries, computed while parsing their coordinates, or ``None`` if there are no coordinates
+
+    If ``dimensions`` is given, then keep at most that many values per coordinate tuple,
+    so that ``dimensions=2`` drops altitudes while parsing.
+    If ``altitude`` is 'auto' instead of the default 'keep', then drop the altitudes of every
+    geometry all of whose altitudes are zero, as checked by :func:`has_altitude`.
+
+    If ``rfc7946``, then normalize the geometries as RFC 7946 requires while parsing their coordinates via :func:`coords_and_area`:
+    wind exterior Polygon rings counterclockwise and interior rings clockwise, reversing rings as needed,
+    and split LineStrings and Polygons that cross the antimeridian into MultiLineStrings and MultiPolygons
+    via :func:`split_line` and :func:`split_polygon`, in which case the bounding box crosses the antimeridian if that makes it narrower,
+    with ``min_x > max_x`` as in Section 5.2 of RFC 7946; see :func:`merge_bboxes`.
+    Tracks are left unsplit, to keep their positions in step with their times.
     """
     geoms = []
     times = []
-    if get1(node, "MultiGeometry"):
-        return build_geometry(get1(node, "MultiGeometry"))
-    if get1(node, "MultiTrack"):
-        return build_geometry(get1(node, "MultiTrack"))
-    if get1(node, "gx:MultiTrack"):
-        return build_geometry(get1(node, "gx:MultiTrack"))
+    for multitype in ["MultiGeometry", "MultiTrack", "gx:MultiTrack"]:
+        multi = get1(node, multitype)
+        if multi is not None:
+            return build_geometry(
+                multi,
+                bbox=bbox,
+                dimensions=dimensions,
+                altitude=altitude,
+                rfc7946=rfc7946,
+            )
+    b = list(EMPTY_BBOX) if bbox else None
+    auto = altitude == "auto" and dimensions != 2
+    dims = dimensions
+    split = False
     for geotype in GEOTYPES:
         geonodes = get(node, geotype)
         if not geonodes:
             continue
         for geonode in geonodes:
             if geotype == "Point":
+                text = val(get1(geonode, "coordinates"))
+                if auto:
+                    dims = dimensions if has_altitude([text]) else 2
                 geoms.append(
                     {
                         "type": "Point",
-                        "coordinates": coords1(val(get1(geonode, "coordinates"))),
+                        "coordinates": coords1(text, b, dims),
                     }
                 )
             elif geotype == "LineString":
+                text = val(get1(geonode, "coordinates"))
+                if auto:
+                    dims = dimensions if has_altitude(text.split()) else 2
+                if not rfc7946:
+                    geoms.append(
+                        {
+                            "type": "LineString",
+                            "coordinates": coords(text, b, dims),
+                        }
+                    )
+                    continue
+                coordinates, _, crosses = coords_and_area(text, b, dims)
+                if not crosses:
+                    geoms.append({"type": "LineString", "coordinates": coordinates})
+                    continue
+                split = True
                 geoms.append(
-                    {
-                        "type": "LineString",
-                        "coordinates": coords(val(get1(geonode, "coordinates"))),
-                    }
+                    {"type": "MultiLineString", "coordinates": split_line(coordinates)}
                 )
             elif geotype == "Polygon":
-                rings = get(geonode, "LinearRing")
-                coordinates = [coords(val(get1(ring, "coordinates"))) for ring in rings]
-                geoms.append(
-                    {
-                        "type": "Polygon",
-                        "coordinates": coordinates,
-                    }
-                )
+                texts = [
+                    val(get1(ring, "coordinates"))
+                    for ring in get(geonode, "LinearRing")
+                ]
+                if auto:
+                    altitudes = any(has_altitude(text.split()) for text in texts)
+                    dims = dimensions if altitudes else 2
+                if not rfc7946:
+                    coordinates = [coords(text, b, dims) for text in texts]
+                    geoms.append(
+                        {
+                            "type": "Polygon",
+                            "coordinates": coordinates,
+                        }
+                    )
+                    continue
+                coordinates = []
+                crosses = False
+                for i, text in enumerate(texts):
+                    ring, area, ring_crosses = coords_and_area(text, b, dims)
+                    # Exterior rings counterclockwise, interior rings clockwise
+                    if (area < 0) if i == 0 else (area > 0):
+                        ring.reverse()
+                    coordinates.append(ring)
+                    crosses = crosses or ring_crosses
+                if not crosses or not coordinates[0]:
+                    geoms.append({"type": "Polygon", "coordinates": coordinates})
+                    continue
+                parts = split_polygon(coordinates)
+                if len(parts) == 1:
+                    geoms.append({"type": "Polygon", "coordinates": parts[0]})
+                    continue
+                split = True
+                geoms.append({"type": "MultiPolygon", "coordinates": parts})
             elif geotype in ["Track", "gx:Track"]:
-                track = gx_coords(geonode)
+                if auto:
+                    texts = [val(el) for el in get(geonode, "gx:coord")]
+                    dims = dimensions if has_altitude(texts, " ") else 2
+                track = gx_coords(geonode, b, dims)
                 geoms.append(
                     {
                         "type": "LineString",
@@ -391,23 +1371,47 @@ def build_geometry(node: md.Document) -> dict:
                 if track["times"]:
                     times.append(track["times"])
 
-    return {"geoms": geoms, "times": times}
+    result = {"geoms": geoms, "times": times}
+    if bbox and split:
+        # Bound the parts, wrapping across the antimeridian
+        part_bboxes = []
+        for g in geoms:
+            t = g["type"]
+            if t.startswith("Multi"):
+                t, parts = t[5:], g["coordinates"]
+            else:
+                parts = [g["coordinates"]]
+            part_bboxes.extend(get_bbox({"type": t, "coordinates": p}) for p in parts)
+        result["bbox"] = merge_bboxes(part_bboxes, antimeridian=True)
+    elif bbox:
+        result["bbox"] = b if b[0] <= b[2] else None
 
+    return result
 
-def build_feature(node: md.Document) -> dict | None:
-    """
-    Build and return a (decoded) GeoJSON Feature corresponding to this KML node (typically a KML Placemark).
-    Return ``None`` if no Feature can be built.
+
+def build_properties(
+    node: Node,
+    times: list,
+    props: Optional[MutableMapping] = None,
+    *,
+    time_stamps: bool = False,
+    intern: Callable[[str], str] = str,
+) -> MutableMapping:
     """
-    geoms_and_times = build_geometry(node)
-    if not geoms_and_times["geoms"]:
-        return None
+    Set the GeoJSON properties of this KML node (typically a KML Placemark), given the ``times`` of its tracks as found by :func:`build_geometry`,
+    in the given mapping, which defaults to a new dictionary, and return the mapping.
+    If ``time_stamps``, then also copy the node's TimeStamp into the property 'timeStamp'.
+    Pass the property names and the short property values through ``intern``.
 
-    props = {}
+    The mapping only needs to support item assignment and membership tests,
+    so that properties can be written straight into columns; see :func:`kml2geojson.dataframe.build_columns`.
+    """
+    if props is None:
+        props = {}
     for x in get(node, "name")[:1]:
         name = val(x)
         if name:
-            props["name"] = val(x)
+            props["name"] = intern(name)
     for x in get(node, "description")[:1]:
         desc = val(x)
         if desc:
@@ -416,11 +1420,12 @@ def build_feature(node: md.Document) -> dict | None:
         style_url = val(x)
         if style_url[0] != "#":
             style_url = "#" + style_url
-        props["styleUrl"] = style_url
+        props["styleUrl"] = intern(style_url)
     for x in get(node, "PolyStyle")[:1]:
         color = val(get1(x, "color"))
         if color:
             rgb, opacity = build_rgb_and_opacity(color)
+            rgb = intern(rgb)
             props["fill"] = rgb
             props["fill-opacity"] = opacity
             # Set default border style
@@ -441,7 +1446,7 @@ def build_feature(node: md.Document) -> dict | None:
         color = val(get1(x, "color"))
         if color:
             rgb, opacity = build_rgb_and_opacity(color)
-            props["stroke"] = rgb
+            props["stroke"] = intern(rgb)
             props["stroke-opacity"] = opacity
         width = valf(get1(x, "width"))
         if width:
@@ -449,21 +1454,59 @@ def build_feature(node: md.Document) -> dict | None:
     for x in get(node, "ExtendedData")[:1]:
         datas = get(x, "Data")
         for data in datas:
-            props[attr(data, "name")] = val(get1(data, "value"))
+            props[intern(attr(data, "name"))] = intern(val(get1(data, "value")))
         simple_datas = get(x, "SimpleData")
         for simple_data in simple_datas:
-            props[attr(simple_data, "name")] = val(simple_data)
+            props[intern(attr(simple_data, "name"))] = intern(val(simple_data))
     for x in get(node, "TimeSpan")[:1]:
         begin = val(get1(x, "begin"))
         end = val(get1(x, "end"))
         props["timeSpan"] = {"begin": begin, "end": end}
-    if geoms_and_times["times"]:
-        times = geoms_and_times["times"]
+    if time_stamps:
+        for x in get(node, "TimeStamp")[:1]:
+            props["timeStamp"] = val(get1(x, "when"))
+    if times:
         if len(times) == 1:
             props["times"] = times[0]
         else:
             props["times"] = times
 
+    return props
+
+
+def build_feature(
+    node: Node,
+    *,
+    bbox: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+    rfc7946: bool = False,
+    time_stamps: bool = False,
+    strings: Optional[StringTable] = None,
+) -> dict | None:
+    """
+    Build and return a (decoded) GeoJSON Feature corresponding to this KML node (typically a KML Placemark).
+    Return ``None`` if no Feature can be built.
+
+    If ``bbox``, then also give the Feature a ``'bbox'`` attribute, computed while parsing its coordinates.
+    Handle altitudes according to ``dimensions`` and ``altitude`` and normalize geometries if ``rfc7946``; see :func:`build_geometry`.
+    Build the properties via :func:`build_properties`, with TimeStamps if ``time_stamps``.
+    If a string table is given, then intern the property keys and values through it and share the properties dictionary via :meth:`StringTable.share`.
+    """
+    geoms_and_times = build_geometry(
+        node, bbox=bbox, dimensions=dimensions, altitude=altitude, rfc7946=rfc7946
+    )
+    if not geoms_and_times["geoms"]:
+        return None
+
+    intern = strings.intern if strings is not None else str
+    props = build_properties(
+        node, geoms_and_times["times"], time_stamps=time_stamps, intern=intern
+    )
+
+    if strings is not None:
+        props = strings.share(props)
+
     feature = {
         "type": "Feature",
         "properties": props,
@@ -481,61 +1524,236 @@ def build_feature(node: md.Document) -> dict | None:
     if attr(node, "id"):
         feature["id"] = attr(node, "id")
 
+    if bbox and geoms_and_times["bbox"] is not None:
+        feature["bbox"] = geoms_and_times["bbox"]
+
     return feature
 
 
-def build_feature_collection(node: md.Document, name: Optional[str] = None) -> dict:
+def get_time_interval(node: Node) -> tuple[float, float] | None:
+    """
+    Return the time interval (begin, end) in seconds since 1970-01-01T00:00:00Z of the given KML node (typically a KML Placemark),
+    parsed via :func:`parse_time` from its TimeSpan, with missing ends becoming infinite,
+    or else spanning the ``<when>`` values of its TimeStamp or tracks.
+    Return ``None`` if the node has no time.
+    """
+    for x in get(node, "TimeSpan")[:1]:
+        begin = parse_time(val(get1(x, "begin")))
+        end = parse_time(val(get1(x, "end")))
+        return (
+            -math.inf if begin is None else begin,
+            math.inf if end is None else end,
+        )
+    times = [
+        t for t in (parse_time(val(x)) for x in get(node, "when")) if t is not None
+    ]
+    if not times:
+        return None
+    return min(times), max(times)
+
+
+def get_feature_time_interval(feature: dict) -> tuple[float, float] | None:
+    """
+    Return the time interval (begin, end) in seconds since 1970-01-01T00:00:00Z of the given (decoded) GeoJSON Feature built by :func:`build_feature`,
+    parsed from its properties 'timeSpan', 'timeStamp', which only Features built with ``time_stamps`` have, or 'times',
+    like :func:`get_time_interval` does from KML.
+    Return ``None`` if the Feature has no time.
+    """
+    props = feature.get("properties") or {}
+    span = props.get("timeSpan")
+    if span is not None:
+        begin, end = parse_time(span["begin"]), parse_time(span["end"])
+        return (
+            -math.inf if begin is None else begin,
+            math.inf if end is None else end,
+        )
+    whens = []
+    if "timeStamp" in props:
+        whens.append(props["timeStamp"])
+    for t in props.get("times", []):
+        whens.extend(t if isinstance(t, list) else [t])
+    times = [t for t in map(parse_time, whens) if t is not None]
+    if not times:
+        return None
+    return min(times), max(times)
+
+
+def build_features(
+    node: Node,
+    *,
+    bbox: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+    time_range: Optional[tuple] = None,
+    rfc7946: bool = False,
+    time_stamps: bool = False,
+    strings: Optional[StringTable] = None,
+) -> Iterator[dict]:
+    """
+    Yield the (decoded) GeoJSON Features of the Placemarks in this KML DOM node, one at a time,
+    filtered by time range and built with the given options as in :func:`build_feature_collection`.
+    """
+    if time_range is not None:
+        begin, end = time_bounds(time_range)
+
+    for placemark in get(node, "Placemark"):
+        if time_range is not None:
+            interval = get_time_interval(placemark)
+            if interval is not None and (interval[1] < begin or interval[0] > end):
+                continue
+        feature = build_feature(
+            placemark,
+            bbox=bbox,
+            dimensions=dimensions,
+            altitude=altitude,
+            rfc7946=rfc7946,
+            time_stamps=time_stamps,
+            strings=strings,
+        )
+        if feature is not None:
+            yield feature
+
+
+def build_feature_collection(
+    node: Node,
+    name: Optional[str] = None,
+    *,
+    bbox: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+    time_range: Optional[tuple] = None,
+    rfc7946: bool = False,
+    time_stamps: bool = False,
+    strings: Optional[StringTable] = None,
+) -> dict:
     """
     Build and return a (decoded) GeoJSON FeatureCollection corresponding to this KML DOM node (typically a KML Folder).
     If a name is given, store it in the FeatureCollection's ``'name'`` attribute.
+
+    If a time range (begin, end) is given, whose ends are as in :func:`time_bounds`,
+    then skip the Placemarks whose time intervals, as given by :func:`get_time_interval`, do not overlap it,
+    without parsing their geometries; Placemarks without time are kept.
+
+    If ``bbox``, then give every Feature a ``'bbox'`` attribute and give the FeatureCollection a ``'bbox'`` attribute that covers them all, as described in Section 5 of RFC 7946.
+    Handle altitudes according to ``dimensions`` and ``altitude`` and normalize geometries if ``rfc7946``; see :func:`build_geometry`.
+    Copy TimeStamps into properties if ``time_stamps`` and deduplicate properties with the given string table, if any; see :func:`build_feature`.
     """
-    # Initialize
     geojson = {
         "type": "FeatureCollection",
-        "features": [],
+        "features": list(
+            build_features(
+                node,
+                bbox=bbox,
+                dimensions=dimensions,
+                altitude=altitude,
+                time_range=time_range,
+                rfc7946=rfc7946,
+                time_stamps=time_stamps,
+                strings=strings,
+            )
+        ),
     }
 
-    # Build features
-    for placemark in get(node, "Placemark"):
-        feature = build_feature(placemark)
-        if feature is not None:
-            geojson["features"].append(feature)
-
     # Give the collection a name if requested
     if name is not None:
         geojson["name"] = name
 
+    if bbox:
+        b = merge_bboxes(f.get("bbox") for f in geojson["features"])
+        if b is not None:
+            geojson["bbox"] = b
+
     return geojson
 
 
-def build_layers(node: md.Document, *, disambiguate_names: bool = True) -> list[dict]:
+def build_layers(
+    node: Node,
+    *,
+    disambiguate_names: bool = True,
+    naming_strategy: str = "append",
+    bbox: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+    time_range: Optional[tuple] = None,
+    rfc7946: bool = False,
+    time_stamps: bool = False,
+    strings: Optional[StringTable] = None,
+    linked: Optional[list[tuple[str, Node]]] = None,
+    memory_limit: Optional[int] = None,
+    spill_dir: Optional[str | pl.Path] = None,
+) -> list[dict]:
     """
     Return a list of GeoJSON FeatureCollections, one for each folder in the given KML DOM node that contains geodata.
     Name each FeatureCollection (via a ``'name'`` attribute) according to its corresponding KML folder name.
 
-    If ``disambiguate_names == True``, then disambiguate repeated layer names via :func:`disambiguate`.
+    If linked documents are given, as pairs (name, root node) output by :func:`resolve_network_links`,
+    then treat each one as a folder of that name and append a FeatureCollection of its geodata, if any.
+
+    If ``disambiguate_names == True``, then disambiguate repeated layer names via :func:`disambiguate` with the given naming strategy.
+
+    If a memory limit is given, then hold the layers' Features as ASCII GeoJSON texts of at most that many bytes in total,
+    spilling the largest layer to a temporary file in the given directory whenever the limit is exceeded,
+    and give each layer a :class:`SpilledFeatures` as its ``'features'``, to be written via :meth:`SpilledFeatures.move_to`.
+    Only the names are kept to the end for disambiguation.
+
+    If ``bbox``, then add bounding boxes to the layers and their Features as in :func:`build_feature_collection`.
+    Handle altitudes according to ``dimensions`` and ``altitude`` and normalize geometries if ``rfc7946``; see :func:`build_geometry`.
+    Filter Placemarks by the given time range, copy TimeStamps if ``time_stamps``, and deduplicate properties with the given string table as in :func:`build_feature_collection`.
 
     Warning: this can produce layers with the same geodata in case the KML node has nested folders with geodata.
     """
+    options = dict(
+        bbox=bbox,
+        dimensions=dimensions,
+        altitude=altitude,
+        time_range=time_range,
+        rfc7946=rfc7946,
+        time_stamps=time_stamps,
+        strings=strings,
+    )
     layers = []
     names = []
-    for i, folder in enumerate(get(node, "Folder")):
-        name = val(get1(folder, "name"))
-        geojson = build_feature_collection(folder, name)
+    resident = []
+    held = 0
+
+    def add_layer(n, name):
+        nonlocal held
+        if memory_limit is None:
+            geojson = build_feature_collection(n, name, **options)
+        else:
+            # Hold Features as text, spilling the largest layers over the limit
+            features = SpilledFeatures(spill_dir)
+            resident.append(features)
+            b = None
+            for f in build_features(n, **options):
+                held += features.append(json.dumps(f))
+                if bbox:
+                    b = merge_bboxes([b, f.get("bbox")])
+                while held > memory_limit and resident:
+                    largest = max(resident, key=lambda x: x.held)
+                    resident.remove(largest)
+                    held -= largest.spill()
+            geojson = {"type": "FeatureCollection", "features": features}
+            if name is not None:
+                geojson["name"] = name
+            if b is not None:
+                geojson["bbox"] = b
         if geojson["features"]:
             layers.append(geojson)
             names.append(name)
 
+    for i, folder in enumerate(get(node, "Folder")):
+        add_layer(folder, val(get1(folder, "name")))
+
     if not layers:
         # No folders, so use the root node
-        name = val(get1(node, "name"))
-        geojson = build_feature_collection(node, name)
-        if geojson["features"]:
-            layers.append(geojson)
-            names.append(name)
+        add_layer(node, val(get1(node, "name")))
+
+    for name, doc in linked or []:
+        add_layer(doc, name)
 
     if disambiguate_names:
-        new_names = disambiguate(names)
+        new_names = disambiguate(names, strategy=naming_strategy)
         new_layers = []
         for i, layer in enumerate(layers):
             layer["name"] = new_names[i]
@@ -545,51 +1763,678 @@ def build_layers(node: md.Document, *, disambiguate_names: bool = True) -> list[
     return layers
 
 
+def partition_features(
+    features: list[dict],
+    *,
+    by_property: Optional[str] = None,
+    grid_size: Optional[float] = None,
+    time_bucket: Optional[str] = None,
+) -> dict[str, list[dict]]:
+    """
+    Partition the given (decoded) GeoJSON Features by the value of the property named ``by_property``, if given,
+    by the cell of a square grid of cell width ``grid_size`` degrees containing each Feature's bounding box center, if given,
+    and by the time buckets of the given size from :const:`TIME_BUCKETS` that each Feature's time interval overlaps, if given, as in :func:`time_buckets`.
+    Features can thus land in several time buckets; open ends of time intervals are cut at the earliest and latest finite times of all the Features,
+    and Features without time get the time key ``'untimed'``.
+    Return a dictionary of the form partition key -> list of Features, where the keys are filename-safe strings, such as ``'residential'`` for a property value or ``'3_5'`` for the grid cell with column index 3 and row index 5 counted from (-180, -90).
+    Features without the property get the key ``'null'`` and Features without coordinates get the grid key ``'empty'``.
+    If no partitioning is requested, return the single key ``''``.
+
+    EXAMPLE::
+
+        >>> fs = [
+        ...     {"properties": {"kind": "a"}, "geometry": {"type": "Point", "coordinates": [1, 1]}},
+        ...     {"properties": {}, "geometry": {"type": "Point", "coordinates": [15, 1]}},
+        ... ]
+        >>> {k: len(v) for k, v in partition_features(fs, by_property="kind", grid_size=10).items()}
+        {'a_18_9': 1, 'null_19_9': 1}
+
+    """
+    if time_bucket is not None:
+        intervals = [get_feature_time_interval(f) for f in features]
+        finite = [
+            t
+            for interval in intervals
+            if interval is not None
+            for t in interval
+            if math.isfinite(t)
+        ]
+        first, last = (min(finite), max(finite)) if finite else (0, 0)
+
+    groups = {}
+    for i, f in enumerate(features):
+        keys = []
+        if by_property is not None:
+            value = (f.get("properties") or {}).get(by_property)
+            keys.append("null" if value is None else to_filename(str(value)))
+        if grid_size is not None:
+            b = f.get("bbox") or get_bbox(f["geometry"])
+            if b is None:
+                keys.append("empty")
+            else:
+                x, y = bbox_center(b)
+                col = math.floor((x + 180) / grid_size)
+                row = math.floor((y + 90) / grid_size)
+                keys.append(f"{col}_{row}")
+        if time_bucket is None:
+            groups.setdefault("_".join(keys), []).append(f)
+            continue
+        interval = intervals[i]
+        if interval is None or not finite:
+            buckets = ["untimed"]
+        else:
+            begin = interval[0] if math.isfinite(interval[0]) else first
+            end = interval[1] if math.isfinite(interval[1]) else last
+            buckets = time_buckets(begin, max(begin, end), time_bucket)
+        for bucket in buckets:
+            groups.setdefault("_".join(keys + [bucket]), []).append(f)
+    return groups
+
+
+def build_spatial_index(feature_collection: dict, node_capacity: int = 16) -> dict:
+    """
+    Build a packed Sort-Tile-Recursive (STR) R-tree over the bounding boxes of the Features of the given (decoded) GeoJSON FeatureCollection.
+    Use the Features' ``'bbox'`` attributes when present, as produced by :func:`convert` with ``bbox=True``, so that no coordinates need to be rescanned;
+    otherwise compute them via :func:`get_bbox`.
+    Features without coordinates are not indexed.
+
+    Return a dictionary with the keys and values
+
+    - ``'node_capacity'``: the given node capacity
+    - ``'ids'``: list of the indices of the indexed Features in tree order
+    - ``'levels'``: list of lists of node bounding boxes, from the leaves, which correspond to ``'ids'``, up to the root; the children of node i on level k + 1 are nodes ``i*node_capacity`` to ``(i + 1)*node_capacity - 1`` on level k
+
+    Query the result with :func:`query_spatial_index`.
+    """
+    items = []
+    for i, f in enumerate(feature_collection["features"]):
+        b = f.get("bbox") or get_bbox(f["geometry"])
+        if b is not None:
+            items.append((b, i))
+
+    # Sort by center x, cut into vertical slices, and sort each slice by center y
+    n = len(items)
+    num_leaves = math.ceil(n / node_capacity)
+    slice_size = node_capacity * math.ceil(math.sqrt(num_leaves)) or 1
+    items.sort(key=lambda item: item[0][0] + item[0][2])
+    for j in range(0, n, slice_size):
+        items[j : j + slice_size] = sorted(
+            items[j : j + slice_size], key=lambda item: item[0][1] + item[0][3]
+        )
+
+    # Pack the levels bottom up
+    levels = [[b for b, i in items]]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        levels.append(
+            [
+                merge_bboxes(below[j : j + node_capacity])
+                for j in range(0, len(below), node_capacity)
+            ]
+        )
+
+    return {
+        "node_capacity": node_capacity,
+        "ids": [i for b, i in items],
+        "levels": levels,
+    }
+
+
+def query_spatial_index(index: dict, bbox: list[float]) -> list[int]:
+    """
+    Given a spatial index built by :func:`build_spatial_index` and a bounding box ``[min_x, min_y, max_x, max_y]``, return the sorted list of indices of the Features whose bounding boxes intersect the given one.
+    """
+    levels = index["levels"]
+    if not levels[0]:
+        return []
+
+    cap = index["node_capacity"]
+    top = len(levels) - 1
+    nodes = [j for j, b in enumerate(levels[top]) if bboxes_intersect(b, bbox)]
+    for k in range(top - 1, -1, -1):
+        level = levels[k]
+        nodes = [
+            j
+            for node in nodes
+            for j in range(node * cap, min((node + 1) * cap, len(level)))
+            if bboxes_intersect(level[j], bbox)
+        ]
+
+    ids = index["ids"]
+    return sorted(ids[j] for j in nodes)
+
+
+def build_time_index(feature_collection: dict, block_size: int = 64) -> dict:
+    """
+    Build a sorted interval index over the time intervals of the Features of the given (decoded) GeoJSON FeatureCollection,
+    which are parsed once via :func:`get_feature_time_interval`.
+    Features without time are not indexed.
+
+    Return a dictionary with the keys and values
+
+    - ``'block_size'``: the given block size
+    - ``'ids'``: list of the indices of the indexed Features sorted by begin time
+    - ``'begins'``: list of the corresponding begin times
+    - ``'ends'``: list of the corresponding end times
+    - ``'block_ends'``: list of the latest end time of each block of ``block_size`` consecutive entries, so that queries can skip whole blocks
+
+    Query the result with :func:`query_time_index`.
+    """
+    items = []
+    for i, f in enumerate(feature_collection["features"]):
+        interval = get_feature_time_interval(f)
+        if interval is not None:
+            items.append((interval[0], interval[1], i))
+    items.sort()
+    ends = [e for b, e, i in items]
+    return {
+        "block_size": block_size,
+        "ids": [i for b, e, i in items],
+        "begins": [b for b, e, i in items],
+        "ends": ends,
+        "block_ends": [
+            max(ends[j : j + block_size]) for j in range(0, len(ends), block_size)
+        ],
+    }
+
+
+def query_time_index(index: dict, time_range: tuple | None = None) -> list[int]:
+    """
+    Given a time index built by :func:`build_time_index` and a time range (begin, end) as in :func:`time_bounds`,
+    return the sorted list of indices of the Features whose time intervals overlap the range,
+    such as the Features active at a time t for the range (t, t).
+    """
+    begin, end = time_bounds(time_range)
+    size = index["block_size"]
+    ends = index["ends"]
+    # Entries beginning after the range end cannot overlap it
+    stop = bisect.bisect_right(index["begins"], end)
+    result = []
+    for k, block_end in enumerate(index["block_ends"]):
+        start = k * size
+        if start >= stop:
+            break
+        if block_end < begin:
+            continue
+        for j in range(start, min(start + size, stop)):
+            if ends[j] >= begin:
+                result.append(index["ids"][j])
+    return sorted(result)
+
+
+def external_sort(
+    items: Iterator[tuple[int, str]],
+    memory_limit: Optional[int] = None,
+    tmp_dir: str | pl.Path | None = None,
+) -> Iterator[str]:
+    """
+    Given an iterable of pairs (integer key, single-line string), yield the strings sorted stably by key.
+
+    If a memory limit in bytes is given, then hold at most about that many bytes of strings in memory:
+    sort them in runs that are spilled to temporary files in the given directory, which defaults to the system's,
+    and merge the runs, at most :const:`MAX_MERGE_RUNS` at a time.
+    Otherwise sort in memory.
+    """
+    if memory_limit is None:
+        for key, text in sorted(items, key=lambda item: item[0]):
+            yield text
+        return
+
+    def spill(run):
+        run.sort(key=lambda item: item[0])
+        f = tempfile.TemporaryFile("w+", encoding="utf-8", dir=tmp_dir)
+        f.writelines(f"{key} {text}\n" for key, text in run)
+        f.seek(0)
+        return f
+
+    def read(f):
+        for line in f:
+            key, text = line[:-1].split(" ", 1)
+            yield int(key), text
+
+    def merge(files):
+        return heapq.merge(*(read(f) for f in files), key=lambda item: item[0])
+
+    runs = []
+    run = []
+    size = 0
+    try:
+        for key, text in items:
+            run.append((key, text))
+            size += len(text)
+            if size >= memory_limit:
+                runs.append(spill(run))
+                run = []
+                size = 0
+                if len(runs) == MAX_MERGE_RUNS:
+                    # Merge the runs so far into one to bound the open files
+                    f = tempfile.TemporaryFile("w+", encoding="utf-8", dir=tmp_dir)
+                    f.writelines(f"{key} {text}\n" for key, text in merge(runs))
+                    f.seek(0)
+                    for r in runs:
+                        r.close()
+                    runs = [f]
+        if not runs:
+            run.sort(key=lambda item: item[0])
+            for key, text in run:
+                yield text
+            return
+        if run:
+            runs.append(spill(run))
+            run = []
+        for key, text in merge(runs):
+            yield text
+    finally:
+        for f in runs:
+            f.close()
+
+
+def sort_features(
+    features: Iterator[dict],
+    memory_limit: Optional[int] = None,
+    tmp_dir: str | pl.Path | None = None,
+) -> Iterator[dict]:
+    """
+    Yield the given (decoded) GeoJSON Features sorted stably by :func:`get_hilbert_key`,
+    so that Features close in space are close in the output.
+    If a memory limit is given, then sort the Features as JSON strings via :func:`external_sort`,
+    holding at most about that many bytes of them in memory.
+    """
+    if memory_limit is None:
+        yield from sorted(features, key=get_hilbert_key)
+        return
+    items = ((get_hilbert_key(f), json.dumps(f)) for f in features)
+    for text in external_sort(items, memory_limit, tmp_dir):
+        yield json.loads(text)
+
+
+def select_parser(size: int) -> str:
+    """
+    Return the parser from :const:`PARSERS` that the 'auto' parser uses for input of the given size in bytes:
+    minidom up to :const:`AUTO_PARSER_THRESHOLD` bytes, and beyond that lxml, if it is installed, or else ElementTree, both of which are C-accelerated and much leaner.
+    """
+    if size <= AUTO_PARSER_THRESHOLD:
+        return "minidom"
+    return "etree" if lxml_etree is None else "lxml"
+
+
+def read_kmz(kmz: str | pl.Path | BinaryIO) -> bytes:
+    """
+    Return the bytes of the main KML file inside the given KMZ archive, given as a path or a binary file object,
+    namely the file 'doc.kml', if present, or else the first KML file in the archive.
+    Raise a ``ValueError`` if the archive contains no KML file.
+    """
+    with zipfile.ZipFile(kmz) as z:
+        names = [n for n in z.namelist() if n.lower().endswith(".kml")]
+        if not names:
+            raise ValueError("KMZ archive contains no KML file")
+        name = "doc.kml" if "doc.kml" in names else names[0]
+        return z.read(name)
+
+
+def _lxml_parser(**kwargs):
+    # Never expand entities or fetch anything over the network
+    return lxml_etree.XMLParser(
+        resolve_entities=False,
+        no_network=True,
+        remove_comments=True,
+        remove_pis=True,
+        **kwargs,
+    )
+
+
+def parse_string(
+    kml_str: str | bytes, parser: str = "minidom", *, huge_tree: bool = False
+) -> Node:
+    """
+    Parse the given KML string or bytes-like object with the given parser from :const:`PARSERS` and return the root node.
+
+    The lxml parser neither expands entities nor accesses the network,
+    and keeps its limits on tree depth and text size unless ``huge_tree``, which should only be used for trusted input.
+    """
+    if parser == "minidom":
+        return md.parseString(kml_str)
+    elif parser == "etree":
+        return ET.fromstring(kml_str)
+    else:
+        if isinstance(kml_str, str):
+            # Python already decoded the string, so ignore its encoding declaration
+            p = _lxml_parser(encoding="utf-8", huge_tree=huge_tree)
+            kml_str = kml_str.encode("utf-8")
+        else:
+            p = _lxml_parser(huge_tree=huge_tree)
+        return lxml_etree.fromstring(bytes(kml_str), p)
+
+
+def parse_kml(
+    kml_path_or_buffer: str | pl.Path | TextIO | BinaryIO,
+    *,
+    parser: str = "auto",
+    recover: bool = False,
+    huge_tree: bool = False,
+) -> Node:
+    """
+    Parse the KML or KMZ file at the given path or the given KML or KMZ file object with the given parser and return the root node.
+    Close the file object afterwards.
+    Read KMZ files, which are ZIP archives, via :func:`read_kmz`.
+
+    The parser is one of :const:`PARSERS` or 'auto', which selects one by input size via :func:`select_parser`.
+    All parsers yield nodes that work with :func:`get`, :func:`get1`, :func:`attr`, and :func:`val`, and hence with all the builder functions, which produce the same results for every parser.
+
+    Memory-map files given by path and hand their bytes straight to the parser, which decodes them according to the encoding declared in their XML prolog,
+    so that no decoded copy of the file is ever held in memory;
+    lxml reads such files itself.
+    If ``recover`` and the file does not parse, then decode it as UTF-8, ignoring undecodable bytes, and parse it again;
+    lxml instead uses its own recovery mode.
+    Otherwise, raise the parser's error.
+    Lift lxml's limits on tree depth and text size if ``huge_tree``; see :func:`parse_string`.
+    """
+    if parser not in PARSERS and parser != "auto":
+        raise ValueError(f"parser must be 'auto' or one of {PARSERS}")
+    if parser == "lxml" and lxml_etree is None:
+        raise ImportError("the lxml parser requires the package lxml")
+
+    if not isinstance(kml_path_or_buffer, (str, pl.Path)):
+        kml_str = kml_path_or_buffer.read()
+        kml_path_or_buffer.close()
+        if isinstance(kml_str, bytes) and kml_str.startswith(b"PK\x03\x04"):
+            kml_str = read_kmz(io.BytesIO(kml_str))
+        if parser == "auto":
+            parser = select_parser(len(kml_str))
+        return parse_string(kml_str, parser, huge_tree=huge_tree)
+
+    path = pl.Path(kml_path_or_buffer).resolve()
+    if zipfile.is_zipfile(path):
+        kml_str = read_kmz(path)
+        if parser == "auto":
+            parser = select_parser(len(kml_str))
+        return parse_string(kml_str, parser, huge_tree=huge_tree)
+
+    size = path.stat().st_size
+    if parser == "auto":
+        parser = select_parser(size)
+    if parser == "lxml":
+        p = _lxml_parser(huge_tree=huge_tree, recover=recover)
+        return lxml_etree.parse(str(path), p).getroot()
+
+    with path.open("rb") as src:
+        if size == 0:
+            # Empty files can't be memory-mapped; let the parser complain
+            return parse_string(b"", parser)
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as kml_bytes:
+            try:
+                return parse_string(kml_bytes, parser)
+            except (xml.parsers.expat.ExpatError, ET.ParseError):
+                if not recover:
+                    raise
+                kml_str = kml_bytes[:].decode("utf-8", errors="ignore")
+
+    return parse_string(kml_str, parser, huge_tree=huge_tree)
+
+
+def get_network_links(node: Node) -> list[tuple[str, str]]:
+    """
+    Return a list of pairs (name, href) for the NetworkLinks in the given KML DOM node that have an href,
+    in document order.
+    """
+    result = []
+    for link in get(node, "NetworkLink"):
+        href = val(get1(link, "href"))
+        if href:
+            result.append((val(get1(link, "name")), href))
+    return result
+
+
+def resolve_network_links(
+    node: Node,
+    base_url: Optional[str] = None,
+    *,
+    fetch_http: Optional[Callable] = None,
+    cache: Optional[links.LinkCache] = None,
+    workers: int = links.LINK_WORKERS,
+    max_depth: int = 8,
+    parser: str = "auto",
+) -> list[tuple[str, Node]]:
+    """
+    Fetch and parse the KML and KMZ documents that the NetworkLinks of the given KML DOM node refer to,
+    resolving relative hrefs against the given base URL, usually the file URL of the document of the node.
+    Follow the NetworkLinks of the linked documents in turn, up to ``max_depth`` links deep, and fetch each URL only once,
+    and never the base URL, so that cycles of links end.
+
+    Fetch the documents of each level of links concurrently via :func:`kml2geojson.links.fetch_all`
+    with the given HTTP fetcher, cache, and number of workers;
+    without HTTP fetcher, only local paths and file URLs are followed.
+    Parse them via :func:`parse_kml` with the given parser.
+    Skip, with a warning, the documents that fail to fetch or parse.
+
+    Return a list of pairs (name, root node) of the linked documents in depth-first document order,
+    where the name is that of the NetworkLink or, failing that, of the document.
+    """
+
+    def get_links(n, base):
+        return [(name, links.to_url(href, base)) for name, href in get_network_links(n)]
+
+    top = get_links(node, base_url)
+    # Don't link back to the document itself
+    docs = {base_url: None}
+    children = {}
+    level = [url for name, url in top]
+    for __ in range(max_depth):
+        level = [url for url in dict.fromkeys(level) if url not in docs]
+        if not level:
+            break
+        results = links.fetch_all(
+            level, fetch_http=fetch_http, cache=cache, workers=workers
+        )
+        next_level = []
+        for url in level:
+            content = results[url]
+            docs[url] = None
+            try:
+                if isinstance(content, Exception):
+                    raise content
+                doc = parse_kml(io.BytesIO(content), parser=parser)
+            except Exception as e:
+                warnings.warn(f"skipping NetworkLink to {url}: {e}")
+                continue
+            docs[url] = doc
+            children[url] = get_links(doc, url)
+            next_level.extend(u for name, u in children[url])
+        level = next_level
+
+    result = []
+    done = set()
+
+    def visit(items):
+        for name, url in items:
+            if docs.get(url) is None or url in done:
+                continue
+            done.add(url)
+            doc = docs[url]
+            result.append((name or val(get1(doc, "name")), doc))
+            visit(children[url])
+
+    visit(top)
+    return result
+
+
 def convert(
     kml_path_or_buffer: str | pl.Path | TextIO | BinaryIO,
     feature_collection_name: Optional[str] = None,
     style_type: Optional[str] = None,
     *,
     separate_folders: bool = False,
+    naming_strategy: str = "append",
+    bbox: bool = False,
+    parser: str = "auto",
+    recover: bool = False,
+    huge_tree: bool = False,
+    dimensions: Optional[int] = None,
+    altitude: str = "keep",
+    time_range: Optional[tuple] = None,
+    rfc7946: bool = False,
+    time_stamps: bool = False,
+    hilbert_sort: bool = False,
+    intern_strings: bool = False,
+    share_properties: bool = False,
+    follow_links: bool = False,
+    fetch_http: Optional[Callable] = None,
+    link_cache: Optional[links.LinkCache] = None,
+    memory_limit: Optional[int] = None,
+    spill_dir: Optional[str | pl.Path] = None,
+    output_format: str = "geojson",
+    quantization: Optional[int] = 10**5,
 ):
     """
-    Given a path to a KML file or given a KML file object,
+    Given a path to a KML or KMZ file or given a KML or KMZ file object,
     convert it to a single GeoJSON FeatureCollection dictionary named
     ``feature_collection_name``.
     Close the KML file afterwards.
+    Read and parse the KML file via :func:`parse_kml` with the given ``parser``,
+    ``recover``, and ``huge_tree`` options.
 
     If ``separate_folders``, then return several FeatureCollections,
     one for each folder in the KML file that contains geodata or that has a descendant
     node that contains geodata.
     Warning: this can produce FeatureCollections with the same geodata in case the KML
     file has nested folders with geodata.
+    Disambiguate repeated folder names with the given naming strategy from
+    :const:`NAMING_STRATEGIES`; see :func:`disambiguate`.
 
     If a style type from :const:`STYLE_TYPES` is given, then also create a JSON
     dictionary that encodes into the style type the style information contained in the
     KML file.
 
+    If ``bbox``, then give every FeatureCollection and Feature a ``'bbox'`` attribute,
+    computed while parsing coordinates; see :func:`build_spatial_index` for
+    indexing the result.
+
+    If ``dimensions`` is given, then keep at most that many values per coordinate tuple,
+    so that ``dimensions=2`` drops altitudes while parsing coordinates.
+    If ``altitude`` is 'auto' instead of the default 'keep', then drop the altitudes of
+    every geometry whose altitudes are all zero; see :func:`build_geometry`.
+
+    If a time range (begin, end) of KML time strings, numbers of seconds since
+    1970-01-01T00:00:00Z, or ``None`` for open ends is given, then skip the Placemarks
+    whose TimeSpans, TimeStamps, or track times lie outside of it, without parsing
+    their geometries; see :func:`build_feature_collection`.
+    If ``time_stamps``, then copy the TimeStamps of Placemarks into the property
+    'timeStamp', which :func:`get_feature_time_interval` reads, e.g. to partition
+    Features by time.
+
+    If ``rfc7946``, then normalize the geometries as RFC 7946 requires while parsing
+    their coordinates: wind exterior Polygon rings counterclockwise and interior rings
+    clockwise, and split LineStrings and Polygons that cross the antimeridian into
+    MultiLineStrings and MultiPolygons; see :func:`build_geometry`.
+
+    If ``intern_strings``, then deduplicate repeated property keys and short property
+    values, such as ExtendedData names and category codes, across Features via a
+    :class:`StringTable`, to save memory on large files.
+    If ``share_properties``, then also let Features with identical properties share
+    one properties dictionary, which must then be copied before being modified.
+
+    If ``follow_links``, then also convert the documents that the NetworkLinks of the
+    KML file refer to, fetched concurrently via :func:`resolve_network_links` with the
+    given HTTP fetcher and cache, if any, and parsed with the given ``parser``.
+    Their Placemarks go into the single FeatureCollection or, if
+    ``separate_folders``, into one FeatureCollection per linked document; see
+    :func:`build_layers`.
+
+    If ``separate_folders`` and a ``memory_limit`` is given, then hold at most that many
+    bytes of GeoJSON text of Features in memory, spilling the rest to temporary files in
+    ``spill_dir``, so that the FeatureCollections' ``'features'`` are
+    :class:`SpilledFeatures`; see :func:`build_layers`.
+    Not available with ``hilbert_sort`` or TopoJSON output, which need every Feature in
+    memory.
+
+    If ``hilbert_sort``, then sort the Features of each FeatureCollection along a
+    Hilbert curve by the centroids of their bounding boxes instead of keeping them in
+    document order, which improves the locality of downstream compression, tiling,
+    and range reads; see :func:`sort_features`.
+
+    If ``output_format`` is 'topojson' instead of the default 'geojson',
+    then convert each FeatureCollection to a TopoJSON Topology with the given
+    ``quantization`` via :func:`kml2geojson.topology.build_topology`, so that each
+    boundary shared by adjacent Polygons or LineStrings of a layer is stored only once.
+
     Return a tuple (style dict, FeatureCollection 1, ..., FeatureCollection n),
     where the style dict is present if and only if ``style_type`` is given and
     where n > 1 if and only if ``separate_folders`` and the KML file contains more than
     one folder of geodata.
     """
-    # Read KML
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output format must be one of {OUTPUT_FORMATS}")
+    if altitude not in ALTITUDE_MODES:
+        raise ValueError(f"altitude mode must be one of {ALTITUDE_MODES}")
+    if quantization is not None and quantization < 2:
+        raise ValueError("quantization must be at least 2")
+    if memory_limit is not None and not separate_folders:
+        raise ValueError("memory limit requires separate folders")
+    if memory_limit is not None and (hilbert_sort or output_format == "topojson"):
+        raise ValueError(
+            "memory limit is not available with Hilbert sorting or TopoJSON output"
+        )
+
+    # Read and parse KML
     if isinstance(kml_path_or_buffer, (str, pl.Path)):
-        kml_path_or_buffer = pl.Path(kml_path_or_buffer).resolve()
-        with kml_path_or_buffer.open(encoding="utf-8", errors="ignore") as src:
-            kml_str = src.read()
+        base_url = pl.Path(kml_path_or_buffer).resolve().as_uri()
     else:
-        kml_str = kml_path_or_buffer.read()
-        kml_path_or_buffer.close()
+        base_url = pl.Path.cwd().as_uri() + "/"
+    root = parse_kml(
+        kml_path_or_buffer, parser=parser, recover=recover, huge_tree=huge_tree
+    )
+
+    # Fetch linked documents
+    linked = []
+    if follow_links:
+        linked = resolve_network_links(
+            root, base_url, fetch_http=fetch_http, cache=link_cache, parser=parser
+        )
 
-    # Parse KML
-    root = md.parseString(kml_str)
+    if time_range is not None:
+        time_range = time_bounds(time_range)
 
     # Build GeoJSON layers
+    strings = None
+    if intern_strings or share_properties:
+        strings = StringTable(share_properties=share_properties)
+    options = dict(
+        bbox=bbox,
+        dimensions=dimensions,
+        altitude=altitude,
+        time_range=time_range,
+        rfc7946=rfc7946,
+        time_stamps=time_stamps,
+        strings=strings,
+    )
     if separate_folders:
-        result = build_layers(root)
+        result = build_layers(
+            root,
+            naming_strategy=naming_strategy,
+            linked=linked,
+            memory_limit=memory_limit,
+            spill_dir=spill_dir,
+            **options,
+        )
     else:
-        result = [build_feature_collection(root, name=feature_collection_name)]
+        result = [
+            build_feature_collection(root, name=feature_collection_name, **options)
+        ]
+        if linked:
+            features = result[0]["features"]
+            for name, doc in linked:
+                features.extend(build_feature_collection(doc, **options)["features"])
+            if bbox:
+                b = merge_bboxes(f.get("bbox") for f in features)
+                if b is not None:
+                    result[0]["bbox"] = b
+
+    if hilbert_sort:
+        for layer in result:
+            layer["features"] = list(sort_features(layer["features"]))
+
+    if output_format == "topojson":
+        result = [build_topology(layer, quantization=quantization) for layer in result]
 
     if style_type is not None:
         # Build style dictionary
@@ -601,3 +2446,302 @@ def convert(
             result = style_dict, *result
 
     return result
+
+
+# ----------------
+# Placemark index
+# ----------------
+def _scan_text(raw: bytes) -> str:
+    """
+    Decode the given raw element text, dropping any CDATA wrapper and unescaping XML entities.
+    """
+    text = raw.decode("utf-8", errors="replace").strip()
+    if text.startswith("<![CDATA[") and text.endswith("]]>"):
+        return text[9:-3].strip()
+    return unescape(text, {"&quot;": '"', "&apos;": "'"})
+
+
+def scan_placemarks(
+    kml_bytes: bytes, start: int = 0, folders: tuple = ()
+) -> Iterator[dict]:
+    """
+    Scan the given raw KML bytes, which can be a memory map, for Placemarks without parsing them as XML,
+    starting at byte offset ``start`` inside the folders named by ``folders``, outermost first.
+    Yield a dictionary for each Placemark with the keys and values
+
+    - ``'offset'``: byte offset of the Placemark's start tag
+    - ``'length'``: byte length of the Placemark up to and including its end tag
+    - ``'id'``: the Placemark's id attribute, or ``''``
+    - ``'folders'``: tuple of the names of the folders containing the Placemark, outermost first
+    - ``'bbox'``: rough bounding box ``[min_x, min_y, max_x, max_y]`` of the Placemark's coordinates, or ``None`` if it has none
+
+    Tags inside comments and CDATA sections are skipped, as an XML parser would.
+    """
+    stack = list(folders)
+    pos = start
+    placemark = None
+    b = None
+    search = SCAN_TAG.search
+    while True:
+        match = search(kml_bytes, pos)
+        if match is None:
+            break
+        pos = match.end()
+        skip, closing, tag, attrs = match.groups()
+        if skip is not None:
+            end = kml_bytes.find(SCAN_SKIP_END[skip], pos)
+            if end < 0:
+                break
+            pos = end + len(SCAN_SKIP_END[skip])
+            continue
+        self_closing = attrs.endswith(b"/")
+        if tag == b"Folder":
+            if self_closing:
+                continue
+            if closing:
+                if stack:
+                    stack.pop()
+            else:
+                stack.append(None)
+        elif tag == b"Placemark":
+            if self_closing:
+                continue
+            if not closing:
+                m = re.search(rb"""\bid\s*=\s*(["'])(.*?)\1""", attrs)
+                placemark = {
+                    "offset": match.start(),
+                    "id": _scan_text(m.group(2)) if m else "",
+                }
+                b = list(EMPTY_BBOX)
+            elif placemark is not None:
+                placemark["length"] = pos - placemark["offset"]
+                placemark["folders"] = tuple(name or "" for name in stack)
+                placemark["bbox"] = b if b[0] <= b[2] else None
+                yield placemark
+                placemark = None
+        elif closing or self_closing:
+            continue
+        elif tag == b"name":
+            if placemark is None and stack and stack[-1] is None:
+                end = kml_bytes.find(b"</", pos)
+                stack[-1] = _scan_text(kml_bytes[pos:end])
+        elif placemark is not None:
+            # Coordinates
+            end = kml_bytes.find(b"</", pos)
+            text = bytes(kml_bytes[pos:end])
+            try:
+                if tag == b"coordinates":
+                    for t in text.split():
+                        update_bbox(b, [float(x) for x in t.split(b",")[:2]])
+                else:
+                    update_bbox(b, [float(x) for x in text.split()[:2]])
+            except (ValueError, IndexError):
+                pass
+            pos = end
+
+
+def _scan_root(kml_bytes: bytes) -> tuple[bytes, bytes]:
+    """
+    Return the prefix, consisting of the XML declaration, if any, and the root start tag with its namespace declarations,
+    and the suffix, consisting of the root end tag, needed to parse a Placemark cut out of the given raw KML bytes on its own.
+
+    Namespace declarations made below the root element, e.g. on a Document or Folder, are moved to the root start tag,
+    the first declaration of each prefix winning, so that Placemarks using those prefixes still parse.
+    """
+    head = bytes(kml_bytes[: 2**16])
+    decl = re.match(rb"\s*(<\?xml[^>]*\?>)", head)
+    root = re.search(rb"<((?:[A-Za-z_][\w.-]*:)?kml)\b[^>]*>", head)
+    if root is None:
+        root_tag = b'<kml xmlns="http://www.opengis.net/kml/2.2">'
+        qname = b"kml"
+    else:
+        root_tag = root.group(0)
+        qname = root.group(1)
+        if root_tag.endswith(b"/>"):
+            root_tag = root_tag[:-2] + b">"
+    declared = {m.group(1) for m in XMLNS_DECLARATION.finditer(root_tag)}
+    extra = []
+    for m in XMLNS_DECLARATION.finditer(kml_bytes, root.end() if root else 0):
+        if m.group(1) not in declared:
+            declared.add(m.group(1))
+            extra.append(m.group(0))
+    if b"gx" not in declared:
+        extra.append(f' xmlns:gx="{GX_NAMESPACE}"'.encode())
+    root_tag = root_tag[:-1] + b"".join(extra) + b">"
+    prefix = (decl.group(1) if decl else b"") + root_tag
+    return prefix, b"</" + qname + b">"
+
+
+def build_placemark_index(
+    kml_path: str | pl.Path, index_path: str | pl.Path | None = None
+) -> pl.Path:
+    """
+    Scan the KML file at the given path once via :func:`scan_placemarks` and write a compact binary index of its Placemarks to the given index path,
+    which defaults to the KML path plus :const:`INDEX_SUFFIX`.
+    Return the index path.
+
+    The index records the size and modification time of the KML file, so that stale indices can be detected,
+    and for each Placemark its byte offset, byte length, rough bounding box, id, and folder path.
+    """
+    kml_path = pl.Path(kml_path)
+    index_path = pl.Path(index_path or f"{kml_path}{INDEX_SUFFIX}")
+    stat = kml_path.stat()
+    nan = float("nan")
+    with kml_path.open("rb") as src:
+        if stat.st_size:
+            kml_bytes = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            kml_bytes = b""
+        prefix, suffix = _scan_root(kml_bytes)
+        records = []
+        for p in scan_placemarks(kml_bytes):
+            pid = p["id"].encode("utf-8")
+            # XML text can't contain the unit separator, so use it to join names
+            path = "\x1f".join(p["folders"]).encode("utf-8")
+            records.append(
+                struct.pack(
+                    "<QQ4dHI",
+                    p["offset"],
+                    p["length"],
+                    *(p["bbox"] or [nan] * 4),
+                    len(pid),
+                    len(path),
+                )
+                + pid
+                + path
+            )
+        if stat.st_size:
+            kml_bytes.close()
+
+    with index_path.open("wb") as tgt:
+        tgt.write(
+            struct.pack(
+                "<8sQdIII",
+                b"K2GINDEX",
+                stat.st_size,
+                stat.st_mtime,
+                len(records),
+                len(prefix),
+                len(suffix),
+            )
+        )
+        tgt.write(prefix + suffix)
+        tgt.writelines(records)
+
+    return index_path
+
+
+def read_placemark_index(index_path: str | pl.Path) -> dict:
+    """
+    Read the placemark index at the given path, as written by :func:`build_placemark_index`, and return a dictionary with the keys and values
+
+    - ``'size'``: size of the indexed KML file in bytes
+    - ``'mtime'``: modification time of the indexed KML file
+    - ``'prefix'``, ``'suffix'``: bytes to wrap around a Placemark cut out of the KML file to parse it
+    - ``'records'``: list of dictionaries as yielded by :func:`scan_placemarks`, in file order
+
+    """
+    data = pl.Path(index_path).read_bytes()
+    header = struct.Struct("<8sQdIII")
+    magic, size, mtime, n, len_prefix, len_suffix = header.unpack_from(data)
+    if magic != b"K2GINDEX":
+        raise ValueError(f"{index_path} is not a placemark index")
+    pos = header.size
+    prefix = data[pos : pos + len_prefix]
+    pos += len_prefix
+    suffix = data[pos : pos + len_suffix]
+    pos += len_suffix
+
+    record = struct.Struct("<QQ4dHI")
+    records = []
+    for __ in range(n):
+        offset, length, *bbox, len_id, len_path = record.unpack_from(data, pos)
+        pos += record.size
+        pid = data[pos : pos + len_id].decode("utf-8")
+        pos += len_id
+        path = data[pos : pos + len_path].decode("utf-8")
+        pos += len_path
+        records.append(
+            {
+                "offset": offset,
+                "length": length,
+                "id": pid,
+                "folders": tuple(path.split("\x1f")) if path else (),
+                "bbox": None if math.isnan(bbox[0]) else bbox,
+            }
+        )
+
+    return {
+        "size": size,
+        "mtime": mtime,
+        "prefix": prefix,
+        "suffix": suffix,
+        "records": records,
+    }
+
+
+def load_placemark_index(
+    kml_path: str | pl.Path, index_path: str | pl.Path | None = None
+) -> dict:
+    """
+    Read the placemark index of the KML file at the given path via :func:`read_placemark_index`,
+    first (re)building it via :func:`build_placemark_index` if it does not exist or is stale.
+    """
+    kml_path = pl.Path(kml_path)
+    index_path = pl.Path(index_path or f"{kml_path}{INDEX_SUFFIX}")
+    stat = kml_path.stat()
+    if index_path.exists():
+        index = read_placemark_index(index_path)
+        if index["size"] == stat.st_size and index["mtime"] == stat.st_mtime:
+            return index
+    return read_placemark_index(build_placemark_index(kml_path, index_path))
+
+
+def iter_features(
+    kml_path: str | pl.Path,
+    ids: Optional[list[str]] = None,
+    bbox: Optional[list[float]] = None,
+    *,
+    index_path: str | pl.Path | None = None,
+    **kwargs,
+) -> Iterator[dict]:
+    """
+    Yield in file order the (decoded) GeoJSON Features of the Placemarks of the KML file at the given path that have one of the given ids, if given,
+    and whose rough bounding boxes intersect the given bounding box, if given.
+    Use the file's placemark index, via :func:`load_placemark_index`, to read and parse only the byte ranges of the matching Placemarks,
+    and build each Feature via :func:`build_feature` with the given keyword arguments.
+    """
+    index = load_placemark_index(kml_path, index_path)
+    records = index["records"]
+    if ids is not None:
+        ids = set(ids)
+        records = [r for r in records if r["id"] in ids]
+    if bbox is not None:
+        records = [
+            r for r in records if r["bbox"] and bboxes_intersect(r["bbox"], bbox)
+        ]
+
+    prefix, suffix = index["prefix"], index["suffix"]
+    with pl.Path(kml_path).open("rb") as src:
+        for r in records:
+            src.seek(r["offset"])
+            root = parse_string(prefix + src.read(r["length"]) + suffix, "etree")
+            feature = build_feature(root[0], **kwargs)
+            if feature is not None:
+                yield feature
+
+
+def get_feature(
+    kml_path: str | pl.Path,
+    id: str,
+    *,
+    index_path: str | pl.Path | None = None,
+    **kwargs,
+) -> dict | None:
+    """
+    Return the (decoded) GeoJSON Feature of the first Placemark with the given id in the KML file at the given path, or ``None`` if there is none.
+    Seek straight to the Placemark via :func:`iter_features`, which see for the other arguments.
+    """
+    return next(
+        iter_features(kml_path, ids=[id], index_path=index_path, **kwargs), None
+    )
@@ -0,0 +1,298 @@
+"""
+A persistent HTTP server, over TCP or a Unix socket, that converts uploaded KML and
+KMZ files to GeoJSON on a pool of warm worker processes.
+
+Endpoints:
+
+- ``POST /convert``: convert the KML or KMZ file in the request body via
+  :func:`kml2geojson.main.convert`, whose keyword arguments ``feature_collection_name``,
+  ``style_type``, ``separate_folders``, ``naming_strategy``, ``bbox``, ``parser``,
+  ``dimensions``, ``altitude``, ``time_range``, given as 'begin,end', ``rfc7946``, and
+  ``hilbert_sort`` can be given as query parameters.
+  Respond with the FeatureCollection or, if there is more than one result, with the
+  JSON list of results, or, if the query parameter ``format`` is 'geojsonseq',
+  stream all the Features as GeoJSON text sequences (RFC 8142).
+- ``GET /metrics``: respond with request counts, throughput, and latency percentiles.
+- ``GET /health``: respond with 'ok'.
+"""
+
+from __future__ import annotations
+import collections
+import concurrent.futures as cf
+import http.server
+import io
+import json
+import os
+import socketserver
+import threading
+import time
+import urllib.parse
+from typing import Optional
+
+import kml2geojson.main as m
+
+#: Query parameters of ``POST /convert`` that are passed to
+#: :func:`kml2geojson.main.convert`, mapped to their parsers
+CONVERT_PARAMS = {
+    "feature_collection_name": str,
+    "style_type": str,
+    "separate_folders": lambda v: v.lower() in ["1", "true", "yes"],
+    "naming_strategy": str,
+    "bbox": lambda v: v.lower() in ["1", "true", "yes"],
+    "parser": str,
+    "dimensions": int,
+    "altitude": str,
+    "time_range": lambda v: tuple(t or None for t in (v + ",").split(",")[:2]),
+    "rfc7946": lambda v: v.lower() in ["1", "true", "yes"],
+    "hilbert_sort": lambda v: v.lower() in ["1", "true", "yes"],
+}
+
+# Smallest KML used to warm up the workers
+WARMUP_KML = (
+    b'<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><Point>'
+    b"<coordinates>0,0</coordinates></Point></Placemark></kml>"
+)
+
+
+def convert_bytes(kml_bytes: bytes, options: dict) -> list:
+    """
+    Convert the given KML or KMZ bytes via :func:`kml2geojson.main.convert` with the given keyword arguments and return the results as a list.
+    """
+    return list(m.convert(io.BytesIO(kml_bytes), **options))
+
+
+class Metrics:
+    """
+    Thread-safe request counters and a sliding window of request latencies.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=window)
+
+    def record(self, outcome: str, latency: Optional[float] = None) -> None:
+        with self.lock:
+            self.counts[outcome] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def snapshot(self) -> dict:
+        """
+        Return a dictionary of the request counts by outcome, the overall throughput in completed requests per second, and the 50th, 90th, and 99th percentile latencies in seconds of the recent completed requests.
+        """
+        with self.lock:
+            counts = dict(self.counts)
+            latencies = sorted(self.latencies)
+        uptime = time.monotonic() - self.start
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            "uptime": uptime,
+            "requests": counts,
+            "throughput": counts.get("ok", 0) / uptime if uptime else 0,
+            "latency": {
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+            },
+        }
+
+
+class ConversionHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler for the endpoints described in this module's docstring.
+    Expects its server to have the attributes ``executor``, ``metrics``, ``slots``, ``convert_timeout``, and ``max_upload_bytes``.
+    """
+
+    server_version = "kml2geojson"
+
+    def address_string(self):
+        # Unix sockets have no client address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, obj) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str) -> None:
+        self.send_json(status, {"error": message})
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/metrics":
+            self.send_json(200, self.server.metrics.snapshot())
+        elif path == "/health":
+            self.send_json(200, "ok")
+        else:
+            self.send_error_json(404, "not found")
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/convert":
+            self.send_error_json(404, "not found")
+            return
+
+        metrics = self.server.metrics
+        start = time.monotonic()
+
+        # Validate the request
+        query = dict(urllib.parse.parse_qsl(url.query))
+        output_format = query.pop("format", "geojson")
+        try:
+            options = {k: CONVERT_PARAMS[k](v) for k, v in query.items()}
+        except KeyError as e:
+            metrics.record("bad_request")
+            self.send_error_json(400, f"unknown parameter {e}")
+            return
+        except ValueError as e:
+            metrics.record("bad_request")
+            self.send_error_json(400, f"invalid parameter value: {e}")
+            return
+        if output_format not in ["geojson", "geojsonseq"]:
+            metrics.record("bad_request")
+            self.send_error_json(400, "format must be 'geojson' or 'geojsonseq'")
+            return
+        length = self.headers.get("Content-Length")
+        if length is None:
+            metrics.record("bad_request")
+            self.send_error_json(411, "Content-Length required")
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            metrics.record("bad_request")
+            self.send_error_json(400, "invalid Content-Length")
+            return
+        if length > self.server.max_upload_bytes:
+            metrics.record("too_large")
+            self.send_error_json(413, "upload too large")
+            return
+
+        # Limit concurrency
+        slots = self.server.slots
+        if not slots.acquire(blocking=False):
+            metrics.record("rejected")
+            self.send_error_json(503, "too many concurrent requests")
+            return
+        try:
+            data = self.rfile.read(length)
+            future = self.server.executor.submit(convert_bytes, data, options)
+        except BaseException:
+            slots.release()
+            raise
+        # Hold the slot until the conversion ends, even after a timeout,
+        # since a running worker process can't be interrupted
+        future.add_done_callback(lambda f: slots.release())
+        try:
+            result = future.result(timeout=self.server.convert_timeout)
+        except cf.TimeoutError:
+            future.cancel()
+            metrics.record("timeout")
+            self.send_error_json(504, "conversion timed out")
+            return
+        except Exception as e:
+            metrics.record("error")
+            self.send_error_json(422, f"conversion failed: {e}")
+            return
+
+        if output_format == "geojsonseq":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/geo+json-seq")
+            self.end_headers()
+            for item in result:
+                if item.get("type") != "FeatureCollection":
+                    continue
+                for feature in item["features"]:
+                    self.wfile.write(b"\x1e" + json.dumps(feature).encode() + b"\n")
+        else:
+            self.send_json(200, result[0] if len(result) == 1 else result)
+        metrics.record("ok", time.monotonic() - start)
+
+
+class ConversionServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    Threaded HTTP server over TCP that hands conversions to a process pool.
+    """
+
+    daemon_threads = True
+
+
+class UnixConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded HTTP server over a Unix socket that hands conversions to a process pool.
+    """
+
+    daemon_threads = True
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    *,
+    socket_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    timeout: float = 60,
+    max_upload_bytes: int = 2**30,
+    quiet: bool = False,
+):
+    """
+    Create a conversion server listening on the given host and port or, if given, on a Unix socket at the given path,
+    backed by a pool of ``workers`` processes, which defaults to the number of CPUs.
+    Start and warm up all the worker processes, so that no request pays for their startup and imports.
+
+    Reject requests beyond ``max_concurrency`` concurrent conversions, which defaults to twice the number of workers, with status 503,
+    give up waiting for a conversion after ``timeout`` seconds with status 504,
+    and reject uploads larger than ``max_upload_bytes`` with status 413.
+    A conversion that timed out is cancelled if it has not started yet; otherwise its worker finishes it,
+    and it keeps counting against ``max_concurrency`` until then, so that slow uploads can't queue up unbounded work.
+
+    Return the server; call its ``serve_forever()`` method to serve and its ``shutdown()`` and ``server_close()`` methods, and then ``executor.shutdown()``, to stop.
+    """
+    num_workers = workers or os.cpu_count() or 1
+    executor = cf.ProcessPoolExecutor(max_workers=num_workers)
+    list(executor.map(convert_bytes, [WARMUP_KML] * num_workers, [{}] * num_workers))
+
+    if socket_path is not None:
+        server = UnixConversionServer(socket_path, ConversionHandler)
+    else:
+        server = ConversionServer((host, port), ConversionHandler)
+    server.executor = executor
+    server.metrics = Metrics()
+    server.slots = threading.BoundedSemaphore(max_concurrency or 2 * num_workers)
+    server.convert_timeout = timeout
+    server.max_upload_bytes = max_upload_bytes
+    server.quiet = quiet
+    return server
+
+
+def serve(*args, **kwargs) -> None:
+    """
+    Create a server via :func:`make_server` with the given arguments and serve until interrupted.
+    """
+    server = make_server(*args, **kwargs)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.executor.shutdown()
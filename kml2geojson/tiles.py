@@ -0,0 +1,687 @@
+"""
+Functions to cut (decoded) GeoJSON FeatureCollections, such as the ones produced by
+:func:`kml2geojson.main.convert`, into a pyramid of
+`Mapbox Vector Tiles <https://github.com/mapbox/vector-tile-spec>`_ and to store
+that pyramid as an MBTiles file or as a directory of ``z/x/y.pbf`` files.
+"""
+
+from __future__ import annotations
+import collections
+import concurrent.futures as cf
+import gzip
+import itertools
+import json
+import math
+import os
+import pathlib as pl
+import sqlite3
+import struct
+from typing import Iterable, Iterator, Optional
+
+import kml2geojson.main as m
+
+#: Largest latitude representable in Web Mercator
+MAX_LAT = 85.0511287798066
+
+#: Vector tile geometry types
+POINT, LINESTRING, POLYGON = 1, 2, 3
+
+#: Number of tiles per job sent to a worker process by :func:`build_tiles`
+TILE_CHUNK_SIZE = 64
+
+# Set in each worker process by :func:`_init_worker`
+_LAYERS = None
+_OPTIONS = None
+
+
+def lonlat_to_world(lon: float, lat: float) -> tuple[float, float]:
+    """
+    Project the given WGS84 longitude and latitude to Web Mercator coordinates scaled to the unit square, with the origin at the top left, as in the tile scheme.
+    """
+    lat = max(min(lat, MAX_LAT), -MAX_LAT)
+    s = math.sin(math.radians(lat))
+    return (lon + 180) / 360, 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def project_geometry(geometry: dict) -> list[tuple[int, list]]:
+    """
+    Project the given (decoded) GeoJSON geometry via :func:`lonlat_to_world` and return it as a list of pairs (vector tile geometry type, parts),
+    at most one pair per geometry type, where the parts are points, lines, or lists of polygon rings, respectively.
+    """
+    parts = {POINT: [], LINESTRING: [], POLYGON: []}
+    stack = [geometry]
+    while stack:
+        g = stack.pop()
+        t = g["type"]
+        if t == "GeometryCollection":
+            stack.extend(reversed(g["geometries"]))
+        elif t == "Point":
+            if g["coordinates"]:
+                parts[POINT].append(lonlat_to_world(*g["coordinates"][:2]))
+        elif t == "LineString":
+            parts[LINESTRING].append(
+                [lonlat_to_world(*p[:2]) for p in g["coordinates"]]
+            )
+        elif t == "MultiLineString":
+            parts[LINESTRING].extend(
+                [lonlat_to_world(*p[:2]) for p in line] for line in g["coordinates"]
+            )
+        elif t == "Polygon":
+            parts[POLYGON].append(
+                [[lonlat_to_world(*p[:2]) for p in ring] for ring in g["coordinates"]]
+            )
+        elif t == "MultiPolygon":
+            parts[POLYGON].extend(
+                [[lonlat_to_world(*p[:2]) for p in ring] for ring in polygon]
+                for polygon in g["coordinates"]
+            )
+    return [(t, p) for t, p in parts.items() if p]
+
+
+def clip_line(line: list, lo: float, hi: float) -> list[list]:
+    """
+    Clip the given line, a list of (x, y) pairs, to the square ``[lo, hi] x [lo, hi]`` via the Liang--Barsky algorithm and return the resulting list of lines.
+    """
+    lines = []
+    current = []
+    for (x0, y0), (x1, y1) in zip(line, line[1:]):
+        dx, dy = x1 - x0, y1 - y0
+        t0, t1 = 0.0, 1.0
+        inside = True
+        for p, q in ((-dx, x0 - lo), (dx, hi - x0), (-dy, y0 - lo), (dy, hi - y0)):
+            if p == 0:
+                if q < 0:
+                    inside = False
+                    break
+            else:
+                r = q / p
+                if p < 0:
+                    t0 = max(t0, r)
+                else:
+                    t1 = min(t1, r)
+                if t0 > t1:
+                    inside = False
+                    break
+        if not inside:
+            if current:
+                lines.append(current)
+                current = []
+            continue
+        a = (x0 + t0 * dx, y0 + t0 * dy)
+        b = (x0 + t1 * dx, y0 + t1 * dy)
+        if not current:
+            current = [a]
+        current.append(b)
+        if t1 < 1:
+            lines.append(current)
+            current = []
+    if current:
+        lines.append(current)
+    return lines
+
+
+def clip_ring(ring: list, lo: float, hi: float) -> list:
+    """
+    Clip the given polygon ring, a list of (x, y) pairs, to the square ``[lo, hi] x [lo, hi]`` via the Sutherland--Hodgman algorithm and return the resulting ring, which is not closed.
+    """
+    points = ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring
+    for axis, bound, keep_less in (
+        (0, lo, False),
+        (0, hi, True),
+        (1, lo, False),
+        (1, hi, True),
+    ):
+        if not points:
+            break
+
+        def inside(p):
+            return p[axis] <= bound if keep_less else p[axis] >= bound
+
+        def intersect(p, q):
+            t = (bound - p[axis]) / (q[axis] - p[axis])
+            r = [p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1])]
+            r[axis] = bound
+            return tuple(r)
+
+        result = []
+        prev = points[-1]
+        for p in points:
+            if inside(p):
+                if not inside(prev):
+                    result.append(intersect(prev, p))
+                result.append(p)
+            elif inside(prev):
+                result.append(intersect(prev, p))
+            prev = p
+        points = result
+    return points
+
+
+def simplify(points: list, tolerance: float) -> list:
+    """
+    Simplify the given list of (x, y) pairs via the Douglas--Peucker algorithm with the given tolerance, keeping the first and last points.
+    """
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    sq_tol = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        (ax, ay), (bx, by) = points[first], points[last]
+        dx, dy = bx - ax, by - ay
+        sq_len = dx * dx + dy * dy
+        max_sq_dist = -1
+        index = first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if sq_len == 0:
+                sq_dist = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / sq_len))
+                sq_dist = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if sq_dist > max_sq_dist:
+                max_sq_dist = sq_dist
+                index = i
+        if max_sq_dist > sq_tol:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _round(points: list) -> list[tuple[int, int]]:
+    """
+    Round the given points to integer tile coordinates and drop consecutive duplicates.
+    """
+    result = []
+    for x, y in points:
+        p = (round(x), round(y))
+        if not result or p != result[-1]:
+            result.append(p)
+    return result
+
+
+def _ring_area(ring: list) -> float:
+    """
+    Return twice the signed area of the given unclosed ring via the surveyor's formula.
+    """
+    return sum(
+        x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1])
+    )
+
+
+# -------------------
+# Protobuf encoding
+# -------------------
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed_field(field: int, values: list[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        payload = _key(7, 0) + _varint(int(value))
+    elif isinstance(value, int) and -(2**63) <= value < 2**63:
+        payload = _key(6, 0) + _varint(_zigzag(value))
+    elif isinstance(value, float):
+        payload = _key(3, 1) + struct.pack("<d", value)
+    else:
+        if not isinstance(value, str):
+            value = json.dumps(value)
+        payload = _bytes_field(1, value.encode("utf-8"))
+    return payload
+
+
+def _encode_geometry(geomtype: int, parts: list) -> list[int]:
+    """
+    Encode the given tile-coordinate parts of the given type as vector tile geometry commands.
+    """
+    commands = []
+    cx, cy = 0, 0
+
+    def line_to(points):
+        nonlocal cx, cy
+        commands.append((len(points) << 3) | 2)
+        for x, y in points:
+            commands.extend((_zigzag(x - cx), _zigzag(y - cy)))
+            cx, cy = x, y
+
+    def move_to(points):
+        nonlocal cx, cy
+        commands.append((len(points) << 3) | 1)
+        for x, y in points:
+            commands.extend((_zigzag(x - cx), _zigzag(y - cy)))
+            cx, cy = x, y
+
+    if geomtype == POINT:
+        move_to(parts)
+    elif geomtype == LINESTRING:
+        for line in parts:
+            move_to(line[:1])
+            line_to(line[1:])
+    else:
+        for polygon in parts:
+            for ring in polygon:
+                move_to(ring[:1])
+                line_to(ring[1:])
+                commands.append((1 << 3) | 7)
+    return commands
+
+
+def _clip_parts(geomtype: int, parts: list, lo: float, hi: float, tolerance: float):
+    """
+    Clip, simplify, and round the given tile-coordinate parts and return the parts that survive.
+    """
+    result = []
+    if geomtype == POINT:
+        for x, y in parts:
+            if lo <= x <= hi and lo <= y <= hi:
+                result.append((round(x), round(y)))
+    elif geomtype == LINESTRING:
+        for line in parts:
+            for piece in clip_line(line, lo, hi):
+                piece = _round(simplify(piece, tolerance))
+                if len(piece) >= 2:
+                    result.append(piece)
+    else:
+        for polygon in parts:
+            rings = []
+            for i, ring in enumerate(polygon):
+                ring = clip_ring(ring, lo, hi)
+                if ring:
+                    ring = _round(simplify(ring + ring[:1], tolerance))[:-1]
+                area = _ring_area(ring) if len(ring) >= 3 else 0
+                if area == 0:
+                    if i == 0:
+                        # No exterior ring, so no polygon
+                        break
+                    continue
+                # Exterior rings must have positive area and holes negative area
+                if (i == 0) != (area > 0):
+                    ring.reverse()
+                rings.append(ring)
+            if rings:
+                result.append(rings)
+    return result
+
+
+def encode_tile(
+    layers: list[tuple[str, list]],
+    z: int,
+    x: int,
+    y: int,
+    *,
+    extent: int = 4096,
+    buffer: int = 64,
+    tolerance: float = 1,
+) -> bytes:
+    """
+    Encode as a vector tile the tile (``z``, ``x``, ``y``) of the given layers, each a pair (layer name, list of pairs (Feature properties, geometry projected by :func:`project_geometry`)).
+    Clip geometries to the tile plus a buffer of ``buffer`` tile units and simplify them with the given tolerance in tile units.
+    Layers with no surviving features are omitted, so the result is empty if the tile is.
+    """
+    n = 2**z
+    lo, hi = -buffer, extent + buffer
+    tile = b""
+    for name, features in layers:
+        keys = {}
+        values = {}
+        encoded_features = []
+        for props, projected in features:
+            for geomtype, parts in projected:
+                if geomtype == POINT:
+                    parts = [
+                        ((px * n - x) * extent, (py * n - y) * extent)
+                        for px, py in parts
+                    ]
+                elif geomtype == LINESTRING:
+                    parts = [
+                        [
+                            ((px * n - x) * extent, (py * n - y) * extent)
+                            for px, py in line
+                        ]
+                        for line in parts
+                    ]
+                else:
+                    parts = [
+                        [
+                            [
+                                ((px * n - x) * extent, (py * n - y) * extent)
+                                for px, py in ring
+                            ]
+                            for ring in polygon
+                        ]
+                        for polygon in parts
+                    ]
+                parts = _clip_parts(geomtype, parts, lo, hi, tolerance)
+                if not parts:
+                    continue
+                tags = []
+                for k, v in props.items():
+                    if v is None:
+                        continue
+                    tags.append(keys.setdefault(k, len(keys)))
+                    encoded_value = _encode_value(v)
+                    tags.append(values.setdefault(encoded_value, len(values)))
+                feature = _packed_field(2, tags)
+                feature += _key(3, 0) + _varint(geomtype)
+                feature += _packed_field(4, _encode_geometry(geomtype, parts))
+                encoded_features.append(_bytes_field(2, feature))
+        if not encoded_features:
+            continue
+        layer = _key(15, 0) + _varint(2)
+        layer += _bytes_field(1, name.encode("utf-8"))
+        layer += b"".join(encoded_features)
+        layer += b"".join(_bytes_field(3, k.encode("utf-8")) for k in keys)
+        layer += b"".join(_bytes_field(4, v) for v in values)
+        layer += _key(5, 0) + _varint(extent)
+        tile += _bytes_field(3, layer)
+    return tile
+
+
+def _prepare_layers(layers: list[dict]) -> list[tuple[str, list]]:
+    """
+    Project the Features of the given FeatureCollections and flatten their properties for encoding.
+    """
+    prepared = []
+    for i, layer in enumerate(layers):
+        features = []
+        for f in layer["features"]:
+            props = dict(f.get("properties") or {})
+            if "id" in f:
+                props.setdefault("id", f["id"])
+            features.append((props, project_geometry(f["geometry"])))
+        prepared.append((layer.get("name") or f"layer{i}", features))
+    return prepared
+
+
+def _init_worker(layers: list, options: dict) -> None:
+    global _LAYERS, _OPTIONS
+    _LAYERS = layers
+    _OPTIONS = options
+
+
+def _build_tile(job: tuple) -> tuple[int, int, int, bytes]:
+    z, x, y, members = job
+    layers = [
+        (name, [features[j] for j in members[i]])
+        for i, (name, features) in enumerate(_LAYERS)
+        if members.get(i)
+    ]
+    options = dict(_OPTIONS)
+    compress = options.pop("compress")
+    data = encode_tile(layers, z, x, y, **options)
+    if data and compress:
+        data = gzip.compress(data)
+    return z, x, y, data
+
+
+def _build_tile_chunk(jobs: list[tuple]) -> list[tuple[int, int, int, bytes]]:
+    return [_build_tile(job) for job in jobs]
+
+
+def _part_bboxes(projected: list[tuple[int, list]]) -> list[list[float]]:
+    """
+    Return the bounding boxes of the parts of the given projected geometry, that is, of its points, lines, and polygon exterior rings.
+    """
+    bboxes = []
+    for geomtype, parts in projected:
+        for part in parts:
+            if geomtype == POINT:
+                points = [part]
+            elif geomtype == LINESTRING:
+                points = part
+            else:
+                points = part[0] if part else []
+            b = list(m.EMPTY_BBOX)
+            for p in points:
+                m.update_bbox(b, p)
+            if b[0] <= b[2]:
+                bboxes.append(b)
+    return bboxes
+
+
+def _tile_jobs(
+    layers: list, min_zoom: int, max_zoom: int, extent: int, buffer: int
+) -> Iterator[tuple]:
+    """
+    Yield tuples (z, x, y, {layer index -> feature indices}) for every tile that the bounding box of some part of a projected feature touches,
+    such as one Polygon of a MultiPolygon split at the antimeridian, by zoom level and, within a zoom level, in quadtree order.
+
+    Find the tiles of each zoom level by descending the tile pyramid depth first, passing the features of each tile on to those of its four children that they touch,
+    so that only the features of one tile per zoom level are held at a time, rather than every tile of a zoom level.
+    """
+    margin = buffer / extent
+    features = []
+    for i, (name, layer_features) in enumerate(layers):
+        for j, (props, projected) in enumerate(layer_features):
+            bboxes = _part_bboxes(projected)
+            if bboxes:
+                features.append((i, j, bboxes))
+
+    def touching(members, z, x, y):
+        n = 2**z
+        return [
+            f
+            for f in members
+            if any(
+                b[0] * n - margin < x + 1
+                and b[2] * n + margin >= x
+                and b[1] * n - margin < y + 1
+                and b[3] * n + margin >= y
+                for b in f[2]
+            )
+        ]
+
+    def descend(members, z, x, y, zoom):
+        if z == zoom:
+            tile_members = {}
+            for i, j, bboxes in members:
+                tile_members.setdefault(i, []).append(j)
+            yield z, x, y, tile_members
+            return
+        for dy in range(2):
+            for dx in range(2):
+                child = touching(members, z + 1, 2 * x + dx, 2 * y + dy)
+                if child:
+                    yield from descend(child, z + 1, 2 * x + dx, 2 * y + dy, zoom)
+
+    root = touching(features, 0, 0, 0)
+    for zoom in range(min_zoom, max_zoom + 1):
+        if root:
+            yield from descend(root, 0, 0, 0, zoom)
+
+
+def build_tiles(
+    layers: list[dict],
+    min_zoom: int = 0,
+    max_zoom: int = 14,
+    *,
+    extent: int = 4096,
+    buffer: int = 64,
+    tolerance: float = 1,
+    workers: Optional[int] = None,
+    compress: bool = False,
+) -> Iterator[tuple[int, int, int, bytes]]:
+    """
+    Cut the given (decoded) GeoJSON FeatureCollections into vector tiles for the zoom levels ``min_zoom`` through ``max_zoom``, one tile layer per FeatureCollection named after the FeatureCollection's ``'name'`` attribute.
+    Non-scalar Feature properties are encoded as JSON strings and a Feature's ``'id'``, which KML makes a string, is encoded as an ``'id'`` property.
+
+    Encode tiles in parallel across ``workers`` processes, which defaults to the number of CPUs;
+    use ``workers=1`` to encode in the current process.
+    If ``compress``, then gzip each tile, as is customary in MBTiles files.
+
+    Yield tuples (z, x, y, tile bytes) for the nonempty tiles in XYZ scheme.
+    See :func:`encode_tile` for the meanings of the other arguments.
+    """
+    prepared = _prepare_layers(layers)
+    options = {
+        "extent": extent,
+        "buffer": buffer,
+        "tolerance": tolerance,
+        "compress": compress,
+    }
+    jobs = _tile_jobs(prepared, min_zoom, max_zoom, extent, buffer)
+
+    if workers == 1:
+        _init_worker(prepared, options)
+        results = map(_build_tile, jobs)
+        for z, x, y, data in results:
+            if data:
+                yield z, x, y, data
+        return
+
+    # Submit chunks of jobs as results are consumed, so that jobs stay lazy
+    num_workers = workers or os.cpu_count() or 1
+    with cf.ProcessPoolExecutor(
+        max_workers=num_workers, initializer=_init_worker, initargs=(prepared, options)
+    ) as executor:
+        pending = collections.deque()
+        while True:
+            chunk = list(itertools.islice(jobs, TILE_CHUNK_SIZE))
+            if chunk:
+                pending.append(executor.submit(_build_tile_chunk, chunk))
+            if not pending:
+                break
+            if chunk and len(pending) <= 2 * num_workers:
+                continue
+            for z, x, y, data in pending.popleft().result():
+                if data:
+                    yield z, x, y, data
+
+
+def write_mbtiles(
+    tiles: Iterable[tuple[int, int, int, bytes]],
+    path: str | pl.Path,
+    metadata: dict,
+    *,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Write the given tiles, as produced by :func:`build_tiles` with ``compress=True``, to an MBTiles file at the given path, overwriting any existing file.
+    Insert the tiles in transactions of ``batch_size`` tiles each and store the given metadata dictionary in the ``metadata`` table.
+    Return the number of tiles written.
+    """
+    path = pl.Path(path)
+    if path.exists():
+        path.unlink()
+    count = 0
+    con = sqlite3.connect(str(path))
+    try:
+        con.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (
+                zoom_level INTEGER,
+                tile_column INTEGER,
+                tile_row INTEGER,
+                tile_data BLOB
+            );
+            """)
+        with con:
+            con.executemany(
+                "INSERT INTO metadata VALUES (?, ?)",
+                [
+                    (k, v if isinstance(v, str) else json.dumps(v))
+                    for k, v in metadata.items()
+                ],
+            )
+        batch = []
+        for z, x, y, data in tiles:
+            # MBTiles uses the TMS scheme, whose rows count from the bottom
+            batch.append((z, x, 2**z - 1 - y, data))
+            if len(batch) >= batch_size:
+                with con:
+                    con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            with con:
+                con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", batch)
+            count += len(batch)
+        con.execute(
+            "CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)"
+        )
+        con.commit()
+    finally:
+        con.close()
+    return count
+
+
+def write_tile_directory(
+    tiles: Iterable[tuple[int, int, int, bytes]], directory: str | pl.Path
+) -> int:
+    """
+    Write the given tiles, as produced by :func:`build_tiles`, to files ``z/x/y.pbf`` in the given directory, each one atomically.
+    Return the number of tiles written.
+    """
+    directory = pl.Path(directory)
+    count = 0
+    for z, x, y, data in tiles:
+        path = directory / str(z) / str(x) / f"{y}.pbf"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with m.atomic_open(path, "wb") as tgt:
+            tgt.write(data)
+        count += 1
+    return count
+
+
+def build_metadata(layers: list[dict], name: str, min_zoom: int, max_zoom: int) -> dict:
+    """
+    Return an MBTiles metadata dictionary for vector tiles cut from the given (decoded) GeoJSON FeatureCollections.
+    """
+    bbox = m.merge_bboxes(
+        f.get("bbox") or m.get_bbox(f["geometry"])
+        for layer in layers
+        for f in layer["features"]
+    ) or [-180, -MAX_LAT, 180, MAX_LAT]
+    if bbox[0] > bbox[2]:
+        # MBTiles bounds don't cross the antimeridian
+        bbox = [-180, bbox[1], 180, bbox[3]]
+    vector_layers = []
+    for i, layer in enumerate(layers):
+        fields = {}
+        for f in layer["features"]:
+            for k, v in (f.get("properties") or {}).items():
+                fields[k] = "Number" if isinstance(v, (int, float)) else "String"
+        vector_layers.append(
+            {
+                "id": layer.get("name") or f"layer{i}",
+                "fields": fields,
+                "minzoom": min_zoom,
+                "maxzoom": max_zoom,
+            }
+        )
+    return {
+        "name": name,
+        "format": "pbf",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "bounds": ",".join(str(b) for b in bbox),
+        "center": f"{(bbox[0] + bbox[2]) / 2},{(bbox[1] + bbox[3]) / 2},{min_zoom}",
+        "json": json.dumps({"vector_layers": vector_layers}),
+    }
@@ -0,0 +1,289 @@
+"""
+Functions to convert GeoJSON FeatureCollections to TopoJSON Topologies, storing the
+boundaries shared by adjacent Polygons and LineStrings only once.
+"""
+
+from __future__ import annotations
+from typing import Optional
+
+
+def quantize(
+    collection: dict, quantization: int
+) -> tuple[dict, tuple[float, float, float, float]]:
+    """
+    Return the TopoJSON transform that maps the bounding box of the coordinates of the given FeatureCollection onto a grid of ``quantization`` by ``quantization`` integer positions,
+    along with that bounding box.
+    """
+    xs, ys = [], []
+
+    def visit(geometry):
+        if geometry is None:
+            return
+        t = geometry["type"]
+        if t == "GeometryCollection":
+            for g in geometry["geometries"]:
+                visit(g)
+            return
+        coords = geometry["coordinates"]
+        depth = {
+            "Point": 0,
+            "MultiPoint": 1,
+            "LineString": 1,
+            "MultiLineString": 2,
+            "Polygon": 2,
+            "MultiPolygon": 3,
+        }[t]
+        if depth == 0:
+            coords = [coords]
+        for _ in range(depth - 1):
+            coords = [p for part in coords for p in part]
+        for p in coords:
+            xs.append(p[0])
+            ys.append(p[1])
+
+    for f in collection["features"]:
+        visit(f["geometry"])
+    if not xs:
+        return {"scale": [1, 1], "translate": [0, 0]}, (0, 0, 0, 0)
+
+    x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+    kx = (x1 - x0) / (quantization - 1) or 1
+    ky = (y1 - y0) / (quantization - 1) or 1
+    return {"scale": [kx, ky], "translate": [x0, y0]}, (x0, y0, x1, y1)
+
+
+def find_junctions(lines: list[list[tuple]], rings: list[list[tuple]]) -> set[tuple]:
+    """
+    Given lists of lines and closed rings of hashable points, return the set of junctions,
+    that is, the points where lines or rings meet or part ways.
+    Line endpoints are junctions, and so is every point whose pair of neighbors differs, ignoring direction, from the pair of neighbors where it was first seen.
+    """
+    junctions = set()
+    neighbors = {}
+
+    def visit(point, prev, next_):
+        pair = neighbors.get(point)
+        if pair is None:
+            neighbors[point] = (prev, next_)
+        elif pair != (prev, next_) and pair != (next_, prev):
+            junctions.add(point)
+
+    for line in lines:
+        if not line:
+            continue
+        junctions.add(line[0])
+        junctions.add(line[-1])
+        for i in range(1, len(line) - 1):
+            visit(line[i], line[i - 1], line[i + 1])
+    for ring in rings:
+        n = len(ring) - 1  # Last point repeats the first
+        for i in range(n):
+            visit(ring[i], ring[(i - 1) % n], ring[(i + 1) % n])
+    return junctions
+
+
+def cut(line: list[tuple], junctions: set[tuple]) -> list[list[tuple]]:
+    """
+    Cut the given line at the given junctions into arcs that share their endpoints.
+    """
+    if not line:
+        return []
+    arcs = []
+    start = 0
+    for i in range(1, len(line) - 1):
+        if line[i] in junctions:
+            arcs.append(line[start : i + 1])
+            start = i
+    arcs.append(line[start:])
+    return arcs
+
+
+def rotate_ring(ring: list[tuple], junctions: set[tuple]) -> list[tuple]:
+    """
+    Rotate the given closed ring to start at its first junction or, if it has none,
+    at its smallest point, so that identical rings traced from different starting points,
+    in either direction, become identical or reverses of each other.
+    """
+    if not ring:
+        return ring
+    points = ring[:-1]
+    starts = [i for i, p in enumerate(points) if p in junctions]
+    i = starts[0] if starts else points.index(min(points))
+    points = points[i:] + points[:i]
+    return points + points[:1]
+
+
+def build_topology(collection: dict, *, quantization: Optional[int] = 10**5) -> dict:
+    """
+    Convert the given GeoJSON FeatureCollection to a TopoJSON Topology dictionary with one GeometryCollection object named after the FeatureCollection,
+    or 'main' if it has no name.
+
+    If ``quantization`` is given, then snap coordinates to a grid of ``quantization`` by ``quantization`` positions across the bounding box of the FeatureCollection,
+    drop repeated points, and delta-encode the arcs.
+    Otherwise keep the coordinates as they are.
+    Raise a ``ValueError`` if ``quantization`` is less than 2.
+
+    Detect shared arcs by hashing (quantized) coordinate pairs:
+    cut LineStrings and Polygon rings at the junctions found by :func:`find_junctions`,
+    and store each arc once, referring to it by its index, or by its ones' complement when traversed backwards.
+    Drop altitudes.
+    """
+    if quantization is not None and quantization < 2:
+        raise ValueError("quantization must be at least 2")
+    if quantization is not None:
+        transform, (x0, y0, _, _) = quantize(collection, quantization)
+        kx, ky = transform["scale"]
+
+        def key(p):
+            return (round((p[0] - x0) / kx), round((p[1] - y0) / ky))
+
+    else:
+        transform = None
+
+        def key(p):
+            return (p[0], p[1])
+
+    def line_points(coords, min_points):
+        points = []
+        for p in coords:
+            q = key(p)
+            if not points or q != points[-1]:
+                points.append(q)
+        while points and len(points) < min_points:
+            points.append(points[-1])
+        return points
+
+    # Collect lines and rings as point lists, replacing their coordinates
+    # with placeholders to fill with arc indices
+    lines, rings = [], []
+
+    def collect(geometry):
+        if geometry is None:
+            return None
+        t = geometry["type"]
+        if t == "GeometryCollection":
+            return {
+                "type": t,
+                "geometries": [collect(g) for g in geometry["geometries"]],
+            }
+        coords = geometry["coordinates"]
+        if t == "Point":
+            return {"type": t, "coordinates": list(key(coords))}
+        if t == "MultiPoint":
+            return {"type": t, "coordinates": [list(key(p)) for p in coords]}
+        if t == "LineString":
+            lines.append(line_points(coords, 2))
+            return {"type": t, "arcs": ("line", len(lines) - 1)}
+        if t == "MultiLineString":
+            parts = []
+            for c in coords:
+                lines.append(line_points(c, 2))
+                parts.append(("line", len(lines) - 1))
+            return {"type": t, "arcs": parts}
+        if t == "Polygon":
+            parts = []
+            for c in coords:
+                rings.append(line_points(c, 4))
+                parts.append(("ring", len(rings) - 1))
+            return {"type": t, "arcs": parts}
+        if t == "MultiPolygon":
+            polygons = []
+            for polygon in coords:
+                parts = []
+                for c in polygon:
+                    rings.append(line_points(c, 4))
+                    parts.append(("ring", len(rings) - 1))
+                polygons.append(parts)
+            return {"type": t, "arcs": polygons}
+        raise ValueError(f"unknown geometry type {t}")
+
+    geometries = []
+    for feature in collection["features"]:
+        geometry = collect(feature["geometry"]) or {"type": None}
+        if "id" in feature:
+            geometry["id"] = feature["id"]
+        if feature.get("properties"):
+            geometry["properties"] = feature["properties"]
+        geometries.append(geometry)
+
+    # Cut lines and rings into arcs, storing each arc once
+    junctions = find_junctions(lines, rings)
+    arcs = []
+    arc_index = {}
+
+    def add_arc(arc):
+        arc = tuple(arc)
+        i = arc_index.get(arc)
+        if i is not None:
+            return i
+        i = arc_index.get(arc[::-1])
+        if i is not None:
+            return ~i
+        arc_index[arc] = len(arcs)
+        arcs.append(arc)
+        return len(arcs) - 1
+
+    line_arcs = [[add_arc(a) for a in cut(line, junctions)] for line in lines]
+    ring_arcs = [
+        [add_arc(a) for a in cut(rotate_ring(ring, junctions), junctions)]
+        for ring in rings
+    ]
+
+    def fill(geometry):
+        if geometry.get("type") == "GeometryCollection":
+            for g in geometry["geometries"]:
+                fill(g)
+        elif "arcs" in geometry:
+            geometry["arcs"] = resolve(geometry["arcs"])
+
+    def resolve(ref):
+        if isinstance(ref, tuple):
+            kind, i = ref
+            return line_arcs[i] if kind == "line" else ring_arcs[i]
+        return [resolve(r) for r in ref]
+
+    for geometry in geometries:
+        fill(geometry)
+
+    # Encode arcs
+    if transform is not None:
+        encoded = []
+        for arc in arcs:
+            x, y = arc[0]
+            points = [[x, y]]
+            for p in arc[1:]:
+                points.append([p[0] - x, p[1] - y])
+                x, y = p
+            encoded.append(points)
+    else:
+        encoded = [[list(p) for p in arc] for arc in arcs]
+
+    name = collection.get("name") or "main"
+    topology = {"type": "Topology"}
+    if transform is not None:
+        topology["transform"] = transform
+    topology["objects"] = {
+        name: {"type": "GeometryCollection", "geometries": geometries}
+    }
+    topology["arcs"] = encoded
+    return topology
+
+
+def decode_arc(topology: dict, i: int) -> list[list[float]]:
+    """
+    Return the coordinates of the arc of the given index in the given Topology,
+    undoing delta encoding and quantization, and reversing the arc if the index is negative.
+    """
+    arc = topology["arcs"][~i if i < 0 else i]
+    transform = topology.get("transform")
+    if transform is not None:
+        (kx, ky), (x0, y0) = transform["scale"], transform["translate"]
+        x = y = 0
+        points = []
+        for dx, dy in arc:
+            x += dx
+            y += dy
+            points.append([x * kx + x0, y * ky + y0])
+    else:
+        points = [list(p) for p in arc]
+    return points[::-1] if i < 0 else points
@@ -1,4 +1,5 @@
 import shutil
+import sqlite3
 
 from click.testing import CliRunner
 
@@ -38,3 +39,466 @@ def test_k2g():
     assert result.exit_code == 0
 
     rm_paths(out_dir)
+
+
+def test_k2g_mbtiles():
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    out_dir = DATA_DIR / "tmp"
+    rm_paths(out_dir)
+
+    result = runner.invoke(
+        k2g,
+        [
+            str(kml_path),
+            str(out_dir),
+            "--separate-folders",
+            "--output-format=mbtiles",
+            "--max-zoom=3",
+            "--workers=1",
+        ],
+    )
+    assert result.exit_code == 0
+    assert [p.name for p in out_dir.iterdir()] == ["main.mbtiles"]
+
+    rm_paths(out_dir)
+
+
+def test_k2g_sharded():
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    out_dir = DATA_DIR / "tmp"
+    rm_paths(out_dir)
+
+    result = runner.invoke(
+        k2g,
+        [
+            str(kml_path),
+            str(out_dir),
+            "--separate-folders",
+            "--max-features=2",
+            "--partition-grid=90",
+            "--writers=2",
+        ],
+    )
+    assert result.exit_code == 0
+    with (out_dir / "manifest.json").open() as src:
+        shards = json.load(src)["shards"]
+
+    # Shards should recombine into the layers
+    for name in ["Bingo", "Bingo1"]:
+        with (kml_path.parent / f"{name}.geojson").open() as src:
+            layer = json.load(src)
+        features = []
+        for shard in shards:
+            if shard["layer"] == layer["name"]:
+                with (out_dir / shard["path"]).open() as src:
+                    collection = json.load(src)
+                assert shard["feature_count"] == len(collection["features"]) <= 2
+                features.extend(collection["features"])
+        key = lambda f: json.dumps(f, sort_keys=True)
+        assert sorted(features, key=key) == sorted(layer["features"], key=key)
+
+    rm_paths(out_dir)
+
+
+def test_watch(tmp_path):
+    in_dir = tmp_path / "in"
+    out_dir = tmp_path / "out"
+    in_dir.mkdir()
+    shutil.copy(DATA_DIR / "two_layers" / "two_layers.kml", in_dir)
+    (in_dir / "notes.txt").write_text("bingo")
+
+    # Files with the same stem get their own output directories
+    with zipfile.ZipFile(in_dir / "two_layers.KMZ", "w") as kmz:
+        kmz.write(DATA_DIR / "two_layers" / "two_layers.kml", "doc.kml")
+    watch(in_dir, out_dir, debounce=0, max_polls=1, workers=1, separate_folders=True)
+    assert sorted(p.name for p in out_dir.iterdir()) == [
+        "two_layers_kml",
+        "two_layers_kmz",
+    ]
+    for name in ["two_layers_kml", "two_layers_kmz"]:
+        assert sorted(p.name for p in (out_dir / name).iterdir()) == [
+            "Bingo.geojson",
+            "Bingo1.geojson",
+        ]
+
+    # Files must be stable for the debounce period before conversion
+    shutil.rmtree(out_dir)
+    watch(in_dir, out_dir, debounce=60, poll_interval=0.01, max_polls=2, workers=1)
+    assert not out_dir.exists()
+
+
+def test_watch_retries_failures(tmp_path, capsys):
+    in_dir = tmp_path / "in"
+    out_dir = tmp_path / "out"
+    in_dir.mkdir()
+    out_dir.mkdir()
+    shutil.copy(DATA_DIR / "two_layers" / "two_layers.kml", in_dir)
+    # A file in the way of the output directory makes every conversion fail
+    (out_dir / "two_layers_kml").write_text("blocker")
+
+    watch(in_dir, out_dir, debounce=0, poll_interval=0.1, max_polls=20, workers=1)
+    err = capsys.readouterr().err
+    assert "(attempt 1)" in err
+    assert "(attempt 2)" in err
+
+
+def test_k2g_topojson():
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    out_dir = DATA_DIR / "tmp"
+    rm_paths(out_dir)
+
+    result = runner.invoke(
+        k2g, [str(kml_path), str(out_dir), "-f", "--output-format=topojson"]
+    )
+    assert result.exit_code == 0
+    paths = sorted(out_dir.iterdir())
+    assert [p.suffix for p in paths] == [".topojson"] * 2
+    for path in paths:
+        assert json.loads(path.read_text())["type"] == "Topology"
+
+    result = runner.invoke(
+        k2g, [str(kml_path), str(out_dir), "-of", "topojson", "--max-features=1"]
+    )
+    assert result.exit_code == 2
+
+    rm_paths(out_dir)
+
+
+def test_k2g_gpkg():
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    out_dir = DATA_DIR / "tmp"
+    rm_paths(out_dir)
+
+    result = runner.invoke(
+        k2g, [str(kml_path), str(out_dir), "-f", "--output-format=gpkg"]
+    )
+    assert result.exit_code == 0
+    assert [p.name for p in out_dir.iterdir()] == ["main.gpkg"]
+
+    rm_paths(out_dir)
+
+
+def test_k2g_time():
+    kml_path = DATA_DIR / "multitrack.kml"
+    out_dir = DATA_DIR / "tmp"
+    rm_paths(out_dir)
+
+    result = runner.invoke(
+        k2g, [str(kml_path), str(out_dir), "--time-range", "2013-08-08T16:00Z", ""]
+    )
+    assert result.exit_code == 0
+    with (out_dir / "main.geojson").open() as src:
+        assert len(json.load(src)["features"]) == 1
+
+    result = runner.invoke(k2g, [str(kml_path), str(out_dir), "-pt", "day"])
+    assert result.exit_code == 0
+    with (out_dir / "manifest.json").open() as src:
+        manifest = json.load(src)
+    assert [s["partition"] for s in manifest["shards"]] == ["2013-08-08"]
+
+    result = runner.invoke(k2g, [str(kml_path), str(out_dir), "-tr", "soon", ""])
+    assert result.exit_code == 2
+
+    rm_paths(out_dir)
+
+
+def test_k2g_stream(tmp_path, monkeypatch):
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    for extra in [[], ["--bbox"], ["-tr", "", "2000"]]:
+        runner.invoke(k2g, [str(kml_path), str(tmp_path / "dom"), *extra])
+        result = runner.invoke(
+            k2g, [str(kml_path), str(tmp_path / "stream"), "--stream", *extra]
+        )
+        assert result.exit_code == 0
+        assert (tmp_path / "stream" / "main.geojson").read_bytes() == (
+            tmp_path / "dom" / "main.geojson"
+        ).read_bytes()
+
+    # Crash after a few Features, then resume from the last checkpoint
+    expected = (tmp_path / "stream" / "main.geojson").read_bytes()
+    out_dir = tmp_path / "resumed"
+    build_feature = m.build_feature
+    calls = []
+
+    def crashing_build_feature(*args, **kwargs):
+        calls.append(1)
+        if len(calls) > 5:
+            raise MemoryError
+        return build_feature(*args, **kwargs)
+
+    monkeypatch.setattr(m, "build_feature", crashing_build_feature)
+    args = [str(kml_path), str(out_dir), "--stream", "-tr", "", "2000", "-ce", "2"]
+    result = runner.invoke(k2g, args)
+    assert isinstance(result.exception, MemoryError)
+    assert (out_dir / ".main.geojson.checkpoint").exists()
+    assert not (out_dir / "main.geojson").exists()
+
+    checkpoint = (out_dir / ".main.geojson.checkpoint").read_bytes()
+
+    # Crash while committing the output
+    monkeypatch.setattr(m, "build_feature", build_feature)
+    replace = os.replace
+
+    def crashing_replace(src, dst):
+        if pl.Path(dst) == out_dir / "main.geojson":
+            raise MemoryError
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", crashing_replace)
+    result = runner.invoke(k2g, args + ["--resume"])
+    assert isinstance(result.exception, MemoryError)
+    assert not (out_dir / ".main.geojson.checkpoint").exists()
+    monkeypatch.setattr(os, "replace", replace)
+
+    result = runner.invoke(k2g, args + ["--resume"])
+    assert result.exit_code == 0
+    assert (out_dir / "main.geojson").read_bytes() == expected
+    assert not (out_dir / ".main.geojson.checkpoint").exists()
+
+    # A stale checkpoint next to a committed output is ignored
+    (out_dir / ".main.geojson.checkpoint").write_bytes(checkpoint)
+    result = runner.invoke(k2g, args + ["--resume"])
+    assert result.exit_code == 0
+    assert (out_dir / "main.geojson").read_bytes() == expected
+    assert not (out_dir / ".main.geojson.checkpoint").exists()
+
+    result = runner.invoke(k2g, [str(kml_path), str(out_dir), "--stream", "-f"])
+    assert result.exit_code == 2
+    rejected = [
+        ["-p", "lxml"],
+        ["-r"],
+        ["--huge-tree"],
+        ["-is"],
+        ["--share-properties"],
+    ]
+    for extra in rejected:
+        result = runner.invoke(k2g, [str(kml_path), str(out_dir), "--stream", *extra])
+        assert result.exit_code == 2
+
+
+def test_k2g_stream_comments(tmp_path):
+    # Placemarks inside comments and CDATA sections aren't Features
+    kml_path = tmp_path / "comments.kml"
+    kml_path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+        "<!-- <Placemark><name>old</name>"
+        "<Point><coordinates>9,9</coordinates></Point></Placemark> -->"
+        "<Folder><!-- <name>old</name> --><name>f</name>"
+        "<Placemark><name>a</name><description><![CDATA[<Placemark><name>b</name>"
+        "</Placemark>]]></description><Point><coordinates>1,2</coordinates></Point>"
+        "</Placemark></Folder></Document></kml>"
+    )
+    runner.invoke(k2g, [str(kml_path), str(tmp_path / "dom")])
+    result = runner.invoke(k2g, [str(kml_path), str(tmp_path / "stream"), "--stream"])
+    assert result.exit_code == 0
+    assert (tmp_path / "stream" / "main.geojson").read_bytes() == (
+        tmp_path / "dom" / "main.geojson"
+    ).read_bytes()
+    with (tmp_path / "stream" / "main.geojson").open() as src:
+        features = json.load(src)["features"]
+    assert [f["properties"]["name"] for f in features] == ["a"]
+
+
+def test_k2g_stream_namespaces(tmp_path):
+    # Prefixes declared below the root element
+    kml_path = tmp_path / "ns.kml"
+    kml_path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">'
+        '<Document xmlns:atom="http://www.w3.org/2005/Atom"><name>doc</name>'
+        '<Folder xmlns:ext="urn:example"><name>f</name>'
+        "<Placemark><name>a</name><atom:author><atom:name>me</atom:name></atom:author>"
+        "<ext:note>x</ext:note><Point><coordinates>1,2</coordinates></Point></Placemark>"
+        "</Folder></Document></kml>"
+    )
+    runner.invoke(k2g, [str(kml_path), str(tmp_path / "dom")])
+    result = runner.invoke(k2g, [str(kml_path), str(tmp_path / "stream"), "--stream"])
+    assert result.exit_code == 0
+    assert (tmp_path / "stream" / "main.geojson").read_bytes() == (
+        tmp_path / "dom" / "main.geojson"
+    ).read_bytes()
+
+
+def test_k2g_hilbert_sort(tmp_path):
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    result = runner.invoke(k2g, [str(kml_path), str(tmp_path / "dom"), "-hs"])
+    assert result.exit_code == 0
+    with (tmp_path / "dom" / "main.geojson").open() as src:
+        features = json.load(src)["features"]
+    keys = [m.get_hilbert_key(f) for f in features]
+    assert keys == sorted(keys)
+
+    # Streaming with spilled runs gives the same file
+    result = runner.invoke(
+        k2g,
+        [
+            str(kml_path),
+            str(tmp_path / "stream"),
+            "-hs",
+            "--stream",
+            "--sort-memory",
+            "100",
+        ],
+    )
+    assert result.exit_code == 0
+    assert (tmp_path / "stream" / "main.geojson").read_bytes() == (
+        tmp_path / "dom" / "main.geojson"
+    ).read_bytes()
+    assert [p.name for p in (tmp_path / "stream").iterdir()] == ["main.geojson"]
+
+    # The memory limit only applies to streaming
+    for extra in [["-hs"], ["--stream"], []]:
+        result = runner.invoke(
+            k2g, [str(kml_path), str(tmp_path / "dom"), "--sort-memory", "100", *extra]
+        )
+        assert result.exit_code == 2
+
+
+def test_k2g_compress(tmp_path):
+    import gzip
+
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    runner.invoke(k2g, [str(kml_path), str(tmp_path / "plain"), "-f"])
+    result = runner.invoke(
+        k2g, [str(kml_path), str(tmp_path / "gz"), "-f", "-z", "gzip"]
+    )
+    assert result.exit_code == 0
+    for path in (tmp_path / "plain").iterdir():
+        with gzip.open(tmp_path / "gz" / f"{path.name}.gz", "rb") as src:
+            assert src.read() == path.read_bytes()
+
+    # Streaming with checkpoints
+    runner.invoke(k2g, [str(kml_path), str(tmp_path / "plain")])
+    result = runner.invoke(
+        k2g, [str(kml_path), str(tmp_path / "gz"), "--stream", "-z", "gzip", "-ce", "2"]
+    )
+    assert result.exit_code == 0
+    with gzip.open(tmp_path / "gz" / "main.geojson.gz", "rb") as src:
+        assert src.read() == (tmp_path / "plain" / "main.geojson").read_bytes()
+
+    result = runner.invoke(
+        k2g, [str(kml_path), str(tmp_path), "-z", "gzip", "-of", "gpkg"]
+    )
+    assert result.exit_code == 2
+
+
+def test_k2g_follow_links(tmp_path):
+    root_path = tmp_path / "root.kml"
+    href = (DATA_DIR / "two_layers" / "two_layers.kml").resolve().as_uri()
+    root_path.write_text(
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><NetworkLink><name>Linked</name>'
+        f"<Link><href>{href}</href></Link></NetworkLink></kml>"
+    )
+    out_dir = tmp_path / "out"
+    args = [str(root_path), str(out_dir), "-l", "--link-cache", str(tmp_path / "cache")]
+    result = runner.invoke(k2g, args)
+    assert result.exit_code == 0
+    with (out_dir / "main.geojson").open() as src:
+        assert len(json.load(src)["features"]) == 7
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+
+    result = runner.invoke(k2g, args + ["-f"])
+    assert result.exit_code == 0
+    assert (out_dir / "Linked.geojson").exists()
+
+
+def test_k2g_memory_limit(tmp_path):
+    import gzip
+
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    runner.invoke(k2g, [str(kml_path), str(tmp_path / "plain"), "-f", "-b"])
+    for memory_limit in ["1", "1000000"]:
+        out_dir = tmp_path / memory_limit
+        result = runner.invoke(
+            k2g, [str(kml_path), str(out_dir), "-f", "-b", "-ml", memory_limit]
+        )
+        assert result.exit_code == 0
+        assert sorted(p.name for p in out_dir.iterdir()) == sorted(
+            p.name for p in (tmp_path / "plain").iterdir()
+        )
+        for path in (tmp_path / "plain").iterdir():
+            assert (out_dir / path.name).read_bytes() == path.read_bytes()
+
+    out_dir = tmp_path / "gz"
+    result = runner.invoke(
+        k2g, [str(kml_path), str(out_dir), "-f", "-b", "-ml", "1", "-z", "gzip"]
+    )
+    assert result.exit_code == 0
+    for path in (tmp_path / "plain").iterdir():
+        with gzip.open(out_dir / f"{path.name}.gz", "rb") as src:
+            assert src.read() == path.read_bytes()
+    assert not list(out_dir.glob(".*"))
+
+    result = runner.invoke(k2g, [str(kml_path), str(tmp_path), "-ml", "1"])
+    assert result.exit_code == 2
+
+
+def test_k2g_rfc7946(tmp_path):
+    kml_path = tmp_path / "band.kml"
+    kml_path.write_text(
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><Polygon>'
+        "<outerBoundaryIs><LinearRing><coordinates>"
+        "170,0 170,10 -170,10 -170,0 170,0"
+        "</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></kml>"
+    )
+    for args in [[], ["--stream"]]:
+        out_dir = tmp_path / f"out{len(args)}"
+        result = runner.invoke(k2g, [str(kml_path), str(out_dir), "--rfc7946", *args])
+        assert result.exit_code == 0
+        with (out_dir / "main.geojson").open() as src:
+            geometry = json.load(src)["features"][0]["geometry"]
+        assert geometry["type"] == "MultiPolygon"
+        assert geometry["coordinates"][0][0][:2] == [[170, 0], [180, 0]]
+
+    # Split geometries in the other output formats
+    result = runner.invoke(
+        k2g, [str(kml_path), str(tmp_path / "bbox"), "--rfc7946", "-b"]
+    )
+    with (tmp_path / "bbox" / "main.geojson").open() as src:
+        assert json.load(src)["bbox"] == [170, 0, -170, 10]
+    for output_format, filename in [
+        ("gpkg", "main.gpkg"),
+        ("topojson", "main.topojson"),
+        ("mbtiles", "main.mbtiles"),
+    ]:
+        out_dir = tmp_path / output_format
+        args = [str(kml_path), str(out_dir), "--rfc7946", "-b", "-of", output_format]
+        result = runner.invoke(k2g, args + ["--max-zoom", "4"])
+        assert result.exit_code == 0
+        assert (out_dir / filename).exists()
+
+    with sqlite3.connect(str(tmp_path / "gpkg" / "main.gpkg")) as con:
+        assert con.execute(
+            "SELECT geometry_type_name FROM gpkg_geometry_columns"
+        ).fetchone() == ("MULTIPOLYGON",)
+        assert con.execute(
+            "SELECT min_x, min_y, max_x, max_y FROM gpkg_contents"
+        ).fetchone() == (-180, 0, 180, 10)
+    with (tmp_path / "topojson" / "main.topojson").open() as src:
+        (geometry,) = json.load(src)["objects"]["main"]["geometries"]
+    assert geometry["type"] == "MultiPolygon" and len(geometry["arcs"]) == 2
+    with sqlite3.connect(str(tmp_path / "mbtiles" / "main.mbtiles")) as con:
+        columns = con.execute(
+            "SELECT DISTINCT tile_column FROM tiles WHERE zoom_level = 4"
+        ).fetchall()
+        bounds = con.execute(
+            "SELECT value FROM metadata WHERE name = 'bounds'"
+        ).fetchone()
+    assert sorted(columns) == [(0,), (15,)]
+    assert bounds == ("-180,0.0,180,10.0",)
+
+
+def test_k2g_cleans_up_on_error(tmp_path, monkeypatch):
+    def failing_write(layers_or_tiles, path, *args, **kwargs):
+        pl.Path(path).write_bytes(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(g, "write_geopackage", failing_write)
+    monkeypatch.setattr(t, "write_mbtiles", failing_write)
+    kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    for output_format in ["gpkg", "mbtiles"]:
+        out_dir = tmp_path / output_format
+        result = runner.invoke(k2g, [str(kml_path), str(out_dir), "-of", output_format])
+        assert isinstance(result.exception, OSError)
+        assert not list(out_dir.iterdir())
@@ -0,0 +1,74 @@
+import gzip
+import io
+import zlib
+
+import pytest
+
+from kml2geojson.compress import *
+
+DATA = b"".join(
+    b'{"type": "Feature", "properties": {"i": %d}}, ' % i for i in range(5000)
+)
+
+
+def test_deflate_block():
+    a, b = DATA[:1000], DATA[1000:]
+    stream = deflate_block(a, b"", 6, False) + deflate_block(b, a, 6, True)
+    assert zlib.decompress(stream, -zlib.MAX_WBITS) == DATA
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_block_compressor_gzip(workers):
+    tgt = io.BytesIO()
+    with BlockCompressor(tgt, "gzip", workers=workers, block_size=1000) as f:
+        for i in range(0, len(DATA), 777):
+            f.write(DATA[i : i + 777])
+    data = tgt.getvalue()
+    assert gzip.decompress(data) == DATA
+
+    # A single gzip member
+    d = zlib.decompressobj(wbits=31)
+    assert d.decompress(data) == DATA
+    assert d.eof and not d.unused_data
+
+    # Empty
+    tgt = io.BytesIO()
+    BlockCompressor(tgt).close()
+    assert gzip.decompress(tgt.getvalue()) == b""
+
+
+def test_block_compressor_checkpoint():
+    tgt = io.BytesIO()
+    f = BlockCompressor(tgt, block_size=1000)
+    f.write(DATA[:2500])
+    state = f.checkpoint()
+    position = tgt.tell()
+    f.write(b"lost")
+    f.flush()
+
+    # Continue after the checkpoint, as after a crash
+    tgt.truncate(position)
+    tgt.seek(position)
+    with BlockCompressor(tgt, block_size=1000, state=state) as f:
+        f.write(DATA[2500:])
+    assert gzip.decompress(tgt.getvalue()) == DATA
+
+
+def test_open_compressed():
+    tgt = io.BytesIO()
+    with open_compressed(tgt, "gzip", "w") as f:
+        f.write("héllo")
+    assert gzip.decompress(tgt.getvalue()).decode("utf-8") == "héllo"
+    with pytest.raises(ValueError):
+        open_compressed(tgt, "bzip2")
+
+
+@pytest.mark.skipif(zstandard is None, reason="requires zstandard")
+def test_block_compressor_zstd():
+    tgt = io.BytesIO()
+    with BlockCompressor(tgt, "zstd", workers=4, block_size=1000) as f:
+        f.write(DATA)
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        io.BytesIO(tgt.getvalue()), read_across_frames=True
+    )
+    assert reader.read() == DATA
@@ -0,0 +1,77 @@
+import pytest
+
+from .context import DATA_DIR
+from kml2geojson.dataframe import *
+import kml2geojson.main as m
+
+
+def test_add_geometry():
+    buffers = {}
+    geometry = {
+        "type": "GeometryCollection",
+        "geometries": [
+            {"type": "Point", "coordinates": [0, 1]},
+            {"type": "LineString", "coordinates": [[0, 0, 1], [1, 1, 1]]},
+            {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [0, 1], [0, 0]]]},
+        ],
+    }
+    assert add_geometry(buffers, geometry, 7) == 3
+    assert add_geometry(buffers, {"type": "Point", "coordinates": [2, 3]}, 8) == 1
+    assert set(buffers) == {("Point", 2), ("LineString", 3), ("Polygon", 2)}
+    assert buffers["Point", 2]["coords"] == [[0, 1], [2, 3]]
+    assert buffers["Point", 2]["rows"] == [7, 8]
+    assert buffers["Polygon", 2]["rings"] == [0, 4]
+    assert buffers["Polygon", 2]["polygons"] == [0, 1]
+    assert [b["parts"] for b in buffers.values()] == [[0, 0], [1], [2]]
+
+
+def test_build_columns(monkeypatch):
+    root = m.parse_kml(DATA_DIR / "two_layers" / "two_layers.kml")
+    layers = m.build_layers(root)
+    features = [f for layer in layers for f in layer["features"]]
+
+    # Properties go straight into columns, without building Features
+    def fail(*args, **kwargs):
+        raise AssertionError
+
+    monkeypatch.setattr(m, "build_feature", fail)
+    columns, buffers, n = build_columns(root, separate_folders=True)
+    assert n == len(features)
+    assert all(len(column) == n for column in columns.values())
+    assert columns["layer"] == [
+        layer["name"] for layer in layers for f in layer["features"]
+    ]
+    keys = {k for f in features for k in f["properties"]}
+    assert keys == set(columns) - {"layer"}
+    for key in keys:
+        assert columns[key] == [f["properties"].get(key) for f in features]
+
+    root = m.parse_kml(DATA_DIR / "time_span.kml")
+    columns, buffers, n = build_columns(root)
+    assert "layer" not in columns
+    assert columns["timeSpan_begin"] == ["0725"]
+
+
+def test_to_geodataframe():
+    pytest.importorskip("geopandas")
+    shapely_geometry = pytest.importorskip("shapely.geometry")
+
+    path = DATA_DIR / "two_layers" / "two_layers.kml"
+    features = [
+        f for layer in m.convert(path, separate_folders=True) for f in layer["features"]
+    ]
+    df = to_geodataframe(path, separate_folders=True)
+    assert len(df) == len(features)
+    assert df.crs == "EPSG:4326"
+    assert df["layer"].nunique() == 2
+    for feature, geometry in zip(features, df.geometry):
+        assert shapely_geometry.shape(feature["geometry"]).equals_exact(geometry, 0)
+
+    # MultiGeometry becomes a GeometryCollection
+    df = to_geodataframe(DATA_DIR / "multigeometry.kml", dimensions=2)
+    assert df.geometry[0].geom_type == "GeometryCollection"
+    assert not df.geometry[0].has_z
+
+    # Empty geometries
+    df = to_geodataframe(DATA_DIR / "self_closing.kml")
+    assert df.geometry[0].is_empty
@@ -0,0 +1,177 @@
+import sqlite3
+import struct
+
+import pytest
+
+from .context import DATA_DIR
+from kml2geojson.geopackage import *
+import kml2geojson.main as m
+
+
+def test_unique_names():
+    assert unique_names(["a", "A", "b", "a"]) == ["a", "A_2", "b", "a_3"]
+    assert unique_names(["geom"], reserved=["fid", "geom"]) == ["geom_2"]
+
+
+def test_column_type():
+    assert column_type([1, None, 2]) == "INTEGER"
+    assert column_type([1, 2.5]) == "REAL"
+    assert column_type(["1", 2]) == "TEXT"
+    assert column_type([True]) == "TEXT"
+    assert column_type([None]) == "TEXT"
+
+
+def test_encode_geometry():
+    blob, envelope, z = encode_geometry(
+        {"type": "LineString", "coordinates": [[0, 1], [2, 3]]}
+    )
+    assert envelope == (0, 2, 1, 3) and not z
+    magic, version, flags, srs_id, *env = struct.unpack_from("<2sBBi4d", blob)
+    assert (magic, flags, srs_id, tuple(env)) == (b"GP", 0b011, 4326, envelope)
+    wkb = blob[40:]
+    assert struct.unpack_from("<BII", wkb) == (1, 2, 2)
+    assert struct.unpack_from("<4d", wkb, 9) == (0, 1, 2, 3)
+
+    # Z values
+    blob, envelope, z = encode_geometry(
+        {
+            "type": "GeometryCollection",
+            "geometries": [
+                {"type": "Point", "coordinates": [0, 1, 5]},
+                {"type": "Point", "coordinates": [1, 1]},
+            ],
+        }
+    )
+    assert z
+    assert struct.unpack_from("<BII", blob, 40) == (1, 1007, 2)
+    assert struct.unpack_from("<BI3d", blob, 49) == (1, 1001, 0, 1, 5)
+
+    # Multi-part geometries nest a complete geometry per part
+    blob, envelope, z = encode_geometry(
+        {
+            "type": "MultiPolygon",
+            "coordinates": [
+                [[[170, 0], [180, 0], [180, 10], [170, 0]]],
+                [[[-180, 0], [-170, 0], [-180, 10], [-180, 0]]],
+            ],
+        }
+    )
+    assert envelope == (-180, 180, 0, 10) and not z
+    assert struct.unpack_from("<BII", blob, 40) == (1, 6, 2)
+    assert struct.unpack_from("<BIII2d", blob, 49) == (1, 3, 1, 4, 170, 0)
+    blob, envelope, z = encode_geometry(
+        {"type": "MultiLineString", "coordinates": [[[0, 1], [2, 3]], [[4, 5, 6]]]}
+    )
+    assert envelope == (0, 4, 1, 5) and z
+    assert struct.unpack_from("<BII", blob, 40) == (1, 1005, 2)
+    assert struct.unpack_from("<BII3d", blob, 49) == (1, 1002, 2, 0, 1, 0)
+
+    # Empty geometries have no envelope
+    blob, envelope, z = encode_geometry({"type": "LineString", "coordinates": []})
+    assert envelope is None
+    assert blob[3] == 0b10001 and len(blob) == 8 + 9
+    assert encode_geometry(None) == (None, None, False)
+
+
+def test_write_geopackage(tmp_path):
+    path = tmp_path / "test.gpkg"
+    layers = m.convert(
+        DATA_DIR / "two_layers" / "two_layers.kml", separate_folders=True
+    )
+    layers[1]["features"][0]["properties"]["NAME"] = 1
+    assert write_geopackage(layers, path, batch_size=2) == sum(
+        len(layer["features"]) for layer in layers
+    )
+
+    con = sqlite3.connect(str(path))
+    assert con.execute("PRAGMA application_id").fetchone()[0] == APPLICATION_ID
+    tables = [
+        r[0] for r in con.execute("SELECT table_name FROM gpkg_contents ORDER BY rowid")
+    ]
+    assert tables == [layer["name"] for layer in layers]
+    for table, layer in zip(tables, layers):
+        rows = con.execute(f'SELECT fid, name FROM "{table}" ORDER BY fid').fetchall()
+        assert rows == [
+            (i, f["properties"].get("name")) for i, f in enumerate(layer["features"], 1)
+        ]
+        extent = con.execute(
+            "SELECT min_x, min_y, max_x, max_y FROM gpkg_contents WHERE table_name = ?",
+            (table,),
+        ).fetchone()
+        assert list(extent) == pytest.approx(
+            m.merge_bboxes(m.get_bbox(f["geometry"]) for f in layer["features"])
+        )
+
+        # Spatial index
+        min_x, min_y, max_x, max_y = m.get_bbox(layer["features"][0]["geometry"])
+        ids = con.execute(
+            f'SELECT id FROM "rtree_{table}_geom" '
+            "WHERE maxx >= ? AND minx <= ? AND maxy >= ? AND miny <= ?",
+            (min_x, max_x, min_y, max_y),
+        ).fetchall()
+        assert (1,) in ids
+
+    # Multi-part geometries
+    multi_path = tmp_path / "multi.gpkg"
+    feature = {
+        "type": "Feature",
+        "properties": {},
+        "geometry": {
+            "type": "MultiLineString",
+            "coordinates": [[[170, 0], [180, 5]], [[-180, 5], [-170, 10]]],
+        },
+    }
+    layer = {"type": "FeatureCollection", "features": [feature], "name": "multi"}
+    assert write_geopackage([layer], multi_path) == 1
+    with sqlite3.connect(str(multi_path)) as multi_con:
+        assert multi_con.execute(
+            "SELECT geometry_type_name FROM gpkg_geometry_columns"
+        ).fetchone() == ("MULTILINESTRING",)
+
+    # Case-insensitive column names
+    columns = [r[1] for r in con.execute(f'PRAGMA table_info("{tables[1]}")')]
+    assert "NAME_2" in columns
+    con.close()
+
+    # Placemark ids, yielding to an 'id' property
+    id_path = tmp_path / "id.gpkg"
+    features = [
+        {"type": "Feature", "id": "a", "properties": {"id": 1}, "geometry": None},
+        {"type": "Feature", "properties": {"id": 2}, "geometry": None},
+    ]
+    layer = {"type": "FeatureCollection", "features": features, "name": "ids"}
+    write_geopackage([layer], id_path)
+    with sqlite3.connect(str(id_path)) as id_con:
+        assert [r[1:3] for r in id_con.execute('PRAGMA table_info("ids")')] == [
+            ("fid", "INTEGER"),
+            ("geom", "GEOMETRY"),
+            ("id", "INTEGER"),
+            ("id_2", "TEXT"),
+        ]
+        assert id_con.execute('SELECT id, id_2 FROM "ids"').fetchall() == [
+            (1, "a"),
+            (2, None),
+        ]
+
+    # Reserved table names
+    reserved_path = tmp_path / "reserved.gpkg"
+    names = ["gpkg_contents", "RTREE_x", "layer_gpkg_contents"]
+    layers = [dict(layer, name=name) for name in names]
+    assert write_geopackage(layers, reserved_path) == 6
+    with sqlite3.connect(str(reserved_path)) as reserved_con:
+        assert [
+            r[0]
+            for r in reserved_con.execute(
+                "SELECT table_name FROM gpkg_contents ORDER BY rowid"
+            )
+        ] == ["layer_gpkg_contents", "layer_RTREE_x", "layer_gpkg_contents_2"]
+
+
+def test_write_geopackage_gdal(tmp_path):
+    pyogrio = pytest.importorskip("pyogrio")
+    path = tmp_path / "test.gpkg"
+    layers = m.convert(DATA_DIR / "google_sample.kml", separate_folders=True)
+    write_geopackage(layers, path)
+    info = pyogrio.read_info(path, layer=layers[2]["name"])
+    assert info["features"] == len(layers[2]["features"])
+    assert info["capabilities"]["fast_spatial_filter"]
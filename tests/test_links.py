@@ -0,0 +1,106 @@
+import pickle
+import zipfile
+
+import pytest
+
+from .context import DATA_DIR
+from kml2geojson.links import *
+import kml2geojson.main as m
+
+
+def network_link(name, href):
+    return f"<NetworkLink><name>{name}</name><Link><href>{href}</href></Link></NetworkLink>"
+
+
+def kml(*parts):
+    return (
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+        + "".join(parts)
+        + "</Document></kml>"
+    )
+
+
+def test_to_url(tmp_path):
+    base = (tmp_path / "root.kml").as_uri()
+    assert to_url("sub/a.kml", base) == (tmp_path / "sub" / "a.kml").as_uri()
+    assert to_url("http://example.com/a.kml", base) == "http://example.com/a.kml"
+    assert url_to_path(to_url(str(tmp_path / "a.kml"))) == tmp_path / "a.kml"
+
+
+def test_fetch_cache(tmp_path):
+    path = tmp_path / "a.kml"
+    path.write_bytes(b"<kml/>")
+    url = path.as_uri()
+    calls = []
+
+    def counting_fetch_file(url, validators):
+        content, validators = fetch_file(url, validators)
+        calls.append(content)
+        return content, validators
+
+    cache = LinkCache(tmp_path / "cache")
+    assert fetch(url, cache=cache) == b"<kml/>"
+    assert cache.get(url)[1] == {"mtime": path.stat().st_mtime, "size": 6}
+
+    # Revalidated but not reread, also by a new cache on the same directory
+    cache = pickle.loads(pickle.dumps(cache))
+    content, validators = fetch_file(url, cache.get(url)[1])
+    assert content is None
+
+    # Pluggable fetcher with validators
+    def fetch_http(url, validators):
+        calls.append(validators)
+        if validators.get("etag") == '"v1"':
+            return None, validators
+        return b"remote", {"etag": '"v1"'}
+
+    for __ in range(2):
+        assert (
+            fetch("http://example.com/a.kml", fetch_http=fetch_http, cache=cache)
+            == b"remote"
+        )
+    assert calls == [{}, {"etag": '"v1"'}]
+
+    with pytest.raises(ValueError):
+        fetch("http://example.com/a.kml")
+    results = fetch_all([url, url, str(tmp_path / "missing.kml")])
+    assert results[url] == b"<kml/>"
+    assert isinstance(results[str(tmp_path / "missing.kml")], ValueError)
+
+
+def test_resolve_network_links(tmp_path):
+    point = (DATA_DIR / "point.kml").read_text()
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "point.kml").write_text(point)
+    with zipfile.ZipFile(tmp_path / "two.kmz", "w") as z:
+        z.write(DATA_DIR / "two_points.kml", "doc.kml")
+    # Nested links, a cycle, a repeated link, and a missing file
+    (tmp_path / "nested.kml").write_text(
+        kml(network_link("", "sub/point.kml"), network_link("Back", "root.kml"))
+    )
+    root_path = tmp_path / "root.kml"
+    root_path.write_text(
+        kml(
+            "<name>Root</name>",
+            network_link("Nested", "nested.kml"),
+            network_link("Two", (tmp_path / "two.kmz").as_uri()),
+            network_link("Again", "nested.kml"),
+            network_link("Missing", "missing.kml"),
+        )
+    )
+    root = m.parse_kml(root_path)
+    with pytest.warns(UserWarning, match="missing.kml"):
+        linked = m.resolve_network_links(root, root_path.as_uri())
+    assert [name for name, doc in linked] == ["Nested", "Simple placemark", "Two"]
+
+    with pytest.warns(UserWarning):
+        layers = m.convert(root_path, separate_folders=True, follow_links=True)
+    assert [layer["name"] for layer in layers] == ["Simple placemark", "Two"]
+    assert len(layers[0]["features"]) == 1
+    with pytest.warns(UserWarning):
+        (collection,) = m.convert(root_path, follow_links=True, bbox=True)
+    assert len(collection["features"]) == 1 + len(layers[1]["features"])
+    assert collection["bbox"] == m.merge_bboxes(
+        f["bbox"] for f in collection["features"]
+    )
+    assert m.convert(root_path) == [{"type": "FeatureCollection", "features": []}]
@@ -1,5 +1,9 @@
 import xml.dom.minidom as md
 import json
+import pathlib as pl
+import zipfile
+
+import pytest
 
 from .context import kml2geojson, DATA_DIR
 from kml2geojson import *
@@ -22,6 +26,150 @@ def test_coords():
     assert get == expect
 
 
+def test_coords_bbox():
+    bbox = list(EMPTY_BBOX)
+    coords("-112.0,36.1,0 -113.0,36.0,0", bbox)
+    assert bbox == [-113.0, 36.0, -112.0, 36.1]
+    coords1("-110,40", bbox)
+    assert bbox == [-113.0, 36.0, -110.0, 40.0]
+
+
+def test_coords_dimensions():
+    assert coords1(" -112.2,36.0,2357 ", dimensions=2) == [-112.2, 36.0]
+    assert coords("-112.0,36.1,0 -113.0,36.0", dimensions=2) == [
+        [-112.0, 36.1],
+        [-113.0, 36.0],
+    ]
+    bbox = list(EMPTY_BBOX)
+    assert coords("-112.0,36.1,5", bbox, dimensions=2) == [[-112.0, 36.1]]
+    assert bbox == [-112.0, 36.1, -112.0, 36.1]
+    assert gx_coords1("-113.0 36.0 0", dimensions=2) == [-113.0, 36.0]
+
+
+def test_has_altitude():
+    assert not has_altitude(["-112.0,36.1,0", "-113.0,36.0,0.0", "1,2"])
+    assert has_altitude(["-112.0,36.1,0", "-113.0,36.0,-1"])
+    assert has_altitude(["-113.0 36.0 12"], sep=" ")
+
+
+def test_build_geometry_altitude():
+    kml = """<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><MultiGeometry>
+        <Point><coordinates>1,2,0</coordinates></Point>
+        <LineString><coordinates>1,2,0 3,4,7</coordinates></LineString>
+        <Polygon><outerBoundaryIs><LinearRing>
+            <coordinates>0,0,0 1,0,0 1,1,0 0,0,0</coordinates>
+        </LinearRing></outerBoundaryIs></Polygon>
+        </MultiGeometry></Placemark></kml>"""
+    for parser in ["minidom", "etree"]:
+        placemark = get1(parse_string(kml, parser), "Placemark")
+
+        def points(**kwargs):
+            geoms = build_geometry(placemark, **kwargs)["geoms"]
+            return {
+                g["type"]: {
+                    "Point": [g["coordinates"]],
+                    "LineString": g["coordinates"],
+                }.get(g["type"], g["coordinates"][0])[0]
+                for g in geoms
+            }
+
+        assert points() == {
+            "Polygon": [0, 0, 0],
+            "LineString": [1, 2, 0],
+            "Point": [1, 2, 0],
+        }
+        assert points(dimensions=2) == {
+            "Polygon": [0, 0],
+            "LineString": [1, 2],
+            "Point": [1, 2],
+        }
+        assert points(altitude="auto") == {
+            "Polygon": [0, 0],
+            "LineString": [1, 2, 0],
+            "Point": [1, 2],
+        }
+
+    path = DATA_DIR / "gx_track.kml"
+    for feature in convert(path, dimensions=2)[0]["features"]:
+        assert len(feature["geometry"]["coordinates"][0]) == 2
+    with pytest.raises(ValueError):
+        convert(path, altitude="drop")
+
+
+def test_build_geometry_rfc7946():
+    kml = """<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><MultiGeometry>
+        <LineString><coordinates>170,0 -170,10 -160,10</coordinates></LineString>
+        <Polygon>
+        <outerBoundaryIs><LinearRing>
+            <coordinates>0,0 0,1 1,1 1,0 0,0</coordinates>
+        </LinearRing></outerBoundaryIs>
+        <innerBoundaryIs><LinearRing>
+            <coordinates>0.2,0.2 0.8,0.2 0.8,0.8 0.2,0.2</coordinates>
+        </LinearRing></innerBoundaryIs>
+        </Polygon>
+        <Polygon><outerBoundaryIs><LinearRing>
+            <coordinates>170,0 -170,0 -170,10 170,10 170,0</coordinates>
+        </LinearRing></outerBoundaryIs></Polygon>
+        </MultiGeometry></Placemark></kml>"""
+    placemark = get1(parse_string(kml, "etree"), "Placemark")
+    geoms = build_geometry(placemark)["geoms"]
+    assert [g["type"] for g in geoms] == ["Polygon", "Polygon", "LineString"]
+
+    result = build_geometry(placemark, bbox=True, rfc7946=True)
+    square, band, line = result["geoms"]
+    # Bounding boxes of split geometries cross the antimeridian (RFC 7946, 5.2)
+    assert result["bbox"] == [170, 0, 1, 10]
+    assert merge_bboxes([result["bbox"], [-10, -5, -5, 0]]) == [170, -5, 1, 10]
+    assert merge_bboxes([result["bbox"], [100, 0, 110, 1]]) == [100, 0, 1, 10]
+    assert bboxes_intersect(result["bbox"], [-175, 5, -174, 6])
+    assert not bboxes_intersect(result["bbox"], [100, 5, 101, 6])
+    assert bbox_center([170, 0, -170, 10]) == (180, 5)
+    assert line == {
+        "type": "MultiLineString",
+        "coordinates": [
+            [[170, 0], [180, 5]],
+            [[-180, 5], [-170, 10], [-160, 10]],
+        ],
+    }
+
+    # Exterior ring counterclockwise, interior ring clockwise
+    outer, inner = square["coordinates"]
+    assert outer == [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+    assert inner == [[0.2, 0.2], [0.8, 0.8], [0.8, 0.2], [0.2, 0.2]]
+    assert coords_and_area("0,0 1,0 1,1 0,1 0,0")[1] == 2
+    assert coords_and_area("0,0 0,1 1,1 1,0 0,0")[1] == -2
+
+    assert band["type"] == "MultiPolygon"
+    east, west = band["coordinates"]
+    assert east == [[[170, 0], [180, 0], [180, 10], [170, 10], [170, 0]]]
+    assert west == [[[-180, 0], [-170, 0], [-170, 10], [-180, 10], [-180, 0]]]
+
+    # Holes go with the piece of the exterior ring that contains them
+    parts = split_polygon(
+        [
+            [[170, 0], [-170, 0], [-170, 10], [170, 10], [170, 0]],
+            [[-178, 2], [-178, 8], [-175, 8], [-175, 2], [-178, 2]],
+        ]
+    )
+    assert [len(p) for p in parts] == [1, 2]
+
+    # Rings around a pole are not split
+    ring = [[0, 80], [120, 80], [-120, 80], [0, 80]]
+    assert split_polygon([ring]) == [[ring]]
+
+
+def test_get_bbox():
+    geometry = {
+        "type": "GeometryCollection",
+        "geometries": [
+            {"type": "Point", "coordinates": [1, 2]},
+            {"type": "Polygon", "coordinates": [[[0, 0], [3, 0], [3, 1], [0, 0]]]},
+        ],
+    }
+    assert get_bbox(geometry) == [0, 0, 3, 2]
+    assert get_bbox({"type": "LineString", "coordinates": []}) is None
+
+
 def test_build_rgb_and_opactity():
     get = build_rgb_and_opacity("ee001122")
     expect = ("#221100", 0.93)
@@ -82,12 +230,293 @@ def test_build_feature_collection():
         assert get == expect
 
 
+def test_build_feature_collection_bbox():
+    path = DATA_DIR / "two_points.kml"
+    with path.open() as src:
+        kml = md.parseString(src.read())
+    get = build_feature_collection(kml, bbox=True)
+    for f in get["features"]:
+        assert f["bbox"] == get_bbox(f["geometry"])
+    assert get["bbox"] == merge_bboxes(f["bbox"] for f in get["features"])
+
+    # Bounding boxes should not change anything else
+    for f in get["features"]:
+        del f["bbox"]
+    del get["bbox"]
+    assert get == build_feature_collection(kml)
+
+
+def test_parse_time():
+    assert parse_time("1970-01-01T00:00:00Z") == 0
+    assert parse_time("2013-08-08T15:20:40.5Z") == 1375975240.5
+    assert parse_time("2013-08-08T17:20:40+02:00") == 1375975240
+    assert parse_time("2013-08-08") == parse_time("2013-08-08T00:00:00Z")
+    assert parse_time("0725") == days_from_civil(725, 1, 1) * 86400
+    assert parse_time("1969-12") == -31 * 86400
+    assert parse_time("") is None
+    assert parse_time("yesterday") is None
+    for days in [-800_000, -1, 0, 11017, 19000]:
+        assert days_from_civil(*civil_from_days(days)) == days
+
+
+def test_time_buckets():
+    day = 86400
+    assert time_buckets(0, 2 * day, "day") == [
+        "1970-01-01",
+        "1970-01-02",
+        "1970-01-03",
+    ]
+    assert time_buckets(0, 0, "month") == ["1970-01"]
+    assert time_buckets(-day, 400 * day, "year") == ["1969", "1970", "1971"]
+    with pytest.raises(ValueError):
+        time_buckets(0, 0, "week")
+
+
+def test_time_range():
+    path = DATA_DIR / "multitrack.kml"
+    features = convert(path, time_stamps=True)[0]["features"]
+    assert [get_feature_time_interval(f) is not None for f in features] == [True] * 3
+    assert features[0]["properties"]["timeStamp"] == "2013-08-08T15:20:40.000Z"
+
+    # TimeStamps aren't copied by default
+    assert "timeStamp" not in convert(path)[0]["features"][0]["properties"]
+
+    # Only the start point at 15:20:40 and the track from 15:24:47 overlap this range
+    got = convert(path, time_range=(None, "2013-08-08T15:25:00Z"))[0]["features"]
+    assert [f["properties"]["name"] for f in got] == [
+        f["properties"]["name"] for f in features[:2]
+    ]
+    got = convert(path, time_range=("2014", None))[0]["features"]
+    assert got == []
+
+    # Placemarks without time are kept
+    got = convert(DATA_DIR / "point.kml", time_range=("2014", "2015"))[0]
+    assert len(got["features"]) == 1
+
+    with pytest.raises(ValueError):
+        convert(path, time_range=("soon", None))
+
+
+def test_time_index():
+    def feature(**props):
+        return {"type": "Feature", "properties": props, "geometry": None}
+
+    collection = {
+        "features": [
+            feature(timeSpan={"begin": "2001", "end": "2003"}),
+            feature(),
+            feature(timeStamp="2002-06-01"),
+            feature(timeSpan={"begin": "", "end": "2000"}),
+            feature(times=["2005-01-01T00:00:00Z", "2006-01-01T00:00:00Z"]),
+        ]
+        + [feature(timeStamp=f"{1900 + i}") for i in range(100)]
+    }
+    index = build_time_index(collection, block_size=4)
+    assert len(index["ids"]) == 104
+    assert query_time_index(index, ("2002", "2002")) == [0]
+    assert query_time_index(index, ("2002-06-01", "2002-06-01")) == [0, 2]
+    assert query_time_index(index, ("2005-06", None)) == [4]
+    assert query_time_index(index, (None, "1901")) == [3, 5, 6]
+    assert query_time_index(index) == [0] + list(range(2, 105))
+
+
+def test_partition_features_time():
+    features = [
+        {"properties": {"timeSpan": {"begin": "2001-12", "end": "2002-01"}}},
+        {"properties": {"timeStamp": "2002-01-15"}},
+        {"properties": {"timeSpan": {"begin": "2002-02", "end": ""}}},
+        {"properties": {}},
+    ]
+    groups = partition_features(features, time_bucket="month")
+    assert {k: [features.index(f) for f in v] for k, v in groups.items()} == {
+        "2001-12": [0],
+        "2002-01": [0, 1],
+        "2002-02": [2],
+        "untimed": [3],
+    }
+
+
+def test_partition_features():
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"kind": kind} if kind else {},
+            "geometry": {"type": "Point", "coordinates": [x, 1]},
+        }
+        for kind, x in [("a b", 1), ("c", 2), (None, 3), ("a b", 15)]
+    ]
+    get = partition_features(features, by_property="kind")
+    assert {k: len(v) for k, v in get.items()} == {"a_b": 2, "c": 1, "null": 1}
+
+    get = partition_features(features, grid_size=10)
+    assert {k: len(v) for k, v in get.items()} == {"18_9": 3, "19_9": 1}
+
+    get = partition_features(features)
+    assert get == {"": features}
+
+
+def test_spatial_index():
+    features = [
+        {
+            "type": "Feature",
+            "properties": {},
+            "geometry": {"type": "Point", "coordinates": [i % 10, i // 10]},
+        }
+        for i in range(100)
+    ]
+    collection = {"type": "FeatureCollection", "features": features}
+    index = build_spatial_index(collection, node_capacity=4)
+    assert sorted(index["ids"]) == list(range(100))
+    assert len(index["levels"][-1]) == 1
+
+    get = query_spatial_index(index, [2.5, 3.5, 4.5, 5])
+    expect = [43, 44, 53, 54]
+    assert get == expect
+    assert query_spatial_index(index, [20, 20, 30, 30]) == []
+    assert query_spatial_index(index, [-1, -1, 10, 10]) == list(range(100))
+
+
+def test_string_table():
+    table = StringTable(max_size=2, max_length=3)
+    a = "".join(["a", "b"])
+    assert table.intern(a) is a
+    assert table.intern("".join(["a", "b"])) is a
+    long = "".join(["a", "bcd"])
+    assert table.intern(long) is long
+    assert table.intern("".join(["a", "bcd"])) is not long
+    # Full table
+    table.intern("x")
+    y = "".join(["y", "z"])
+    assert table.intern(y) is y
+    assert table.intern("".join(["y", "z"])) is not y
+    assert len(table.strings) == 2
+
+    # Properties are shared only if sharing and only if equal with equal types
+    assert table.share({"a": 1}) is not table.share({"a": 1})
+    table = StringTable(share_properties=True)
+    p = {"a": 1}
+    assert table.share({"a": 1}.copy()) is table.share(p)
+    assert table.share({"a": 1.0}) == {"a": 1.0}
+    assert table.share({"a": 1.0}) is not table.share(p)
+    q = {"a": [1]}
+    assert table.share(q) is q
+
+
+def test_convert_strings():
+    path = DATA_DIR / "extended_data.kml"
+    expect = convert(path, separate_folders=True)
+    get = convert(path, separate_folders=True, intern_strings=True)
+    assert get == expect
+    get = convert(path, intern_strings=True, share_properties=True)
+    assert get == convert(path)
+
+
+def test_hilbert_key():
+    # The order-1 curve visits the quadrants SW, NW, NE, SE
+    assert [
+        hilbert_key(x, y, 1) for x, y in [(-90, -45), (-90, 45), (90, 45), (90, -45)]
+    ] == [0, 1, 2, 3]
+    # Consecutive cells are adjacent
+    cells = {
+        hilbert_key(-180 + 45 * i + 1, -90 + 22.5 * j + 1, 3): (i, j)
+        for i in range(8)
+        for j in range(8)
+    }
+    assert sorted(cells) == list(range(64))
+    for d in range(63):
+        (i, j), (k, l) = cells[d], cells[d + 1]
+        assert abs(i - k) + abs(j - l) == 1
+
+    point = {"type": "Point", "coordinates": [-90, -45]}
+    assert get_hilbert_key({"geometry": point}, 1) == 0
+    assert get_hilbert_key({"geometry": None}, 1) == 4
+
+
+def test_sort_features(monkeypatch):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"i": i},
+            "geometry": {
+                "type": "Point",
+                "coordinates": [(i * 37) % 100, (i * 11) % 50],
+            },
+        }
+        for i in range(200)
+    ] + [{"type": "Feature", "properties": {"i": -1}, "geometry": None}]
+    expect = sorted(features, key=get_hilbert_key)
+    assert list(sort_features(features)) == expect
+    assert expect[-1]["geometry"] is None
+
+    # Spill runs of a few Features each and merge them in several passes
+    monkeypatch.setattr(kml2geojson.main, "MAX_MERGE_RUNS", 4)
+    assert list(sort_features(iter(features), memory_limit=500)) == expect
+    assert list(sort_features([], memory_limit=500)) == []
+
+    # Stable
+    items = [(1, "b"), (0, "a"), (1, "c"), (0, "d")]
+    assert list(external_sort(items, memory_limit=1)) == ["a", "d", "b", "c"]
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_parser_conformance(parser):
+    if parser == "lxml":
+        pytest.importorskip("lxml")
+
+    # Every parser should reproduce the expected FeatureCollections
+    for k_path in DATA_DIR.glob("*.kml"):
+        g_path = k_path.with_suffix(".geojson")
+        if not g_path.exists():
+            continue
+        with g_path.open() as src:
+            expect = json.load(src)
+        get = build_feature_collection(parse_kml(k_path, parser=parser))
+        assert get == expect, k_path.name
+
+    # And the same styles and layers as minidom
+    for k_path in [
+        DATA_DIR / "google_sample.kml",
+        DATA_DIR / "two_layers" / "two_layers.kml",
+    ]:
+        expect_root = parse_kml(k_path, parser="minidom")
+        root = parse_kml(k_path, parser=parser)
+        assert build_svg_style(root) == build_svg_style(expect_root)
+        assert build_leaflet_style(root) == build_leaflet_style(expect_root)
+        assert build_layers(root) == build_layers(expect_root)
+
+    # From file objects too
+    k_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    for mode in ["r", "rb"]:
+        with k_path.open(mode) as src:
+            get = convert(src, separate_folders=True, parser=parser)
+        assert get == convert(k_path, separate_folders=True, parser="minidom")
+
+
+def test_select_parser():
+    assert select_parser(10) == "minidom"
+    assert select_parser(AUTO_PARSER_THRESHOLD + 1) in ["etree", "lxml"]
+    with pytest.raises(ValueError):
+        parse_kml(DATA_DIR / "point.kml", parser="bingo")
+
+
 def test_disambiguate():
     names = ["bingo", "bingo1", "bongo", "bingo", "bro", "bongo"]
     get = disambiguate(names)
     expect = ["bingo", "bingo1", "bongo", "bingo11", "bro", "bongo1"]
     assert get == expect
 
+    names = ["bingo", "bingo_2", "bongo", "bingo", "bingo", "bongo"]
+    get = disambiguate(names, strategy="counter")
+    expect = ["bingo", "bingo_2", "bongo", "bingo_3", "bingo_4", "bongo_2"]
+    assert get == expect
+
+    get = disambiguate(["Untitled"] * 1000, strategy="counter")
+    assert len(set(get)) == 1000
+    assert get[-1] == "Untitled_1000"
+
+    with pytest.raises(ValueError):
+        disambiguate(names, strategy="bingo")
+
 
 def test_to_filename():
     name = "%   A d\nbla'{-+)(ç?"
@@ -112,6 +541,131 @@ def test_build_layers():
         assert get_layers[i] == expect_layers[i]
 
 
+def test_parse_kml(tmp_path):
+    # Parse according to the declared encoding
+    path = tmp_path / "latin.kml"
+    path.write_bytes(
+        '<?xml version="1.0" encoding="ISO-8859-1"?><kml><name>café</name></kml>'.encode(
+            "latin-1"
+        )
+    )
+    root = parse_kml(path)
+    assert val(get1(root, "name")) == "café"
+
+    # Recover from undecodable bytes only if asked
+    path = tmp_path / "bad.kml"
+    path.write_bytes(b"<kml><name>caf\xe9</name></kml>")
+    with pytest.raises(Exception):
+        parse_kml(path)
+    root = parse_kml(path, recover=True)
+    assert val(get1(root, "name")) == "caf"
+
+    # Parse file objects
+    with (DATA_DIR / "point.kml").open("rb") as src:
+        root = parse_kml(src)
+    assert get1(root, "Point") is not None
+
+
+def test_parse_kml_lxml_limits(tmp_path):
+    pytest.importorskip("lxml")
+    import lxml.etree
+
+    # No external entities
+    secret = tmp_path / "secret.txt"
+    secret.write_text("secret")
+    path = tmp_path / "xxe.kml"
+    path.write_text(
+        f'<!DOCTYPE kml [<!ENTITY x SYSTEM "{secret.as_uri()}">]>'
+        "<kml><name>&x;</name></kml>"
+    )
+    for kml in [path, path.read_bytes(), path.read_text()]:
+        if isinstance(kml, pl.Path):
+            root = parse_kml(kml, parser="lxml")
+        else:
+            root = parse_string(kml, "lxml")
+        assert "secret" not in val(get1(root, "name"))
+
+    # Text beyond 10 MB only with huge_tree
+    path = tmp_path / "huge.kml"
+    path.write_text(f"<kml><name>{'x' * 2**24}</name></kml>")
+    with pytest.raises(lxml.etree.XMLSyntaxError):
+        parse_kml(path, parser="lxml")
+    assert (
+        len(val(get1(parse_kml(path, parser="lxml", huge_tree=True), "name"))) == 2**24
+    )
+
+
+def test_scan_placemarks():
+    path = DATA_DIR / "two_layers" / "two_layers.kml"
+    kml_bytes = path.read_bytes()
+    records = list(scan_placemarks(kml_bytes))
+    assert len(records) == 7
+    assert [r["folders"] for r in records] == [("%Bingo",)] * 3 + [("#Bingo",)] * 4
+    for r in records:
+        chunk = kml_bytes[r["offset"] : r["offset"] + r["length"]]
+        assert chunk.startswith(b"<Placemark") and chunk.endswith(b"</Placemark>")
+    assert records[0]["bbox"] == [-122.0822035425683, 37.42228990140251] * 2
+
+    # Resume mid-file
+    assert list(scan_placemarks(kml_bytes, records[4]["offset"], ("#Bingo",))) == (
+        records[4:]
+    )
+
+
+def test_placemark_index(tmp_path):
+    kml_path = tmp_path / "two_layers.kml"
+    kml_path.write_bytes(
+        (DATA_DIR / "two_layers" / "two_layers.kml")
+        .read_bytes()
+        .replace(b"<Placemark>", b"<Placemark id='p'>", 1)
+    )
+    index_path = build_placemark_index(kml_path)
+    assert index_path == tmp_path / "two_layers.kml.k2gi"
+    index = read_placemark_index(index_path)
+    assert index["records"] == list(scan_placemarks(kml_path.read_bytes()))
+
+    # All features
+    expect = build_feature_collection(parse_kml(kml_path))["features"]
+    assert list(iter_features(kml_path)) == expect
+
+    # By id
+    assert get_feature(kml_path, "p") == expect[0]
+    assert get_feature(kml_path, "bingo") is None
+
+    # By bounding box
+    get = list(iter_features(kml_path, bbox=[-122.0823, 37.4222, -122.0821, 37.4224]))
+    assert get == [expect[0]]
+
+    # Stale indices are rebuilt
+    kml_path.write_bytes(kml_path.read_bytes().replace(b"id='p'", b"id='q'"))
+    assert get_feature(kml_path, "q") == dict(expect[0], id="q")
+
+
+def test_parse_kml_kmz(tmp_path):
+    path = tmp_path / "point.kmz"
+    with zipfile.ZipFile(path, "w") as z:
+        z.write(DATA_DIR / "point.kml", "doc.kml")
+    expect = convert(DATA_DIR / "point.kml")
+    assert convert(path) == expect
+    with path.open("rb") as src:
+        assert convert(src) == expect
+
+
+def test_atomic_open(tmp_path):
+    path = tmp_path / "a.txt"
+    with atomic_open(path) as tgt:
+        tgt.write("bingo")
+        assert not path.exists()
+    assert path.read_text() == "bingo"
+
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as tgt:
+            tgt.write("bongo")
+            raise RuntimeError
+    assert path.read_text() == "bingo"
+    assert [p.name for p in tmp_path.iterdir()] == ["a.txt"]
+
+
 def test_convert():
     kml_path = DATA_DIR / "two_layers" / "two_layers.kml"
 
@@ -160,3 +714,35 @@ def test_convert():
 
         for i in range(len(get_list)):
             assert get_list[i] == expect_list[i]
+
+
+def test_build_layers_memory_limit(tmp_path):
+    k_path = DATA_DIR / "two_layers" / "two_layers.kml"
+    root = parse_kml(k_path)
+    expect = build_layers(root, bbox=True)
+
+    # Spill every layer or none of them
+    for memory_limit in [1, 10**9]:
+        layers = build_layers(
+            root, bbox=True, memory_limit=memory_limit, spill_dir=tmp_path
+        )
+        assert len(layers) == len(expect)
+        for layer, expect_layer in zip(layers, expect):
+            features = layer["features"]
+            assert isinstance(features, SpilledFeatures)
+            assert (features.path is not None) == (memory_limit == 1)
+            assert list(features) == expect_layer["features"]
+            assert {**layer, "features": list(features)} == expect_layer
+
+            path = tmp_path / f"{layer['name']}.geojson"
+            features.move_to(path, layer["name"], layer["bbox"])
+            assert path.read_text() == json.dumps(expect_layer)
+            assert list(features) == expect_layer["features"]
+
+    # Spill files are moved or deleted
+    del layers, layer, features
+    assert not list(tmp_path.glob("*.spill"))
+    assert len(list(tmp_path.iterdir())) == 2
+
+    with pytest.raises(ValueError):
+        convert(k_path, memory_limit=1)
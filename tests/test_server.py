@@ -0,0 +1,158 @@
+import concurrent.futures as cf
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from .context import DATA_DIR
+from kml2geojson.server import *
+import kml2geojson.main as m
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def server():
+    server = make_server(port=0, workers=1, max_concurrency=2, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.executor.shutdown()
+
+
+def request(server, method, path, body=None):
+    conn = http.client.HTTPConnection(*server.server_address)
+    conn.request(method, path, body=body)
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response, data
+
+
+def test_metrics():
+    metrics = Metrics()
+    assert metrics.snapshot()["latency"]["p50"] is None
+    for i in range(100):
+        metrics.record("ok", i / 100)
+    metrics.record("timeout")
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"] == {"ok": 100, "timeout": 1}
+    assert snapshot["latency"] == {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+    assert snapshot["throughput"] > 0
+
+
+def test_convert(server):
+    path = DATA_DIR / "two_layers" / "two_layers.kml"
+    kml = path.read_bytes()
+
+    response, data = request(server, "POST", "/convert", kml)
+    assert response.status == 200
+    assert json.loads(data) == json.loads(json.dumps(m.convert(path)[0]))
+
+    response, data = request(
+        server, "POST", "/convert?separate_folders=true&style_type=leaflet", kml
+    )
+    expect = m.convert(path, style_type="leaflet", separate_folders=True)
+    assert json.loads(data) == json.loads(json.dumps(list(expect)))
+
+    response, data = request(server, "POST", "/convert?format=geojsonseq", kml)
+    assert response.getheader("Content-Type") == "application/geo+json-seq"
+    records = data.split(b"\x1e")[1:]
+    assert [json.loads(r) for r in records] == json.loads(
+        json.dumps(m.convert(path)[0]["features"])
+    )
+
+    response, data = request(server, "POST", "/convert?bogus=1", kml)
+    assert response.status == 400
+    response, data = request(server, "POST", "/convert", b"<kml")
+    assert response.status == 422
+    response, data = request(server, "GET", "/nope")
+    assert response.status == 404
+
+    response, data = request(server, "GET", "/metrics")
+    metrics = json.loads(data)
+    assert metrics["requests"] == {"ok": 3, "bad_request": 1, "error": 1}
+    assert metrics["latency"]["p50"] > 0
+
+
+def test_limits(server):
+    kml = (DATA_DIR / "two_layers" / "two_layers.kml").read_bytes()
+
+    server.slots = threading.BoundedSemaphore(1)
+    server.slots.acquire()
+    response, data = request(server, "POST", "/convert", kml)
+    assert response.status == 503
+    server.slots.release()
+
+    # A conversion that never finishes
+    class StuckExecutor:
+        def submit(self, *args):
+            return cf.Future()
+
+    executor = server.executor
+    server.executor = StuckExecutor()
+    server.convert_timeout = 0.01
+    response, data = request(server, "POST", "/convert", kml)
+    assert response.status == 504
+    assert server.slots.acquire(blocking=False)
+    server.slots.release()
+
+    # A running conversion that times out keeps its slot until it finishes
+    future = cf.Future()
+    future.set_running_or_notify_cancel()
+
+    class BusyExecutor:
+        def submit(self, *args):
+            return future
+
+    server.executor = BusyExecutor()
+    response, data = request(server, "POST", "/convert", kml)
+    assert response.status == 504
+    response, data = request(server, "POST", "/convert", kml)
+    assert response.status == 503
+    future.set_result([])
+    assert server.slots.acquire(blocking=False)
+    server.slots.release()
+    server.executor = executor
+
+    # Invalid lengths
+    for length in ["abc", "-1"]:
+        conn = http.client.HTTPConnection(*server.server_address)
+        conn.putrequest("POST", "/convert")
+        conn.putheader("Content-Length", length)
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 400
+        conn.close()
+
+    server.max_upload_bytes = 10
+    response, data = request(server, "POST", "/convert", kml)
+    assert response.status == 413
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "k2g.sock")
+    server = make_server(socket_path=path, workers=1, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        conn = UnixHTTPConnection(path)
+        conn.request("GET", "/health")
+        assert json.loads(conn.getresponse().read()) == "ok"
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.executor.shutdown()
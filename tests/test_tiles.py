@@ -0,0 +1,164 @@
+import sqlite3
+import gzip
+
+from .context import DATA_DIR
+from kml2geojson.tiles import *
+import kml2geojson.main as m
+import kml2geojson.tiles as tiles
+
+
+def read_varint(data, i):
+    n = shift = 0
+    while True:
+        b = data[i]
+        n |= (b & 0x7F) << shift
+        i += 1
+        shift += 7
+        if b < 0x80:
+            return n, i
+
+
+def read_message(data):
+    """
+    Decode the given protobuf message into a list of pairs (field number, value).
+    """
+    fields = []
+    i = 0
+    while i < len(data):
+        key, i = read_varint(data, i)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, i = read_varint(data, i)
+        elif wire_type == 1:
+            value, i = data[i : i + 8], i + 8
+        else:
+            n, i = read_varint(data, i)
+            value, i = data[i : i + n], i + n
+        fields.append((field, value))
+    return fields
+
+
+def make_layer(geometries, name="main"):
+    return {
+        "type": "FeatureCollection",
+        "name": name,
+        "features": [
+            {"type": "Feature", "properties": {"name": str(i)}, "geometry": g}
+            for i, g in enumerate(geometries)
+        ],
+    }
+
+
+def test_clip_line():
+    get = clip_line([(-1, 1), (5, 1), (5, 20)], 0, 10)
+    expect = [[(0, 1), (5, 1), (5, 10)]]
+    assert get == expect
+
+    get = clip_line([(1, 1), (20, 1), (20, 2), (1, 2)], 0, 10)
+    expect = [[(1, 1), (10, 1)], [(10, 2), (1, 2)]]
+    assert get == expect
+
+
+def test_clip_ring():
+    ring = [(-5, -5), (5, -5), (5, 5), (-5, 5), (-5, -5)]
+    get = clip_ring(ring, 0, 10)
+    assert sorted(set(get)) == [(0, 0), (0, 5), (5, 0), (5, 5)]
+    assert clip_ring([(20, 20), (30, 20), (30, 30)], 0, 10) == []
+
+
+def test_simplify():
+    points = [(0, 0), (1, 0.1), (2, 0), (3, 5), (4, 0)]
+    assert simplify(points, 0.5) == [(0, 0), (2, 0), (3, 5), (4, 0)]
+
+
+def test_encode_tile():
+    layer = make_layer(
+        [
+            {"type": "Point", "coordinates": [0, 0, 0]},
+            {
+                "type": "Polygon",
+                "coordinates": [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]],
+            },
+        ],
+        name="bingo",
+    )
+    features = [
+        ({"name": f["properties"]["name"]}, project_geometry(f["geometry"]))
+        for f in layer["features"]
+    ]
+    tile = encode_tile([("bingo", features)], 0, 0, 0)
+    ((field, layer_bytes),) = read_message(tile)
+    assert field == 3
+    layer_fields = read_message(layer_bytes)
+    assert (15, 2) in layer_fields
+    assert (1, b"bingo") in layer_fields
+    assert (5, 4096) in layer_fields
+    encoded_features = [read_message(v) for k, v in layer_fields if k == 2]
+    assert len(encoded_features) == 2
+
+    # Point at the tile center
+    point = dict(encoded_features[0])
+    assert point[3] == POINT
+    commands = []
+    i = 0
+    while i < len(point[4]):
+        v, i = read_varint(point[4], i)
+        commands.append(v)
+    assert commands == [(1 << 3) | 1, 4096, 4096]
+
+    # Polygon with exterior ring closed by a ClosePath command
+    polygon = dict(encoded_features[1])
+    assert polygon[3] == POLYGON
+    assert polygon[4][-1] == (1 << 3) | 7
+
+    # Empty tile
+    assert encode_tile([("bingo", features)], 2, 0, 0) == b""
+
+
+def test_build_tiles():
+    layer = make_layer([{"type": "LineString", "coordinates": [[-170, 10], [170, 10]]}])
+    tiles = list(build_tiles([layer], 0, 2, workers=1))
+    get = [(z, x, y) for z, x, y, data in tiles]
+    expect = [(0, 0, 0), (1, 0, 0), (1, 1, 0)] + [(2, x, 1) for x in range(4)]
+    assert get == expect
+
+    # Multiple processes should give the same tiles
+    assert list(build_tiles([layer], 0, 2, workers=2)) == tiles
+
+
+def test_write_mbtiles():
+    layer = make_layer([{"type": "Point", "coordinates": [174.7, -36.8]}])
+    path = DATA_DIR / "tmp.mbtiles"
+    try:
+        tiles = build_tiles([layer], 0, 3, workers=1, compress=True)
+        metadata = build_metadata([layer], "main", 0, 3)
+        assert write_mbtiles(tiles, path, metadata, batch_size=2) == 4
+        con = sqlite3.connect(str(path))
+        rows = con.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles "
+            "ORDER BY zoom_level"
+        ).fetchall()
+        meta = dict(con.execute("SELECT name, value FROM metadata").fetchall())
+        con.close()
+    finally:
+        path.unlink()
+    assert [r[:3] for r in rows] == [(0, 0, 0), (1, 1, 0), (2, 3, 1), (3, 7, 3)]
+    assert read_message(gzip.decompress(rows[0][3]))[0][0] == 3
+    assert meta["format"] == "pbf"
+    assert meta["minzoom"] == "0"
+
+
+def test_tile_jobs_parts():
+    # A polygon split at the antimeridian only touches the tiles of its two parts
+    coordinates = m.split_polygon(
+        [[[179.99, 0], [-179.99, 0], [-179.99, 0.01], [179.99, 0.01], [179.99, 0]]]
+    )
+    layer = make_layer([{"type": "MultiPolygon", "coordinates": coordinates}])
+    prepared = tiles._prepare_layers([layer])
+    jobs = tiles._tile_jobs(prepared, 14, 14, 4096, 64)
+    assert sorted((x, y) for z, x, y, members in jobs) == [
+        (0, 8191),
+        (0, 8192),
+        (16383, 8191),
+        (16383, 8192),
+    ]
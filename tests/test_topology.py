@@ -0,0 +1,150 @@
+import pytest
+
+from .context import DATA_DIR
+from kml2geojson.topology import *
+import kml2geojson.main as m
+
+
+def square(x, y):
+    return [[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]
+
+
+def feature(geometry, **properties):
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+def ring_coords(topology, arcs):
+    points = []
+    for i in arcs:
+        arc = decode_arc(topology, i)
+        points.extend(arc if not points else arc[1:])
+    return points
+
+
+def test_find_junctions():
+    a = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+    b = [(1, 0), (2, 0), (2, 1), (1, 1), (1, 0)]
+    assert find_junctions([], [a, b]) == {(1, 0), (1, 1)}
+    assert find_junctions([[(5, 5), (6, 6), (7, 7)]], [a]) == {(5, 5), (7, 7)}
+
+
+def test_cut():
+    line = [(0, 0), (1, 0), (2, 0), (3, 0)]
+    assert cut(line, {(1, 0)}) == [[(0, 0), (1, 0)], [(1, 0), (2, 0), (3, 0)]]
+    assert cut(line, set()) == [line]
+
+
+def test_build_topology():
+    collection = {
+        "type": "FeatureCollection",
+        "name": "parcels",
+        "features": [
+            feature({"type": "Polygon", "coordinates": [square(0, 0)]}, name="a"),
+            feature({"type": "Polygon", "coordinates": [square(1, 0)]}, name="b"),
+            # The same boundary as 'a' from another starting point and backwards
+            feature(
+                {
+                    "type": "Polygon",
+                    "coordinates": [[[1, 1], [1, 0], [0, 0], [0, 1], [1, 1]]],
+                }
+            ),
+            feature({"type": "Point", "coordinates": [2, 2, 7]}),
+            feature(None),
+        ],
+    }
+    # Exact quantization: scale 2 / (3 - 1) = 1
+    topology = build_topology(collection, quantization=3)
+    assert topology["transform"] == {"scale": [1, 1], "translate": [0, 0]}
+    assert list(topology["objects"]) == ["parcels"]
+    geometries = topology["objects"]["parcels"]["geometries"]
+    assert geometries[0]["properties"] == {"name": "a"}
+
+    # The shared edge is stored once, and the repeated square adds no arcs
+    assert len(topology["arcs"]) == 3
+    for geometry, coords in zip(geometries[:3], [square(0, 0), square(1, 0)]):
+        ring = ring_coords(topology, geometry["arcs"][0])
+        assert len(ring) == 5 and ring[0] == ring[-1]
+        assert set(map(tuple, ring)) == set(map(tuple, coords))
+    assert set(map(tuple, ring_coords(topology, geometries[2]["arcs"][0]))) == set(
+        map(tuple, square(0, 0))
+    )
+
+    # Points are quantized but not delta-encoded
+    assert geometries[3] == {"type": "Point", "coordinates": [2, 2]}
+    assert geometries[4] == {"type": None}
+
+    # Without quantization, coordinates are kept
+    topology = build_topology(collection, quantization=None)
+    assert "transform" not in topology
+    assert len(topology["arcs"]) == 3
+
+
+def test_build_topology_lines():
+    collection = {
+        "type": "FeatureCollection",
+        "features": [
+            feature({"type": "LineString", "coordinates": [[0, 0], [1, 0], [2, 0]]}),
+            feature({"type": "LineString", "coordinates": [[2, 0], [1, 0], [0, 0]]}),
+            feature({"type": "LineString", "coordinates": [[1, 0], [2, 0], [2, 2]]}),
+        ],
+    }
+    topology = build_topology(collection, quantization=3)
+    a, b, c = [g["arcs"] for g in topology["objects"]["main"]["geometries"]]
+    assert b == [~i for i in reversed(a)]
+    assert len(a) == 2 and c[0] == a[1]
+    # Delta encoding
+    assert topology["arcs"][a[1]] == [[1, 0], [1, 0]]
+
+
+def test_build_topology_multi():
+    collection = {
+        "type": "FeatureCollection",
+        "features": [
+            feature(
+                {
+                    "type": "MultiLineString",
+                    "coordinates": [[[170, 0], [180, 5]], [[-180, 5], [-170, 10]]],
+                }
+            ),
+            feature(
+                {
+                    "type": "MultiPolygon",
+                    "coordinates": [[square(0, 0)], [square(1, 0)]],
+                }
+            ),
+        ],
+    }
+    transform, bounds = quantize(collection, 361)
+    assert bounds == (-180, 0, 180, 10)
+    assert transform["scale"][0] == 1
+
+    for q in [1, 0, -5]:
+        with pytest.raises(ValueError):
+            build_topology(collection, quantization=q)
+        with pytest.raises(ValueError):
+            m.convert(
+                DATA_DIR / "two_layers" / "two_layers.kml",
+                output_format="topojson",
+                quantization=q,
+            )
+
+    topology = build_topology(collection, quantization=361)
+    line, polygons = topology["objects"]["main"]["geometries"]
+    assert [len(arcs) for arcs in line["arcs"]] == [1, 1]
+    assert [decode_arc(topology, arcs[0])[0] for arcs in line["arcs"]] == [
+        [170, 0],
+        [-180, 5],
+    ]
+    assert len(polygons["arcs"]) == 2
+    assert ring_coords(topology, polygons["arcs"][1][0])[0] == [1, 0]
+
+
+def test_convert_topojson():
+    path = DATA_DIR / "two_layers" / "two_layers.kml"
+    layers = m.convert(path, separate_folders=True)
+    topologies = m.convert(path, separate_folders=True, output_format="topojson")
+    assert len(topologies) == len(layers)
+    for layer, topology in zip(layers, topologies):
+        assert list(topology["objects"]) == [layer["name"]]
+        geometries = topology["objects"][layer["name"]]["geometries"]
+        assert len(geometries) == len(layer["features"])